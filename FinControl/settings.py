@@ -83,6 +83,28 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения (finance.db_router): отчёты, графики и статистика читают с них.
+# Для локальной проверки достаточно второго файла SQLite - копии основного
+# (см. команду sync_sqlite_replica): SQLITE_REPLICA_PATH=db_replica.sqlite3
+if os.environ.get('SQLITE_REPLICA_PATH'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / os.environ['SQLITE_REPLICA_PATH'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Профиль SQLite для одновременной записи бота, веба и cron (finance.sqlite_profile):
+# WAL, pragma-настройки, busy timeout, BEGIN IMMEDIATE и повтор записи. Включается SQLITE_PROFILE=wal
+if os.environ.get('SQLITE_PROFILE') == 'wal':
+    from finance.sqlite_profile import sqlite_profile
+    DATABASES['default'] = sqlite_profile(DATABASES['default'])
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['finance.db_router.PrimaryReplicaRouter']
+# Сколько секунд после записи пользователь читает из основной БД
+# (отметка - в таблице ReplicaPin основной БД, общая для всех процессов)
+REPLICA_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -146,6 +168,15 @@ CRONJOBS = [
 
     # Ежемесячные отчеты 1 числа в 10:00
     ('0 10 1 * *', 'finance.cron.send_monthly_reports'),
+
+    # Секции finance_transaction наперёд (PostgreSQL) 25 числа в 03:00
+    ('0 3 25 * *', 'finance.cron.ensure_transaction_partitions'),
+
+    # Перенос старых операций в архив 2 числа в 04:00
+    ('0 4 2 * *', 'finance.cron.archive_cold_history'),
+
+    # Очистка кэша готовых отчётов ежедневно в 05:00
+    ('0 5 * * *', 'finance.cron.prune_report_cache'),
 ]
 
 # Кастомные бэкенды аутентификации
@@ -155,4 +186,46 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 # Настройки email (для регистрации и восстановления пароля)
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # Вывод email в консоль для разработки
\ No newline at end of file
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # Вывод email в консоль для разработки
+# История операций на странице добавления: размер страницы keyset-пагинации
+TRANSACTIONS_PAGE_SIZE = 50
+TRANSACTIONS_MAX_PAGE_SIZE = 500
+
+# Как часто (в секундах) процесс проверяет версию справочника категорий (finance.categories)
+CATEGORY_REGISTRY_CHECK_INTERVAL = 5
+
+# Секционирование finance_transaction на PostgreSQL (finance.partitioning):
+# 'month', 'year' или None - не секционировать. На SQLite не используется.
+TRANSACTION_PARTITION_INTERVAL = 'month'
+# Сколько секций создавать наперёд (команда partition_transactions и cron)
+TRANSACTION_PARTITIONS_AHEAD = 3
+
+# Операции старше стольких дней переносятся в сжатые архивные файлы в MEDIA_ROOT (finance.archive)
+TRANSACTION_ARCHIVE_AFTER_DAYS = 730
+
+# Колоночный кэш операций в памяти процесса бота (finance.columnar):
+# бюджет памяти и как часто (в секундах) проверять версию данных пользователя
+COLUMNAR_CACHE_BUDGET_MB = 64
+COLUMNAR_CACHE_CHECK_INTERVAL = 5
+
+# Полнотекстовый поиск по описаниям операций (finance.search): размер страницы результатов
+# и за сколько дней ищет запасной вариант без полнотекстового индекса (не SQLite/PostgreSQL)
+SEARCH_PAGE_SIZE = 20
+SEARCH_FALLBACK_DAYS = 365
+
+# Кэш готовых отчётов PDF/Excel в MEDIA_ROOT (finance.report_cache):
+# файлы старше стольких дней и сверх общего размера (сначала давно не запрошенные) удаляются
+REPORT_CACHE_MAX_AGE_DAYS = 30
+REPORT_CACHE_MAX_MB = 500
+
+# Фоновые отчеты (finance.report_jobs, команда run_report_worker): размер пула процессов,
+# как часто проверять очередь (в секундах) и через сколько минут без прогресса задание считается зависшим
+REPORT_WORKER_PROCESSES = 2
+REPORT_WORKER_POLL_SECONDS = 1.0
+REPORT_JOB_STALE_MINUTES = 15
+
+# Рассылка еженедельных/ежемесячных отчетов (finance.report_delivery): формат файла ('pdf' или 'excel'),
+# сколько пользователей в порции между контрольными точками и сколько отправок в Telegram одновременно
+REPORT_DELIVERY_FORMAT = 'pdf'
+REPORT_DELIVERY_BATCH_SIZE = 100
+REPORT_DELIVERY_CONCURRENCY = 10
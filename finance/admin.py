@@ -3,7 +3,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from .models import Transaction, Category, SavedReport, UserConsent
+from .models import Transaction, Category, SavedReport, UserConsent, DailySummary, DailyBalance, ArchiveShard, ReportJob, ReportRun
 
 # Инлайн для согласия
 class UserConsentInline(admin.StackedInline):
@@ -79,7 +79,46 @@ class TransactionAdmin(admin.ModelAdmin):
 
 @admin.register(SavedReport)
 class SavedReportAdmin(admin.ModelAdmin):
-    list_display = ('name', 'user', 'created_at', 'updated_at')
-    list_filter = ('user', 'created_at')
+    list_display = ('name', 'user', 'report_format', 'file_generated_at', 'file_size', 'created_at', 'updated_at')
+    list_filter = ('report_format', 'user', 'created_at')
     search_fields = ('name', 'user__username')
-    readonly_fields = ('created_at', 'updated_at')
\ No newline at end of file
+    readonly_fields = ('created_at', 'updated_at')
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'report_format', 'status', 'progress', 'created_at', 'finished_at')
+    list_filter = ('status', 'report_format')
+    search_fields = ('user__username',)
+    readonly_fields = ('created_at', 'updated_at', 'started_at', 'finished_at')
+
+@admin.register(ReportRun)
+class ReportRunAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'period_start', 'period_end', 'report_format', 'sent', 'failed', 'last_user_id', 'finished_at')
+    list_filter = ('kind', 'report_format')
+    readonly_fields = ('started_at', 'updated_at', 'finished_at')
+
+@admin.register(DailySummary)
+class DailySummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'type', 'category', 'total', 'count')
+    list_filter = ('type', 'category')
+    search_fields = ('user__username',)
+    date_hierarchy = 'date'
+
+
+@admin.register(DailyBalance)
+class DailyBalanceAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'net', 'balance')
+    search_fields = ('user__username',)
+    date_hierarchy = 'date'
+
+
+@admin.register(ArchiveShard)
+class ArchiveShardAdmin(admin.ModelAdmin):
+    list_display = ('user', 'year', 'rows', 'first_date', 'last_date', 'updated_at')
+    list_filter = ('year',)
+    search_fields = ('user__username',)
+    readonly_fields = ('user', 'year', 'file', 'rows', 'first_date', 'last_date', 'updated_at')
+
+    def has_add_permission(self, request):
+        # Архивы создаёт только команда archive_transactions
+        return False
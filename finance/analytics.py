@@ -0,0 +1,134 @@
+# finance/analytics.py
+"""
+Временные ряды по операциям пользователя для графиков и отчётов.
+
+Группировка по дням/неделям/месяцам выполняется в БД (Trunc* над
+дневными сводками DailySummary), а результат дополняется нулями до
+плотного ряда, готового для построения графика.
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .categories import category_registry
+from .models import DailySummary, Transaction
+
+GRANULARITIES = ('day', 'week', 'month')
+SPLITS = ('type', 'category')
+
+# Подписи оси X по умолчанию для каждой гранулярности
+LABEL_FORMATS = {
+    'day': '%d.%m',
+    'week': '%d.%m',
+    'month': '%m.%Y',
+}
+
+
+@dataclass
+class Series:
+    """
+    Плотный временной ряд: buckets - начала интервалов (date),
+    values - {ключ: [значение для каждого интервала]}.
+    Ключ - тип операции ('income'/'expense') или название категории.
+    """
+    granularity: str
+    buckets: list
+    values: dict = field(default_factory=dict)
+
+    def labels(self, fmt=None):
+        fmt = fmt or LABEL_FORMATS[self.granularity]
+        return [bucket.strftime(fmt) for bucket in self.buckets]
+
+    def get(self, key):
+        """Значения по ключу; для отсутствующего ключа - нули."""
+        return self.values.get(key, [0.0] * len(self.buckets))
+
+    def totals(self):
+        """Итог по каждому ключу за весь период."""
+        return {key: sum(values) for key, values in self.values.items()}
+
+    def is_empty(self):
+        return not any(any(values) for values in self.values.values())
+
+
+def bucket_start(day, granularity):
+    """Начало интервала, в который попадает дата."""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_range(start_date, end_date, granularity):
+    """Все начала интервалов от start_date до end_date включительно."""
+    buckets = []
+    current = bucket_start(start_date, granularity)
+    while current <= end_date:
+        buckets.append(current)
+        if granularity == 'day':
+            current += timedelta(days=1)
+        elif granularity == 'week':
+            current += timedelta(weeks=1)
+        else:
+            current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+    return buckets
+
+
+def series(user, start, end, granularity='day', split_by='type', type=None, categories=None):
+    """
+    Временной ряд сумм операций пользователя за [start, end].
+
+    granularity: 'day' | 'week' | 'month'
+    split_by: 'type' (доходы/расходы) | 'category' (по названию категории)
+    type: ограничить одним типом операций ('income' или 'expense')
+    categories: ограничить списком названий категорий
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Неизвестная гранулярность: {granularity}")
+    if split_by not in SPLITS:
+        raise ValueError(f"Неизвестная разбивка: {split_by}")
+
+    summaries = DailySummary.objects.filter(user=user, date__gte=start, date__lte=end)
+    if type:
+        summaries = summaries.filter(type=type)
+    if categories:
+        summaries = summaries.filter(category_id__in=category_registry.ids_for_names(categories))
+
+    if granularity == 'week':
+        summaries = summaries.annotate(bucket=TruncWeek('date'))
+    elif granularity == 'month':
+        summaries = summaries.annotate(bucket=TruncMonth('date'))
+    else:
+        summaries = summaries.annotate(bucket=F('date'))
+
+    # Названия категорий подставляются из реестра - без JOIN с таблицей категорий
+    key_field = 'type' if split_by == 'type' else 'category_id'
+    rows = (
+        summaries.order_by()
+        .values('bucket', key_field)
+        .annotate(total=Sum('total'))
+    )
+
+    buckets = bucket_range(start, end, granularity)
+    positions = {bucket: index for index, bucket in enumerate(buckets)}
+
+    values = {}
+    if split_by == 'type':
+        # Для разбивки по типу оба ряда есть всегда - графики рисуют обе линии
+        for key, _label in Transaction.TRANSACTION_TYPES:
+            if not type or key == type:
+                values[key] = [0.0] * len(buckets)
+
+    for row in rows:
+        bucket = row['bucket']
+        if isinstance(bucket, datetime):  # Trunc* на некоторых СУБД возвращает datetime
+            bucket = bucket.date()
+        key = row[key_field] if split_by == 'type' else category_registry.name(row[key_field])
+        values.setdefault(key, [0.0] * len(buckets))
+        values[key][positions[bucket]] += float(row['total'] or 0)
+
+    return Series(granularity=granularity, buckets=buckets, values=values)
+
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class FinanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finance'
+
+    def ready(self):
+        # Подключаем обработчики сигналов (дневные сводки и т.п.)
+        from . import signals  # noqa: F401
@@ -0,0 +1,369 @@
+# finance/archive.py
+"""
+Архив "холодной" истории операций.
+
+Операции старше горизонта (TRANSACTION_ARCHIVE_AFTER_DAYS) переносятся из
+finance_transaction в сжатые колоночные файлы .npz в MEDIA_ROOT - по файлу
+на пользователя и год (ArchiveShard). Таблица и её индексы остаются
+небольшими, а отчёты за любой период получают "горячие" строки из БД
+вместе с архивными: finance.reports.dataset читает файлы колонками
+(load_shard, shard_descriptions), поиск - через search_archived.
+
+Дневные сводки и остатки (DailySummary, DailyBalance) при архивации не
+меняются и по-прежнему покрывают всю историю, поэтому PeriodSummary,
+analytics.series и balance_at учитывают архив без чтения файлов.
+
+Архивные операции только читаются; чтобы их изменить, год возвращают
+в таблицу командой restore_transactions.
+"""
+import io
+import re
+import secrets
+from datetime import date, timedelta
+from decimal import Decimal
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Count
+from django.db.models.functions import ExtractYear
+
+from .categories import category_registry
+from .models import ArchiveShard, Category, Transaction
+from .money import from_minor, minor
+from .rollups import apply_deltas
+from .sqlite_profile import retry_write
+
+ARCHIVE_DIR = 'archive/transactions'
+TYPE_FLAGS = {'expense': 0, 'income': 1}
+TYPES = {flag: type for type, flag in TYPE_FLAGS.items()}
+DELETE_CHUNK = 500
+CREATE_CHUNK = 2000
+# Колонки файла по строке на операцию; описания - отдельно (description_offsets/description_data)
+ROW_COLUMNS = ('id', 'date', 'type', 'amount', 'category_id', 'has_description')
+
+
+def get_horizon(today=None):
+    """Первая дата "горячей" истории: всё, что раньше, архивируется."""
+    days = getattr(settings, 'TRANSACTION_ARCHIVE_AFTER_DAYS', 730)
+    return (today or date.today()) - timedelta(days=days)
+
+
+def shard_path(user_id, year):
+    # Имя каждый раз новое: файл по имени никогда не меняется, и его можно кэшировать
+    return f'{ARCHIVE_DIR}/{user_id}/{year}_{secrets.token_hex(4)}.npz'
+
+
+def _pack_descriptions(values):
+    """
+    Описания -> (смещения, байты UTF-8 подряд): строка занимает столько байт,
+    сколько в ней есть, а не длину самого длинного описания файла.
+    """
+    encoded = [(value or '').encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def shard_descriptions(columns, indexes):
+    """Описания строк indexes архивного файла; None - у операции описания не было."""
+    offsets = columns['description_offsets']
+    starts = offsets[indexes].tolist()
+    ends = offsets[np.asarray(indexes) + 1].tolist()
+    present = columns['has_description'][indexes].tolist()
+    data = memoryview(columns['description_data'])
+    return [
+        bytes(data[start:end]).decode('utf-8') if has else None
+        for start, end, has in zip(starts, ends, present)
+    ]
+
+
+def _to_columns(rows):
+    """Строки (id, date, type, amount, category_id, description) -> колонки numpy."""
+    descriptions = [row[5] for row in rows]
+    offsets, data = _pack_descriptions(descriptions)
+    return {
+        'id': np.array([row[0] for row in rows], dtype=np.int64),
+        'date': np.array([row[1].toordinal() for row in rows], dtype=np.int32),
+        'type': np.array([TYPE_FLAGS[row[2]] for row in rows], dtype=np.int8),
+        # Сумма в копейках - целое число без потери точности (minor('amount'))
+        'amount': np.array([row[3] for row in rows], dtype=np.int64),
+        'category_id': np.array([row[4] for row in rows], dtype=np.int32),
+        'has_description': np.array([value is not None for value in descriptions], dtype=bool),
+        'description_offsets': offsets,
+        'description_data': data,
+    }
+
+
+def _merge(existing, new):
+    """Объединяет колонки и сортирует по (дата, id)."""
+    descriptions = (
+        shard_descriptions(existing, np.arange(len(existing['id'])))
+        + shard_descriptions(new, np.arange(len(new['id'])))
+    )
+    columns = {key: np.concatenate([existing[key], new[key]]) for key in ROW_COLUMNS}
+    order = np.lexsort((columns['id'], columns['date']))
+    columns = {key: values[order] for key, values in columns.items()}
+    columns['description_offsets'], columns['description_data'] = _pack_descriptions(
+        [descriptions[position] for position in order.tolist()]
+    )
+    return columns
+
+
+def _dump(columns, previous=None):
+    # Названия категорий - чтобы восстановить архив, даже если категорию успели удалить
+    known = dict(zip(previous['category_ids'].tolist(), previous['category_names'].tolist())) if previous else {}
+    category_ids = np.unique(columns['category_id'])
+    names = np.array(
+        [category_registry.name(category_id) or known.get(category_id, '') for category_id in category_ids.tolist()],
+        dtype=np.str_,
+    )
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, category_ids=category_ids, category_names=names, **columns)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=16)
+def load_shard(name):
+    """Колонки архивного файла (кэшируются по имени - файлы неизменяемы)."""
+    with default_storage.open(name, 'rb') as fileobj:
+        with np.load(fileobj, allow_pickle=False) as data:
+            columns = {key: data[key] for key in data.files}
+    return columns
+
+
+def _to_transactions(user_id, columns, indexes):
+    """Несохраняемые экземпляры Transaction (восстановление, поиск; is_archived=True)."""
+    ids = columns['id'][indexes].tolist()
+    days = columns['date'][indexes].tolist()
+    types = columns['type'][indexes].tolist()
+    amounts = columns['amount'][indexes].tolist()
+    category_ids = columns['category_id'][indexes].tolist()
+    descriptions = shard_descriptions(columns, indexes)
+
+    result = []
+    for position in range(len(ids)):
+        instance = Transaction(
+            id=ids[position],
+            user_id=user_id,
+            date=date.fromordinal(days[position]),
+            type=TYPES[types[position]],
+            amount=from_minor(amounts[position]),
+            category_id=category_ids[position],
+            description=descriptions[position],
+        )
+        instance._state.adding = False
+        instance.is_archived = True
+        result.append(instance)
+    return result
+
+
+def search_archived(user_id, terms, start=None, end=None, category_ids=None, type=None):
+    """
+    Архивные операции пользователя, описание которых содержит все слова terms
+    (по началу слова, без учёта регистра - как префиксный поиск FTS), от новых
+    к старым. Поисковый индекс покрывает только таблицу: перенесённые в архив
+    строки из него удалены, их описания просматриваются здесь (finance.search).
+    """
+    patterns = [re.compile(r'\b' + re.escape(term.lower())) for term in terms]
+    shards = ArchiveShard.objects.filter(user_id=user_id)
+    if start:
+        shards = shards.filter(last_date__gte=start)
+    if end:
+        shards = shards.filter(first_date__lte=end)
+
+    result = []
+    for shard in shards:
+        columns = load_shard(shard.file.name)
+        mask = columns['has_description'].copy()
+        if start:
+            mask &= columns['date'] >= start.toordinal()
+        if end:
+            mask &= columns['date'] <= end.toordinal()
+        if category_ids is not None:
+            mask &= np.isin(columns['category_id'], list(category_ids))
+        if type:
+            mask &= columns['type'] == TYPE_FLAGS[type]
+        indexes = np.flatnonzero(mask)
+        found = [
+            index for index, description in zip(indexes.tolist(), shard_descriptions(columns, indexes))
+            if all(pattern.search(description.lower()) for pattern in patterns)
+        ]
+        if not found:
+            continue
+        # Категорию могли удалить - тогда название из самого архива
+        names = dict(zip(columns['category_ids'].tolist(), columns['category_names'].tolist()))
+        for instance in _to_transactions(user_id, columns, np.array(found, dtype=np.int64)):
+            instance.category = category_registry.get(instance.category_id) or Category(
+                id=instance.category_id, name=names.get(instance.category_id, ''))
+            result.append(instance)
+    result.sort(key=lambda instance: (instance.date, instance.id), reverse=True)
+    return result
+
+
+def _delete_rows(using, ids):
+    """
+    Удаление операций без сигналов: сводки и остатки должны
+    по-прежнему учитывать перенесённые в архив строки.
+    """
+    connection = connections[using]
+    table = connection.ops.quote_name(Transaction._meta.db_table)
+    with connection.cursor() as cursor:
+        for offset in range(0, len(ids), DELETE_CHUNK):
+            chunk = ids[offset:offset + DELETE_CHUNK]
+            cursor.execute(f'DELETE FROM {table} WHERE id IN ({", ".join(["%s"] * len(chunk))})', chunk)
+
+
+def archive_year(user_id, year, before, using='default'):
+    """
+    Переносит операции пользователя за год (до даты before) в архивный файл,
+    дописывая их к уже заархивированным. Возвращает число перенесённых строк.
+    """
+    end = min(date(year + 1, 1, 1), before)
+    with transaction.atomic(using=using):
+        rows = list(
+            Transaction.objects.using(using).select_for_update()
+            .filter(user_id=user_id, date__gte=date(year, 1, 1), date__lt=end)
+            .order_by('date', 'id')
+            .values_list('id', 'date', 'type', minor('amount'), 'category_id', 'description')
+        )
+        if not rows:
+            return 0
+
+        shard = ArchiveShard.objects.using(using).select_for_update().filter(user_id=user_id, year=year).first()
+        columns = _to_columns(rows)
+        previous_name, previous = None, None
+        if shard is not None:
+            previous_name = shard.file.name
+            previous = load_shard(previous_name)
+            columns = _merge(previous, columns)
+        else:
+            shard = ArchiveShard(user_id=user_id, year=year)
+
+        # Сначала новый файл, потом удаление строк: при ошибке таблица остаётся как была
+        name = default_storage.save(shard_path(user_id, year), ContentFile(_dump(columns, previous)))
+        try:
+            _delete_rows(using, [row[0] for row in rows])
+            shard.file.name = name
+            shard.rows = len(columns['id'])
+            shard.first_date = date.fromordinal(int(columns['date'][0]))
+            shard.last_date = date.fromordinal(int(columns['date'][-1]))
+            shard.save(using=using)
+        except Exception:
+            default_storage.delete(name)
+            raise
+
+        if previous_name:
+            transaction.on_commit(lambda: default_storage.delete(previous_name), using=using)
+    return len(rows)
+
+
+def archive_candidates(before=None, user=None):
+    """Пары (user_id, год) с операциями раньше before и число таких операций."""
+    before = before or get_horizon()
+    candidates = Transaction.objects.filter(date__lt=before)
+    if user is not None:
+        candidates = candidates.filter(user=user)
+    return [
+        (row['user_id'], row['year'], row['rows'])
+        for row in candidates.order_by()
+        .annotate(year=ExtractYear('date'))
+        .values('user_id', 'year')
+        .annotate(rows=Count('id'))
+        .order_by('user_id', 'year')
+    ]
+
+
+def archive_transactions(before=None, user=None, using='default'):
+    """Архивирует всё раньше before (по умолчанию - горизонт). Возвращает [(user_id, год, строк)]."""
+    before = before or get_horizon()
+    archived = []
+    for user_id, year, _rows in archive_candidates(before, user):
+        moved = retry_write(archive_year, using, user_id, year, before, using=using)
+        archived.append((user_id, year, moved))
+    return archived
+
+
+def _restore_categories(columns, using):
+    """id категорий архива -> id в БД; удалённые с тех пор категории создаются заново по названию."""
+    category_ids = set(columns['category_id'].tolist())
+    existing = set(Category.objects.using(using).filter(pk__in=category_ids).values_list('pk', flat=True))
+    names = dict(zip(columns['category_ids'].tolist(), columns['category_names'].tolist()))
+    mapping = {}
+    for category_id in category_ids - existing:
+        category, _created = Category.objects.using(using).get_or_create(
+            name=names.get(category_id) or f'Категория #{category_id}'
+        )
+        mapping[category_id] = category.pk
+    return mapping
+
+
+def restore_shard(shard, using='default'):
+    """Возвращает операции архивного файла в таблицу и удаляет архив. Возвращает число строк."""
+    with transaction.atomic(using=using):
+        columns = load_shard(shard.file.name)
+        mapping = _restore_categories(columns, using)
+        instances = _to_transactions(shard.user_id, columns, np.arange(len(columns['id'])))
+
+        # Сводки удалённой категории исчезли каскадно - для новой категории их нужно добавить
+        deltas = {}
+        for instance in instances:
+            instance._state.adding = True
+            if instance.category_id in mapping:
+                instance.category_id = mapping[instance.category_id]
+                key = (instance.date, instance.type, instance.category_id)
+                amount, count = deltas.get(key, (Decimal('0'), 0))
+                deltas[key] = (amount + instance.amount, count + 1)
+
+        # bulk_create не вызывает сигналы - сводки и остатки эти строки уже учитывают
+        Transaction.objects.using(using).bulk_create(instances, batch_size=CREATE_CHUNK)
+        apply_deltas(shard.user_id, deltas)
+        shard.delete(using=using)
+    return len(instances)
+
+
+def restore_transactions(user=None, year=None, using='default'):
+    """Восстанавливает архив пользователя (или всех) целиком или за один год. Возвращает [(user_id, год, строк)]."""
+    shards = ArchiveShard.objects.using(using).order_by('user_id', 'year')
+    if user is not None:
+        shards = shards.filter(user=user)
+    if year is not None:
+        shards = shards.filter(year=year)
+    return [
+        (shard.user_id, shard.year, retry_write(restore_shard, using, shard, using=using))
+        for shard in shards
+    ]
+
+
+def archived_rollup_deltas(user=None):
+    """
+    Дельты сводок по архивным строкам для rebuild_rollups:
+    [(user_id, {(date, type, category_id): (amount, count)})].
+    """
+    shards = ArchiveShard.objects.order_by('user_id', 'year')
+    if user is not None:
+        shards = shards.filter(user=user)
+    # Сводки удалённых категорий удалены каскадно - их строки архива не учитываются
+    known_categories = set(Category.objects.values_list('pk', flat=True))
+
+    result = []
+    for shard in shards:
+        columns = load_shard(shard.file.name)
+        deltas = {}
+        for day, flag, category_id, amount in zip(
+            columns['date'].tolist(), columns['type'].tolist(),
+            columns['category_id'].tolist(), columns['amount'].tolist(),
+        ):
+            if category_id not in known_categories:
+                continue
+            key = (date.fromordinal(day), TYPES[flag], category_id)
+            total, count = deltas.get(key, (0, 0))
+            deltas[key] = (total + amount, count + 1)
+        result.append((
+            shard.user_id,
+            {key: (from_minor(total), count) for key, (total, count) in deltas.items()},
+        ))
+    return result
@@ -0,0 +1,71 @@
+# finance/benchmarks.py
+"""
+Общая обвязка команд замеров (bench, bench_pdf_report).
+
+- scratch_database() - временный файл SQLite с миграциями и временный
+  MEDIA_ROOT вместо рабочих db.sqlite3 и media на время замеров;
+- measure_in_child() - замер в отдельном процессе (fork): его пиковый RSS
+  не смешивается с другими замерами и с засевом данных;
+- peak_rss_mb() - пиковый RSS текущего процесса.
+"""
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.db import connections
+from django.test.utils import override_settings
+
+
+def fork_available():
+    """Замеры в отдельных процессах требуют fork (Linux/macOS)."""
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def peak_rss_mb():
+    # ru_maxrss: килобайты на Linux, байты на macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if os.uname().sysname == 'Darwin' else peak / 1024
+
+
+@contextmanager
+def scratch_database(prefix='fincontrol_bench_'):
+    """
+    На время блока 'default' - новый файл SQLite с применёнными миграциями,
+    MEDIA_ROOT - временный каталог (файлы SavedReport и архива); всё удаляется
+    после блока. Отдаёт временный каталог.
+    """
+    database = connections.settings['default']
+    original_name = database['NAME']
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    # override_settings сбрасывает и путь хранилища файлов
+    media = override_settings(MEDIA_ROOT=os.path.join(workdir, 'media'))
+    try:
+        connections.close_all()
+        media.enable()
+        database['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+        call_command('migrate', verbosity=0)
+        yield workdir
+    finally:
+        connections.close_all()
+        database['NAME'] = original_name
+        media.disable()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def measure_in_child(target, *args):
+    """
+    Вызывает target(*args, queue) в fork-процессе и возвращает то, что он
+    положил в queue. Соединения родителя закрываются, чтобы не достались потомку.
+    """
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    process = context.Process(target=target, args=(*args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
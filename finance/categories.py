@@ -0,0 +1,95 @@
+# finance/categories.py
+"""
+Реестр категорий в памяти процесса.
+
+Категории меняются редко, а читаются постоянно (бот, формы, отчёты),
+поэтому справочник загружается один раз и хранится в словарях
+по id и по названию (без учёта регистра). Свежесть проверяется по версии
+DataVersion 'category', которую увеличивают сигналы Category в любом
+процессе; проверка выполняется не чаще, чем раз в CHECK_INTERVAL секунд.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Category
+from .versions import get_version
+
+VERSION_KEY = 'category'
+
+
+class CategoryRegistry:
+    """Справочник категорий: поиск по id и по названию без обращения к БД."""
+
+    def __init__(self, check_interval=None):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._by_name = {}
+        self._ordered = []
+        self._version = None
+        self._checked_at = 0.0
+
+    def _interval(self):
+        if self.check_interval is not None:
+            return self.check_interval
+        return getattr(settings, 'CATEGORY_REGISTRY_CHECK_INTERVAL', 5)
+
+    def load(self):
+        """Загружает справочник из БД (при старте процесса или после изменения)."""
+        with self._lock:
+            version = get_version(VERSION_KEY)
+            categories = list(Category.objects.order_by('name'))
+            self._by_id = {category.pk: category for category in categories}
+            self._by_name = {category.name.casefold(): category for category in categories}
+            self._ordered = categories
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    def refresh(self):
+        """Перезагружает справочник, если версия в БД изменилась."""
+        if self._version is None:
+            self.load()
+            return
+        if time.monotonic() - self._checked_at < self._interval():
+            return
+        if get_version(VERSION_KEY) != self._version:
+            self.load()
+        else:
+            self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        """Сбрасывает кэш: следующее обращение загрузит справочник заново."""
+        self._version = None
+
+    def get(self, category_id):
+        """Категория по id или None."""
+        self.refresh()
+        try:
+            return self._by_id.get(int(category_id))
+        except (TypeError, ValueError):
+            return None
+
+    def by_name(self, name):
+        """Категория по названию без учёта регистра или None."""
+        self.refresh()
+        return self._by_name.get((name or '').strip().casefold())
+
+    def name(self, category_id):
+        category = self.get(category_id)
+        return category.name if category else ''
+
+    def all(self):
+        """Все категории, отсортированные по названию."""
+        self.refresh()
+        return list(self._ordered)
+
+    def ids_for_names(self, names):
+        """id категорий по списку названий (неизвестные названия пропускаются)."""
+        found = (self.by_name(name) for name in names)
+        return [category.pk for category in found if category is not None]
+
+
+category_registry = CategoryRegistry()
+
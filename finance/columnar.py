@@ -0,0 +1,358 @@
+# finance/columnar.py
+"""
+Колоночный кэш операций пользователя в памяти процесса.
+
+Для каждого пользователя хранятся массивы NumPy, упорядоченные по дате:
+дата (ordinal), сумма в копейках, признак дохода, id категории и id
+операции (для точечных изменений). Графики, советы и сводки бота
+считаются срезами и векторными свёртками этих массивов - без повторной
+загрузки операций из БД.
+
+- массивы загружаются один раз: строки таблицы и архив старой истории
+  (finance.archive);
+- изменения операций в этом процессе применяются к массивам после
+  фиксации транзакции (сигналы finance.signals);
+- изменения из других процессов (веб, импорт выписок) видны по версии
+  DataVersion 'transactions:<user_id>', которую проверяем не чаще, чем раз
+  в COLUMNAR_CACHE_CHECK_INTERVAL секунд;
+- объём кэша ограничен COLUMNAR_CACHE_BUDGET_MB: при превышении
+  вытесняются давно не использованные пользователи.
+
+Кроме версии пользователя, каждое изменение увеличивает версию месяца
+операции 'transactions:<user_id>:<ГГГГ-ММ>' - по ней кэш отчётов
+(finance.report_cache) узнаёт, менялось ли что-то внутри периода отчёта.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .analytics import GRANULARITIES, SPLITS, Series, bucket_range
+from .archive import TYPE_FLAGS, load_shard
+from .categories import category_registry
+from .models import ArchiveShard, Transaction
+from .money import from_minor, minor, to_minor
+from .versions import bump_version, get_version
+
+INCOME = TYPE_FLAGS['income']
+EXPENSE = TYPE_FLAGS['expense']
+COLUMNS = ('id', 'date', 'amount', 'type', 'category_id')
+DTYPES = {'id': np.int64, 'date': np.int32, 'amount': np.int64, 'type': np.int8, 'category_id': np.int32}
+
+
+def version_key(user_id):
+    return f'transactions:{user_id}'
+
+
+def month_key(user_id, day):
+    """Версия операций пользователя за месяц day; ключи одного пользователя упорядочены по месяцам."""
+    return f'transactions:{user_id}:{day:%Y-%m}'
+
+
+def _bump_months(user_id, dates):
+    for month in sorted({day.replace(day=1) for day in dates}):
+        bump_version(month_key(user_id, month))
+
+
+def _empty():
+    return {name: np.empty(0, dtype=DTYPES[name]) for name in COLUMNS}
+
+
+@dataclass
+class ColumnWindow:
+    """Срез операций пользователя за период: массивы одинаковой длины."""
+    start: date
+    end: date
+    dates: np.ndarray
+    amounts: np.ndarray
+    types: np.ndarray
+    categories: np.ndarray
+
+    def __len__(self):
+        return len(self.dates)
+
+    def is_empty(self):
+        return len(self.dates) == 0
+
+    def _mask(self, type):
+        return self.types == TYPE_FLAGS[type]
+
+    @property
+    def income(self):
+        return from_minor(self.amounts[self._mask('income')].sum())
+
+    @property
+    def expense(self):
+        return from_minor(self.amounts[self._mask('expense')].sum())
+
+    @property
+    def income_count(self):
+        return int(np.count_nonzero(self._mask('income')))
+
+    @property
+    def expense_count(self):
+        return int(np.count_nonzero(self._mask('expense')))
+
+    def _grouped(self, keys, type=None):
+        amounts = self.amounts
+        if type is not None:
+            mask = self._mask(type)
+            keys, amounts = keys[mask], amounts[mask]
+        unique, inverse = np.unique(keys, return_inverse=True)
+        # Суммы копеек в float64 точны до 2**53 - с большим запасом для личных финансов
+        totals = np.rint(np.bincount(inverse, weights=amounts, minlength=len(unique))).astype(np.int64)
+        return unique, totals
+
+    def by_category(self, type=None):
+        """Суммы по категориям в копейках: {category_id: сумма}."""
+        unique, totals = self._grouped(self.categories, type)
+        return dict(zip(unique.tolist(), totals.tolist()))
+
+    def by_day(self, type=None):
+        """Суммы по дням в копейках: (массив ordinal дат, массив сумм)."""
+        return self._grouped(self.dates, type)
+
+    def series(self, granularity='day', split_by='type', type=None):
+        """Тот же ряд, что analytics.series, но по массивам в памяти."""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Неизвестная гранулярность: {granularity}")
+        if split_by not in SPLITS:
+            raise ValueError(f"Неизвестная разбивка: {split_by}")
+
+        buckets = bucket_range(self.start, self.end, granularity)
+        starts = np.array([bucket.toordinal() for bucket in buckets], dtype=np.int32)
+        positions = np.searchsorted(starts, self.dates, side='right') - 1
+
+        mask = self._mask(type) if type else np.ones(len(self.dates), dtype=bool)
+        values = {}
+        if split_by == 'type':
+            for key, _label in Transaction.TRANSACTION_TYPES:
+                if not type or key == type:
+                    key_mask = mask & self._mask(key)
+                    values[key] = self._bucket_sums(positions[key_mask], self.amounts[key_mask], len(buckets))
+        else:
+            for category_id in np.unique(self.categories[mask]).tolist():
+                key_mask = mask & (self.categories == category_id)
+                values[category_registry.name(category_id)] = self._bucket_sums(
+                    positions[key_mask], self.amounts[key_mask], len(buckets)
+                )
+        return Series(granularity=granularity, buckets=buckets, values=values)
+
+    @staticmethod
+    def _bucket_sums(positions, amounts, size):
+        return (np.bincount(positions, weights=amounts, minlength=size) / 100).tolist()
+
+
+class UserColumns:
+    """Все операции одного пользователя, отсортированные по (дата, id)."""
+
+    def __init__(self, columns, version):
+        # Массивы заменяются целиком одним присваиванием - читатели в других потоках
+        # всегда видят согласованный набор колонок
+        self.columns = columns
+        self.version = version
+        self.checked_at = time.monotonic()
+
+    @classmethod
+    def load(cls, user_id):
+        """Загружает операции пользователя: таблица + архивные файлы."""
+        version = get_version(version_key(user_id))
+        rows = list(
+            Transaction.objects.filter(user_id=user_id).order_by()
+            .values_list('id', 'date', minor('amount'), 'type', 'category_id')
+            .iterator(chunk_size=5000)
+        )
+        parts = [{
+            'id': np.array([row[0] for row in rows], dtype=np.int64),
+            'date': np.array([row[1].toordinal() for row in rows], dtype=np.int32),
+            'amount': np.array([row[2] for row in rows], dtype=np.int64),  # копейки прямо из БД
+            'type': np.array([TYPE_FLAGS[row[3]] for row in rows], dtype=np.int8),
+            'category_id': np.array([row[4] for row in rows], dtype=np.int32),
+        }]
+        # Архивные файлы уже хранят те же колонки в тех же единицах
+        for name in ArchiveShard.objects.filter(user_id=user_id).values_list('file', flat=True):
+            shard = load_shard(name)
+            parts.append({column: shard[column] for column in COLUMNS})
+
+        columns = {name: np.concatenate([part[name] for part in parts]).astype(DTYPES[name]) for name in COLUMNS}
+        # Строка, которую архивировали во время загрузки, могла прочитаться дважды
+        _unique, first = np.unique(columns['id'], return_index=True)
+        columns = {name: values[first] for name, values in columns.items()}
+        return cls(cls._sorted(columns), version)
+
+    @staticmethod
+    def _sorted(columns):
+        order = np.lexsort((columns['id'], columns['date']))
+        return {name: values[order] for name, values in columns.items()}
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.columns.values())
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def window(self, start=None, end=None, category_ids=None):
+        """Срез за [start, end] (границы необязательны) - двоичный поиск по датам."""
+        columns = self.columns
+        dates = columns['date']
+        low = 0 if start is None else int(np.searchsorted(dates, start.toordinal(), side='left'))
+        high = len(dates) if end is None else int(np.searchsorted(dates, end.toordinal(), side='right'))
+        selected = {name: values[low:high] for name, values in columns.items()}
+        if category_ids is not None:
+            mask = np.isin(selected['category_id'], list(category_ids))
+            selected = {name: values[mask] for name, values in selected.items()}
+
+        if start is None:
+            start = date.fromordinal(int(dates[0])) if len(dates) else date.today()
+        if end is None:
+            end = date.fromordinal(int(dates[-1])) if len(dates) else start
+        return ColumnWindow(
+            start=start, end=end, dates=selected['date'], amounts=selected['amount'],
+            types=selected['type'], categories=selected['category_id'],
+        )
+
+    def apply(self, transaction_id, values=None):
+        """Удаляет операцию и, если values заданы, вставляет её новую версию на своё место."""
+        columns = self.columns
+        keep = columns['id'] != transaction_id
+        if not keep.all():
+            columns = {name: array[keep] for name, array in columns.items()}
+        if values is not None:
+            ordinal = values['date'].toordinal()
+            position = int(np.searchsorted(columns['date'], ordinal, side='right'))
+            row = {
+                'id': transaction_id, 'date': ordinal, 'amount': to_minor(values['amount']),
+                'type': TYPE_FLAGS[values['type']], 'category_id': values['category_id'],
+            }
+            columns = {
+                name: np.insert(array, position, np.array(row[name], dtype=DTYPES[name]))
+                for name, array in columns.items()
+            }
+        self.columns = columns
+
+
+class ColumnarCache:
+    """LRU-кэш UserColumns с ограничением по памяти."""
+
+    def __init__(self, budget_bytes=None, check_interval=None):
+        self.budget_bytes = budget_bytes
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+
+    def _budget(self):
+        if self.budget_bytes is not None:
+            return self.budget_bytes
+        return getattr(settings, 'COLUMNAR_CACHE_BUDGET_MB', 64) * 1024 * 1024
+
+    def _interval(self):
+        if self.check_interval is not None:
+            return self.check_interval
+        return getattr(settings, 'COLUMNAR_CACHE_CHECK_INTERVAL', 5)
+
+    def _is_fresh(self, entry, user_id):
+        if time.monotonic() - entry.checked_at < self._interval():
+            return True
+        if get_version(version_key(user_id)) != entry.version:
+            return False
+        entry.checked_at = time.monotonic()
+        return True
+
+    def get(self, user):
+        """Колонки пользователя (загружаются при первом обращении или после чужих изменений)."""
+        user_id = getattr(user, 'pk', user)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+        if entry is not None and self._is_fresh(entry, user_id):
+            return entry
+
+        entry = UserColumns.load(user_id)
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            self._evict()
+        return entry
+
+    def window(self, user, start=None, end=None, category_ids=None):
+        return self.get(user).window(start, end, category_ids)
+
+    def _evict(self):
+        total = sum(entry.nbytes for entry in self._entries.values())
+        # Последнего (только что использованного) пользователя не вытесняем
+        while total > self._budget() and len(self._entries) > 1:
+            _user_id, entry = self._entries.popitem(last=False)
+            total -= entry.nbytes
+
+    def apply(self, user_id, version, transaction_id, values=None):
+        """
+        Изменение операции, зафиксированное в этом процессе. Если между версиями
+        были чужие изменения, колонки пользователя просто сбрасываются.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            if entry.version != version - 1:
+                del self._entries[user_id]
+                return
+            entry.apply(transaction_id, values)
+            entry.version = version
+            self._evict()
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._entries),
+                'rows': sum(len(entry) for entry in self._entries.values()),
+                'bytes': sum(entry.nbytes for entry in self._entries.values()),
+            }
+
+
+columnar_cache = ColumnarCache()
+
+
+def transaction_changed(transaction_id, previous=None, current=None):
+    """
+    Вызывается сигналами Transaction внутри транзакции записи: увеличивает
+    версию данных пользователя и после фиксации применяет изменение к кэшу.
+    previous/current - значения до и после (None: операции не было / больше нет).
+    """
+    for user_id in {values['user_id'] for values in (previous, current) if values}:
+        version = bump_version(version_key(user_id))
+        _bump_months(user_id, [values['date'] for values in (previous, current)
+                               if values and values['user_id'] == user_id])
+        values = current if current and current['user_id'] == user_id else None
+        transaction.on_commit(
+            lambda user_id=user_id, version=version, values=values:
+                columnar_cache.apply(user_id, version, transaction_id, values)
+        )
+
+
+def user_deleted(user_id):
+    """Пользователь удалён: после фиксации его колонки убираются из кэша этого процесса."""
+    transaction.on_commit(lambda: columnar_cache.invalidate(user_id))
+
+
+def user_changed(user_id, dates=()):
+    """
+    Массовое изменение операций пользователя (импорт): кэш загрузится заново.
+    dates - даты изменённых операций (для версий месяцев).
+    """
+    bump_version(version_key(user_id))
+    _bump_months(user_id, dates)
+    transaction.on_commit(lambda: columnar_cache.invalidate(user_id))
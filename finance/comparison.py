@@ -0,0 +1,237 @@
+# finance/comparison.py
+"""
+Сравнение периода с предыдущим и с тем же периодом год назад (PeriodComparison).
+
+- предыдущий период: для периода с 1-го числа - те же дни на столько же
+  месяцев раньше (1-14 октября -> 1-14 сентября, весь март -> весь февраль),
+  иначе - столько же дней непосредственно перед ним; год назад - те же даты
+  на 12 месяцев раньше;
+- все три периода считаются одним сгруппированным запросом к дневным сводкам
+  DailySummary: строка на (интервал, тип, категория) и три условные суммы
+  (filter=) - по одной на период, поэтому пересекающиеся периоды (например,
+  предыдущие 12 месяцев и год назад) считаются верно;
+- интервалы сопоставляются по номеру внутри своего периода: месяцы - только
+  у периодов с 1-го числа (их предыдущий период и год назад тоже начинаются
+  с 1-го), дни и недели - по смещению от начала периода (неделя - 7 дней от
+  первого дня периода, а не календарная), поэтому сравниваются интервалы
+  одинаковой длины. Для периода не с 1-го числа месяцы были бы неполными и
+  разной длины - вместо них берутся такие недели.
+"""
+import calendar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .analytics import LABEL_FORMATS, bucket_range
+from .categories import category_registry
+from .models import DailySummary
+from .rollups import to_decimal
+
+ZERO = Decimal('0.00')
+PERIODS = ('current', 'previous', 'year_ago')
+PERIOD_LABELS = {
+    'current': 'Текущий период',
+    'previous': 'Предыдущий период',
+    'year_ago': 'Год назад',
+}
+# Длина интервала в днях для сопоставления по смещению от начала периода
+STEP_DAYS = {'day': 1, 'week': 7}
+
+
+def shift_months(day, months, month_end=False):
+    """Дата на months месяцев раньше/позже; число - не больше длины месяца (или его последний день)."""
+    index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(index, 12)
+    last = calendar.monthrange(year, month + 1)[1]
+    return day.replace(year=year, month=month + 1, day=last if month_end else min(day.day, last))
+
+
+def _is_month_end(day):
+    return (day + timedelta(days=1)).day == 1
+
+
+def previous_period(start_date, end_date):
+    """Предыдущий период той же длины (см. описание модуля)."""
+    if start_date.day == 1:
+        months = (end_date.year - start_date.year) * 12 + end_date.month - start_date.month + 1
+        return (
+            shift_months(start_date, -months),
+            shift_months(end_date, -months, month_end=_is_month_end(end_date)),
+        )
+    length = (end_date - start_date).days + 1
+    return start_date - timedelta(days=length), start_date - timedelta(days=1)
+
+
+def year_ago_period(start_date, end_date):
+    """Те же даты год назад."""
+    return shift_months(start_date, -12), shift_months(end_date, -12, month_end=_is_month_end(end_date))
+
+
+def comparison_granularity(start_date, end_date):
+    """Интервалы сравнения: по дням - до месяца, дальше - по месяцам (с 1-го числа) или неделям."""
+    if (end_date - start_date).days < 31:
+        return 'day'
+    return 'month' if start_date.day == 1 else 'week'
+
+
+def percent_change(value, base):
+    """Изменение value относительно base в процентах; None, если base нулевой."""
+    if not base:
+        return None
+    return (value - base) / base * 100
+
+
+@dataclass
+class ComparisonRow:
+    """Значение в текущем периоде, предыдущем и год назад."""
+    label: str
+    current: Decimal = ZERO
+    previous: Decimal = ZERO
+    year_ago: Decimal = ZERO
+
+    @property
+    def delta_previous(self):
+        return self.current - self.previous
+
+    @property
+    def delta_year_ago(self):
+        return self.current - self.year_ago
+
+    @property
+    def change_previous(self):
+        return percent_change(self.current, self.previous)
+
+    @property
+    def change_year_ago(self):
+        return percent_change(self.current, self.year_ago)
+
+    def add(self, period, amount):
+        setattr(self, period, getattr(self, period) + amount)
+
+
+@dataclass
+class PeriodComparison:
+    """
+    Суммы по (тип, категория, номер интервала) в трёх периодах.
+    periods - {'current'|'previous'|'year_ago': (начало, конец)},
+    buckets - начала интервалов текущего периода.
+    """
+    periods: dict
+    granularity: str
+    buckets: list
+    # {(тип, название категории, номер интервала): ComparisonRow}
+    cells: dict = field(default_factory=dict)
+
+    @classmethod
+    def for_period(cls, user, start_date, end_date, granularity=None, categories=None):
+        """
+        Сравнение [start_date, end_date] с предыдущим периодом и годом ранее.
+        categories: список названий категорий для фильтра (как в отчётах).
+        """
+        granularity = granularity or comparison_granularity(start_date, end_date)
+        if granularity == 'month' and start_date.day != 1:
+            granularity = 'week'
+        periods = {
+            'current': (start_date, end_date),
+            'previous': previous_period(start_date, end_date),
+            'year_ago': year_ago_period(start_date, end_date),
+        }
+        conditions = {
+            name: Q(date__gte=period_start, date__lte=period_end)
+            for name, (period_start, period_end) in periods.items()
+        }
+
+        summaries = DailySummary.objects.filter(user=user)
+        summaries = summaries.filter(conditions['current'] | conditions['previous'] | conditions['year_ago'])
+        if categories:
+            summaries = summaries.filter(category_id__in=category_registry.ids_for_names(categories))
+
+        if granularity == 'month':
+            summaries = summaries.annotate(bucket=TruncMonth('date'))
+            buckets = bucket_range(start_date, end_date, granularity)
+            # Номер месяца внутри каждого периода
+            months = {
+                name: {bucket: index for index, bucket in enumerate(bucket_range(*period, granularity))}
+                for name, period in periods.items()
+            }
+
+            def position(name, bucket):
+                return months[name][bucket]
+        else:
+            summaries = summaries.annotate(bucket=F('date'))
+            step = STEP_DAYS[granularity]
+            buckets = [start_date + timedelta(days=offset) for offset in range(0, (end_date - start_date).days + 1, step)]
+
+            def position(name, bucket):
+                return (bucket - periods[name][0]).days // step
+
+        # Один запрос: строка на (интервал, тип, категория), по сумме на каждый период
+        rows = (
+            summaries.order_by()
+            .values('bucket', 'type', 'category_id')
+            .annotate(**{name: Sum('total', filter=condition) for name, condition in conditions.items()})
+        )
+
+        comparison = cls(periods=periods, granularity=granularity, buckets=buckets)
+        for row in rows:
+            bucket = row['bucket']
+            if isinstance(bucket, datetime):  # Trunc* на некоторых СУБД возвращает datetime
+                bucket = bucket.date()
+            category = category_registry.name(row['category_id'])
+            for name in PERIODS:
+                if row[name] is None:
+                    continue
+                key = (row['type'], category, position(name, bucket))
+                cell = comparison.cells.setdefault(key, ComparisonRow(category))
+                # SQLite суммирует DECIMAL как float - округляем до копеек
+                cell.add(name, to_decimal(row[name]))
+        return comparison
+
+    def is_empty(self):
+        return not self.cells
+
+    def period_label(self, name):
+        period_start, period_end = self.periods[name]
+        return f"{period_start.strftime('%d.%m.%Y')} - {period_end.strftime('%d.%m.%Y')}"
+
+    def bucket_labels(self):
+        return [bucket.strftime(LABEL_FORMATS[self.granularity]) for bucket in self.buckets]
+
+    def _rows(self, type, key):
+        result = {}
+        for (cell_type, category, index), cell in self.cells.items():
+            if cell_type != type:
+                continue
+            label = key(category, index)
+            row = result.setdefault(label, ComparisonRow(label))
+            for name in PERIODS:
+                row.add(name, getattr(cell, name))
+        return result
+
+    def by_category(self, type='expense'):
+        """Категории по убыванию суммы в текущем периоде, затем в предыдущем."""
+        rows = self._rows(type, lambda category, index: category).values()
+        return sorted(rows, key=lambda row: (row.current, row.previous, row.year_ago), reverse=True)
+
+    def by_bucket(self, type='expense'):
+        """Интервалы по порядку; у более длинного предыдущего периода - лишние интервалы в конце."""
+        rows = self._rows(type, lambda category, index: index)
+        count = max([len(self.buckets), *(index + 1 for index in rows)])
+        labels = self.bucket_labels()
+        result = []
+        for index in range(count):
+            row = rows.get(index, ComparisonRow(index))
+            row.label = labels[index] if index < len(labels) else f"+{index - len(labels) + 1}"
+            result.append(row)
+        return result
+
+    def total(self, type='expense'):
+        row = ComparisonRow('Итого')
+        for (cell_type, _category, _index), cell in self.cells.items():
+            if cell_type == type:
+                for name in PERIODS:
+                    row.add(name, getattr(cell, name))
+        return row
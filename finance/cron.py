@@ -1,3 +1,10 @@
+# finance/cron.py
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+
 async def send_telegram_message(telegram_id, message):
     """Отправка сообщения в Telegram"""
     try:
@@ -12,47 +19,37 @@ def send_daily_notifications():
     """Ежедневные уведомления о тратах за день"""
     print("📊 Отправка ежедневных уведомлений...")
 
+    from finance.db_router import read_replica
+    from finance.ledger import balance_at
+    from finance.summaries import PeriodSummary
+
     today = timezone.now().date()
     yesterday = today - timedelta(days=1)
 
-    users = User.objects.all()
+    users = User.objects.select_related('consent')
 
     for user in users:
         try:
-            from finance.models import Transaction
-            transactions = Transaction.objects.filter(
-                user=user,
-                date=yesterday
-            )
+            # Итоги за день - один запрос к дневным сводкам на пользователя (с реплики, если она есть)
+            with read_replica(user):
+                summary = PeriodSummary.for_period(user, yesterday, yesterday)
+                closing_balance = balance_at(user, yesterday)
 
-            if transactions.exists():
-                total_income = transactions.filter(type='income').aggregate(Sum('amount'))['amount__sum'] or 0
-                total_expense = transactions.filter(type='expense').aggregate(Sum('amount'))['amount__sum'] or 0
+            if summary.total_count:
+                total_income = summary.income
+                total_expense = summary.expense
 
                 message = (
                     f"📊 Ежедневный отчет за {yesterday.strftime('%d.%m.%Y')}:\n"
                     f"💵 Доходы: {total_income:.2f} руб.\n"
                     f"💸 Расходы: {total_expense:.2f} руб.\n"
                     f"💰 Баланс: {total_income - total_expense:.2f} руб.\n"
-                    f"📈 Количество операций: {len(transactions)}"
+                    f"🏦 Остаток на счёте: {closing_balance:.2f} руб.\n"
+                    f"📈 Количество операций: {summary.total_count}"
                 )
 
                 print(f"Уведомление для {user.username}: {message}")
 
-                # 🔥 ДОБАВИТЬ ОТПРАВКУ В TELEGRAM
-                # Нужно получить telegram_id пользователя
-                # Пока просто выводим в консоль
-
-        except Exception as e:
-            print(f"❌ Ошибка для пользователя {user.username}: {e}")
-
-    for user in users:
-        try:
-            # ... подсчет транзакций ...
-
-            if transactions.exists():
-                # ... формирование сообщения ...
-
                 # 🔥 ОТПРАВКА В TELEGRAM
                 if hasattr(user, 'consent') and user.consent.telegram_id:
                     import asyncio
@@ -61,4 +58,51 @@ def send_daily_notifications():
                     print(f"⚠️ Не найден telegram_id для {user.username}")
 
         except Exception as e:
-            print(f"❌ Ошибка для пользователя {user.username}: {e}")
\ No newline at end of file
+            print(f"❌ Ошибка для пользователя {user.username}: {e}")
+
+
+def send_weekly_reports():
+    """Еженедельные отчеты за прошлую неделю (см. finance.report_delivery)"""
+    from finance.models import ReportRun
+    from finance.report_delivery import send_reports
+
+    send_reports(ReportRun.WEEKLY)
+
+
+def send_monthly_reports():
+    """Ежемесячные отчеты за прошлый месяц (см. finance.report_delivery)"""
+    from finance.models import ReportRun
+    from finance.report_delivery import send_reports
+
+    send_reports(ReportRun.MONTHLY)
+
+
+def ensure_transaction_partitions():
+    """Создаёт секции finance_transaction наперёд (только PostgreSQL, см. finance.partitioning)"""
+    from django.db import connection
+    from finance.partitioning import ensure_future_partitions, is_partitioned
+
+    if not is_partitioned(connection):
+        print("ℹ️ Таблица операций не секционирована - пропускаем")
+        return
+
+    created = ensure_future_partitions(connection)
+    print(f"🗂 Создано секций: {len(created)} {', '.join(created)}")
+
+
+def archive_cold_history():
+    """Переносит операции старше горизонта в архивные файлы (см. finance.archive)"""
+    from finance.archive import archive_transactions, get_horizon
+
+    horizon = get_horizon()
+    archived = archive_transactions(before=horizon)
+    total = sum(rows for _user_id, _year, rows in archived)
+    print(f"🗄 В архив перенесено операций: {total} (раньше {horizon.strftime('%d.%m.%Y')}, файлов: {len(archived)})")
+
+
+def prune_report_cache():
+    """Удаляет устаревшие и лишние файлы из кэша готовых отчётов (см. finance.report_cache)"""
+    from finance.report_cache import evict
+
+    removed, freed = evict()
+    print(f"🧹 Из кэша отчётов удалено файлов: {removed} ({freed / 1024 / 1024:.1f} МБ)")
@@ -0,0 +1,121 @@
+# finance/db_router.py
+"""
+Маршрутизация запросов между основной БД и репликами только для чтения.
+
+Все записи идут в 'default'. Тяжёлые чтения (отчёты, графики, статистика
+бота и cron) выполняются внутри read_replica(user) и уходят на реплику -
+кроме случая, когда пользователь только что что-то записал: тогда он
+"закреплён" за основной БД на REPLICA_PIN_SECONDS, чтобы сразу видеть
+свои изменения, пока реплика догоняет.
+
+Отметки о закреплении хранятся в основной БД (ReplicaPin), а не в кэше
+процесса: их видят все процессы - веб, бот, импорт, воркеры отчётов и cron.
+Пишутся и читаются они только при настроенных репликах.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+PRIMARY = 'default'
+
+# Алиас реплики для чтений в текущем контексте (поток или asyncio-задача)
+_read_alias = ContextVar('finance_read_alias', default=None)
+
+
+def get_replicas():
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', []) if alias in settings.DATABASES]
+
+
+def _pins():
+    from .models import ReplicaPin
+    return ReplicaPin.objects.using(PRIMARY)
+
+
+def pin_primary(user_id):
+    """Закрепляет пользователя за основной БД после записи."""
+    if user_id is None or not get_replicas():
+        return
+    pinned_until = timezone.now() + timedelta(seconds=getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+    pins = _pins()
+    if not pins.filter(user_id=user_id).update(pinned_until=pinned_until):
+        try:
+            with transaction.atomic(using=PRIMARY):
+                pins.create(user_id=user_id, pinned_until=pinned_until)
+        except IntegrityError:
+            # Отметку одновременно создал другой процесс
+            pins.filter(user_id=user_id).update(pinned_until=pinned_until)
+
+
+def is_pinned(user_id):
+    """Закреплён ли пользователь за основной БД - читается всегда из основной БД."""
+    return user_id is not None and _pins().filter(user_id=user_id, pinned_until__gt=timezone.now()).exists()
+
+
+def choose_read_alias(user=None):
+    """Реплика для чтения данных пользователя или 'default', если реплик нет или он закреплён."""
+    replicas = get_replicas()
+    user_id = getattr(user, 'pk', user)
+    if not replicas or is_pinned(user_id):
+        return PRIMARY
+    return random.choice(replicas)
+
+
+@contextmanager
+def read_replica(user=None):
+    """
+    Чтения ORM внутри блока идут на реплику (см. choose_read_alias).
+    Вложенные блоки сохраняют уже выбранную БД.
+    """
+    if _read_alias.get() is not None:
+        yield _read_alias.get()
+        return
+    alias = choose_read_alias(user)
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def reads_from_replica(func):
+    """Декоратор для функций вида f(user, ...): все их чтения идут через read_replica(user)."""
+    @wraps(func)
+    def wrapper(user, *args, **kwargs):
+        with read_replica(user):
+            return func(user, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    """
+    Записи - в 'default'; чтения - в реплику, выбранную read_replica(),
+    иначе тоже в 'default'. Миграции применяются только к 'default'
+    (реплики получают схему через репликацию).
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Связанные объекты читаем из той же БД, что и исходный объект
+            return instance._state.db
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replicas():
+            return False
+        return None
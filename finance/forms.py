@@ -2,8 +2,49 @@
 from django import forms
 from django.core.exceptions import ValidationError
 from .models import Transaction, Category
+from .categories import category_registry
 import datetime
 
+
+class CategoryChoiceIterator(forms.models.ModelChoiceIterator):
+    """Варианты выбора категории из реестра категорий - без запроса к БД на каждый рендер."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for category in category_registry.all():
+            yield self.choice(category)
+
+    def __len__(self):
+        return len(category_registry.all()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(category_registry.all())
+
+
+class CategoryChoiceField(forms.ModelChoiceField):
+    """
+    Поле выбора категории: список и проверка значения берутся из category_registry.
+    """
+    iterator = CategoryChoiceIterator
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('queryset', Category.objects.all())
+        super().__init__(**kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, Category):
+            return value
+        category = category_registry.get(value)
+        if category is None:
+            raise ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value}
+            )
+        return category
+
+
 class TransactionForm(forms.ModelForm):
     """
     Форма для добавления новой финансовой операции.
@@ -15,6 +56,8 @@ class TransactionForm(forms.ModelForm):
         label="Дата операции", # Изменим отображаемый текст (label) для формы
         help_text="Укажите дату операции." # Добавим подсказку
     )
+    # Категории берутся из реестра в памяти, а не запросом к БД при каждом показе формы
+    category = CategoryChoiceField(label="Категория")
 
     class Meta:
         model = Transaction
@@ -110,4 +153,25 @@ class TransactionForm(forms.ModelForm):
     #     # category = cleaned_data.get("category")
     #     # if ...:
     #     #     raise ValidationError("Некорректная комбинация данных.")
-    #     return cleaned_data
\ No newline at end of file
+    #     return cleaned_data
+
+class StatementImportForm(forms.Form):
+    """
+    Форма загрузки банковской выписки (CSV или XLSX) для массового импорта операций.
+    """
+    FORMAT_CHOICES = [
+        ('', 'Определить по расширению'),
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (XLSX)'),
+    ]
+
+    file = forms.FileField(
+        label="Файл выписки",
+        help_text="Колонки: Дата, Сумма, Тип, Категория, Описание. Подходит файл, выгруженный из FinControl."
+    )
+    file_format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False, label="Формат")
+    default_category = CategoryChoiceField(
+        required=False,
+        label="Категория по умолчанию",
+        help_text="Для строк без категории. Если не выбрана, такие строки будут отклонены."
+    )
@@ -0,0 +1,2 @@
+from .pipeline import ImportResult, StatementImporter, import_statement
+from .readers import detect_format, iter_csv_rows, iter_xlsx_rows
@@ -0,0 +1,240 @@
+# finance/imports/pipeline.py
+"""
+Потоковый импорт банковской выписки в Transaction.
+
+Строки читаются по одной (см. readers), проверяются и копятся в пачку
+фиксированного размера; пачка сохраняется одним bulk_create вместе
+с дельтами дневных сводок в одной транзакции БД. Память не зависит
+от размера файла: в ней держится только текущая пачка и ограниченный
+список ошибок.
+"""
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import router, transaction
+
+from ..categories import category_registry
+from ..columnar import user_changed
+from ..db_router import pin_primary
+from ..ledger import apply_balance_deltas, signed_amount
+from ..models import Transaction
+from ..rollups import apply_deltas, to_decimal
+from ..sqlite_profile import retry_write
+from .readers import detect_format, iter_csv_rows, iter_xlsx_rows
+
+# Допустимые названия колонок (в нижнем регистре), включая заголовки нашей выгрузки в Excel
+COLUMN_ALIASES = {
+    'date': ('date', 'дата', 'дата операции', 'дата платежа'),
+    'amount': ('amount', 'сумма', 'сумма операции', 'сумма платежа'),
+    'type': ('type', 'тип', 'тип операции'),
+    'category': ('category', 'категория'),
+    'description': ('description', 'описание', 'назначение платежа', 'комментарий'),
+}
+
+TYPE_ALIASES = {
+    'income': 'income', 'доход': 'income', 'поступление': 'income', '+': 'income',
+    'expense': 'expense', 'расход': 'expense', 'списание': 'expense', '-': 'expense',
+}
+
+DATE_FORMATS = ('%d.%m.%Y', '%Y-%m-%d', '%d/%m/%Y', '%d.%m.%y')
+
+# Пробелы-разделители тысяч, символ валюты и т.п. в сумме
+AMOUNT_JUNK = re.compile(r'[^\d.+-]')
+
+MAX_AMOUNT = Decimal('9999999999.99')  # max_digits=12, decimal_places=2
+MAX_ERRORS = 100  # Сколько отклонённых строк запоминать с причиной
+
+
+class RowError(ValueError):
+    """Строка выписки не прошла проверку."""
+
+
+@dataclass
+class ImportResult:
+    """Итог импорта: сколько строк прочитано, сохранено, отклонено и за какое время."""
+    total: int = 0
+    imported: int = 0
+    rejected: int = 0
+    elapsed: float = 0.0
+    # [(номер строки, причина)], не больше MAX_ERRORS
+    errors: list = field(default_factory=list)
+
+    @property
+    def rows_per_sec(self):
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+
+class StatementImporter:
+    """
+    Импорт строк выписки для одного пользователя.
+
+    chunk_size: размер пачки для bulk_create
+    default_category: название категории для строк без категории
+    on_progress: callback(ImportResult) после каждой сохранённой пачки
+    dry_run: только проверить строки, ничего не сохраняя
+    """
+
+    def __init__(self, user, chunk_size=2000, default_category=None, on_progress=None, dry_run=False):
+        self.user = user
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+        self.dry_run = dry_run
+        # Справочник категорий берётся из реестра: {название в нижнем регистре: id}
+        self.categories = {category.name.casefold(): category.pk for category in category_registry.all()}
+        self.default_category_id = None
+        if default_category:
+            category = category_registry.by_name(default_category)
+            if category is None:
+                raise ValueError(f"Категория по умолчанию '{default_category}' не найдена")
+            self.default_category_id = category.pk
+
+    def run(self, rows):
+        """Импортирует строки (итератор пар (номер строки, dict)) и возвращает ImportResult."""
+        result = ImportResult()
+        started = time.perf_counter()
+        columns = None
+        batch = []
+
+        for line_number, row in rows:
+            if columns is None:
+                columns = self.resolve_columns(row.keys())
+            result.total += 1
+            try:
+                batch.append(self.build_transaction(row, columns))
+            except RowError as e:
+                result.rejected += 1
+                if len(result.errors) < MAX_ERRORS:
+                    result.errors.append((line_number, str(e)))
+                continue
+
+            if len(batch) >= self.chunk_size:
+                self.flush(batch, result, started)
+                batch = []
+
+        if batch:
+            self.flush(batch, result, started)
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    @staticmethod
+    def resolve_columns(header):
+        """Сопоставляет заголовки файла полям операции: {поле: колонка}."""
+        normalized = {str(name).strip().casefold(): name for name in header if name}
+        columns = {}
+        for field_name, aliases in COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias in normalized:
+                    columns[field_name] = normalized[alias]
+                    break
+        missing = [name for name in ('date', 'amount') if name not in columns]
+        if missing:
+            raise ValueError(f"В файле нет обязательных колонок: {', '.join(missing)}")
+        return columns
+
+    def build_transaction(self, row, columns):
+        """Проверяет строку и возвращает несохранённый Transaction."""
+        operation_date = parse_date(row.get(columns['date']))
+        amount = parse_amount(row.get(columns['amount']))
+
+        raw_type = row.get(columns['type']) if 'type' in columns else None
+        if raw_type not in (None, ''):
+            operation_type = TYPE_ALIASES.get(str(raw_type).strip().casefold())
+            if operation_type is None:
+                raise RowError(f"Неизвестный тип операции: {raw_type}")
+        else:
+            # Без колонки типа знак суммы определяет доход/расход, как в банковских выписках
+            operation_type = 'expense' if amount < 0 else 'income'
+        amount = abs(amount)
+        if amount < Decimal('0.01') or amount > MAX_AMOUNT:
+            raise RowError(f"Недопустимая сумма: {amount}")
+
+        category_name = row.get(columns['category']) if 'category' in columns else None
+        category_name = str(category_name).strip() if category_name is not None else ''
+        if category_name:
+            category_id = self.categories.get(category_name.casefold())
+            if category_id is None:
+                raise RowError(f"Неизвестная категория: {category_name}")
+        elif self.default_category_id is not None:
+            category_id = self.default_category_id
+        else:
+            raise RowError("Не указана категория")
+
+        description = row.get(columns['description']) if 'description' in columns else None
+        description = str(description).strip() if description not in (None, '') else None
+
+        return Transaction(
+            user=self.user, amount=amount, date=operation_date, type=operation_type,
+            category_id=category_id, description=description,
+        )
+
+    def flush(self, batch, result, started):
+        """Сохраняет пачку и обновляет дневные сводки и остатки (bulk_create не вызывает сигналы)."""
+        if not self.dry_run:
+            deltas = defaultdict(lambda: [Decimal('0.00'), 0])
+            nets = defaultdict(Decimal)
+            for obj in batch:
+                delta = deltas[(obj.date, obj.type, obj.category_id)]
+                delta[0] += obj.amount
+                delta[1] += 1
+                nets[obj.date] += signed_amount(obj.type, obj.amount)
+
+            retry_write(self.save_batch, router.db_for_write(Transaction), batch, deltas, nets)
+            pin_primary(self.user.id)
+
+        result.imported += len(batch)
+        result.elapsed = time.perf_counter() - started
+        if self.on_progress:
+            self.on_progress(result)
+
+    def save_batch(self, batch, deltas, nets):
+        with transaction.atomic(using=router.db_for_write(Transaction)):
+            Transaction.objects.bulk_create(batch)
+            apply_deltas(self.user.id, deltas)
+            apply_balance_deltas(self.user.id, nets)
+            # bulk_create не вызывает сигналы - колоночный кэш пользователя загрузится заново
+            user_changed(self.user.id, nets)
+
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip() if value is not None else ''
+    if not text:
+        raise RowError("Не указана дата")
+    text = text.split(' ')[0]  # '21.10.2025 14:30' -> '21.10.2025'
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    raise RowError(f"Некорректная дата: {value}")
+
+
+def parse_amount(value):
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return to_decimal(value)
+    text = str(value).strip() if value is not None else ''
+    if not text:
+        raise RowError("Не указана сумма")
+    # '1 234,50' / '1 234.50' / '-500,00 ₽'
+    text = AMOUNT_JUNK.sub('', text.replace(',', '.'))
+    try:
+        return to_decimal(Decimal(text))
+    except InvalidOperation:
+        raise RowError(f"Некорректная сумма: {value}")
+
+
+def import_statement(user, fileobj, filename=None, file_format=None, **options):
+    """
+    Импортирует файл выписки (CSV или XLSX) для пользователя.
+    Формат берётся из file_format или определяется по имени файла.
+    """
+    file_format = file_format or detect_format(filename or getattr(fileobj, 'name', ''))
+    rows = iter_xlsx_rows(fileobj) if file_format == 'xlsx' else iter_csv_rows(fileobj)
+    return StatementImporter(user, **options).run(rows)
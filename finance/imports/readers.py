@@ -0,0 +1,71 @@
+# finance/imports/readers.py
+"""
+Потоковое чтение банковских выписок (CSV и XLSX).
+
+Читатели отдают строки по одной в виде (номер строки, {колонка: значение}),
+не загружая файл целиком: CSV читается через csv.DictReader поверх
+текстового потока, XLSX - через openpyxl в режиме read_only.
+"""
+import csv
+import io
+import os
+
+import openpyxl
+
+
+def detect_format(filename):
+    """Определяет формат по расширению файла: 'csv' или 'xlsx'."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        return 'xlsx'
+    if extension in ('.csv', '.txt'):
+        return 'csv'
+    raise ValueError(f"Неподдерживаемый формат файла: {extension or filename}")
+
+
+def iter_csv_rows(fileobj, encoding='utf-8-sig', delimiter=None):
+    """
+    Строки CSV-файла. fileobj может быть бинарным (загрузка из формы) или текстовым.
+    Разделитель определяется автоматически по первой строке, если не задан.
+    """
+    if isinstance(fileobj, io.TextIOBase):
+        text = fileobj
+    else:
+        text = io.TextIOWrapper(fileobj, encoding=encoding, newline='')
+
+    if delimiter is None:
+        sample = text.readline()
+        delimiter = ';' if sample.count(';') > sample.count(',') else ','
+        lines = _prepend(sample, text)
+    else:
+        lines = text
+
+    reader = csv.DictReader(lines, delimiter=delimiter)
+    for line_number, row in enumerate(reader, start=2):
+        yield line_number, row
+
+
+def _prepend(first_line, lines):
+    yield first_line
+    yield from lines
+
+
+def iter_xlsx_rows(fileobj, sheet_name=None):
+    """
+    Строки первого листа (или листа sheet_name) XLSX-файла.
+    Первая строка листа считается заголовком.
+    """
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(value).strip() if value is not None else '' for value in header]
+        for line_number, values in enumerate(rows, start=2):
+            if values is None or all(value is None for value in values):
+                continue
+            yield line_number, dict(zip(columns, values))
+    finally:
+        workbook.close()
@@ -0,0 +1,170 @@
+# finance/ledger.py
+"""
+Нарастающий остаток пользователя по дням (DailyBalance).
+
+Каждая строка хранит изменение за день (net) и остаток на конец дня
+(balance). Остаток на дату - одна индексная выборка последней строки
+не позже этой даты. При изменении операции задним числом пересчитывается
+только "хвост" - строки начиная с даты изменения.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+
+from .models import DailyBalance, DailySummary
+from .rollups import to_decimal
+
+ZERO = Decimal('0.00')
+HALF_KOPECK = Decimal('0.005')
+
+
+def signed_amount(type, amount):
+    """Доход увеличивает остаток, расход - уменьшает."""
+    amount = to_decimal(amount)
+    return amount if type == 'income' else -amount
+
+
+def _balance_before(user_id, date):
+    """Остаток на конец дня, предшествующего date."""
+    balance = (
+        DailyBalance.objects.filter(user_id=user_id, date__lt=date)
+        .order_by('-date').values_list('balance', flat=True).first()
+    )
+    return balance if balance is not None else ZERO
+
+
+def apply_balance_delta(user_id, date, amount):
+    """
+    Изменяет остаток на amount начиная с date (amount со знаком, см. signed_amount).
+    Должна вызываться внутри транзакции БД вместе с изменением Transaction.
+    """
+    amount = to_decimal(amount)
+    if not amount:
+        return
+
+    balances = DailyBalance.objects.filter(user_id=user_id)
+    if not balances.filter(date=date).update(net=F('net') + amount):
+        # Новый день: остаток начинается с остатка предыдущего дня, amount добавится ниже
+        try:
+            with transaction.atomic():
+                DailyBalance.objects.create(
+                    user_id=user_id, date=date, net=amount, balance=_balance_before(user_id, date)
+                )
+        except IntegrityError:
+            balances.filter(date=date).update(net=F('net') + amount)
+
+    # Пересчёт хвоста: этот день и все более поздние
+    balances.filter(date__gte=date).update(balance=F('balance') + amount)
+    # День без изменения остатка ничего не добавляет к префиксной сумме.
+    # SQLite считает F()-выражения над decimal в float, поэтому сравниваем с точностью до полкопейки
+    balances.filter(date=date, net__gt=-HALF_KOPECK, net__lt=HALF_KOPECK).delete()
+
+
+def apply_balance_deltas(user_id, nets):
+    """
+    Применяет изменения остатка за много дней разом (массовый импорт):
+    nets - {date: amount со знаком}. Хвост начиная с самой ранней даты
+    пересчитывается за один проход и сохраняется bulk_update/bulk_create.
+    """
+    nets = {date: to_decimal(amount) for date, amount in nets.items() if amount}
+    if not nets:
+        return
+    start = min(nets)
+    running = _balance_before(user_id, start)
+    rows = {
+        row.date: row
+        for row in DailyBalance.objects.select_for_update().filter(user_id=user_id, date__gte=start)
+    }
+
+    to_update, to_create, to_delete = [], [], []
+    for date in sorted(set(rows) | set(nets)):
+        row = rows.get(date)
+        if row is None:
+            row = DailyBalance(user_id=user_id, date=date, net=ZERO)
+        row.net = to_decimal(row.net + nets.get(date, ZERO))
+        running += row.net
+        row.balance = running
+        if row.pk is None:
+            if row.net:
+                to_create.append(row)
+        elif row.net:
+            to_update.append(row)
+        else:
+            to_delete.append(row.pk)
+
+    DailyBalance.objects.bulk_update(to_update, ['net', 'balance'], batch_size=500)
+    DailyBalance.objects.bulk_create(to_create, batch_size=500)
+    if to_delete:
+        DailyBalance.objects.filter(pk__in=to_delete).delete()
+
+
+def balance_at(user, date):
+    """Остаток пользователя на конец дня date - одна индексная выборка."""
+    balance = (
+        DailyBalance.objects.filter(user=user, date__lte=date)
+        .order_by('-date').values_list('balance', flat=True).first()
+    )
+    return balance if balance is not None else ZERO
+
+
+def balance_series(user, start, end):
+    """Остаток на конец каждого дня [start, end]: список пар (дата, остаток)."""
+    current = balance_at(user, start - timedelta(days=1))
+    changes = dict(
+        DailyBalance.objects.filter(user=user, date__gte=start, date__lte=end)
+        .values_list('date', 'balance')
+    )
+
+    result = []
+    day = start
+    while day <= end:
+        current = changes.get(day, current)
+        result.append((day, current))
+        day += timedelta(days=1)
+    return result
+
+
+def rebuild_ledger(user=None):
+    """
+    Полностью пересобирает остатки по дневным сводкам (для всех пользователей
+    или для одного). Возвращает число строк.
+    """
+    with transaction.atomic():
+        balances = DailyBalance.objects.all()
+        summaries = DailySummary.objects.all()
+        if user is not None:
+            balances = balances.filter(user=user)
+            summaries = summaries.filter(user=user)
+        balances.delete()
+
+        grouped = (
+            summaries.order_by('user_id', 'date')
+            .values('user_id', 'date')
+            .annotate(
+                income=Sum('total', filter=Q(type='income')),
+                expense=Sum('total', filter=Q(type='expense')),
+            )
+        )
+
+        created = 0
+        batch = []
+        current_user, running = None, ZERO
+        for row in grouped.iterator(chunk_size=2000):
+            if row['user_id'] != current_user:
+                current_user, running = row['user_id'], ZERO
+            net = to_decimal(row['income']) - to_decimal(row['expense'])
+            if not net:
+                continue
+            running += net
+            batch.append(DailyBalance(user_id=row['user_id'], date=row['date'], net=net, balance=running))
+            if len(batch) >= 2000:
+                DailyBalance.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            DailyBalance.objects.bulk_create(batch)
+            created += len(batch)
+
+    return created
@@ -0,0 +1,56 @@
+# finance/management/commands/archive_transactions.py
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Move transactions older than the archive horizon into compressed per-user, per-year '
+        'columnar files under MEDIA_ROOT (reports keep reading them transparently)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='Archive transactions dated before YYYY-MM-DD')
+        parser.add_argument('--days', type=int,
+                            help='Archive transactions older than this many days (default: TRANSACTION_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--username', help='Archive only this user')
+        parser.add_argument('--dry-run', action='store_true', help='Only show what would be archived')
+
+    def handle(self, *args, **options):
+        from finance.archive import archive_candidates, archive_transactions, get_horizon
+        from finance.models import ArchiveShard
+
+        if options['before']:
+            try:
+                before = datetime.strptime(options['before'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--before must be YYYY-MM-DD')
+        elif options['days'] is not None:
+            before = date.today() - timedelta(days=options['days'])
+        else:
+            before = get_horizon()
+
+        user = None
+        if options['username']:
+            try:
+                user = User.objects.get(username=options['username'])
+            except User.DoesNotExist:
+                self.stdout.write(self.style.ERROR(f"❌ User '{options['username']}' not found"))
+                return
+
+        if options['dry_run']:
+            candidates = archive_candidates(before, user)
+            for user_id, year, rows in candidates:
+                self.stdout.write(f'  user {user_id}, {year}: {rows} transactions')
+            total = sum(rows for _user_id, _year, rows in candidates)
+            self.stdout.write(f'Dry run: {total} transactions before {before} would be archived')
+            return
+
+        archived = archive_transactions(before=before, user=user)
+        for user_id, year, rows in archived:
+            shard = ArchiveShard.objects.get(user_id=user_id, year=year)
+            self.stdout.write(f'  user {user_id}, {year}: +{rows} → {shard.rows} archived ({shard.file.name})')
+        total = sum(rows for _user_id, _year, rows in archived)
+        self.stdout.write(self.style.SUCCESS(f'✅ Archived {total} transactions dated before {before}'))
@@ -0,0 +1,296 @@
+# finance/management/commands/bench.py
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import date, timedelta
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from finance.benchmarks import fork_available, measure_in_child, peak_rss_mb, scratch_database
+
+# Отчёты - за последний год, графики - за свои периоды, как в боте
+REPORT_DAYS = 365
+
+
+def _excel_report(user):
+    from finance.reports.excel_report import generate_excel_report
+    generate_excel_report(user, date.today() - timedelta(days=REPORT_DAYS - 1), date.today())
+
+
+def _pdf_report(user):
+    from finance.reports.pdf_report import generate_pdf_report
+    generate_pdf_report(user, date.today() - timedelta(days=REPORT_DAYS - 1), date.today())
+
+
+def _window(user, start_date, end_date):
+    from finance.columnar import columnar_cache
+    return columnar_cache.window(user, start_date, end_date)
+
+
+def _chart_weekly(user):
+    from telegram_bot import generate_weekly_chart
+    today = date.today()
+    generate_weekly_chart(_window(user, today - timedelta(days=today.weekday()), today).series('day'))
+
+
+def _chart_monthly(user):
+    from telegram_bot import generate_monthly_chart
+    today = date.today()
+    generate_monthly_chart(_window(user, today.replace(day=1), today).series('day'))
+
+
+def _chart_yearly(user):
+    from telegram_bot import generate_yearly_chart
+    today = date.today()
+    generate_yearly_chart(_window(user, today.replace(month=1, day=1), today).series('month'))
+
+
+def _chart_categories(user):
+    from telegram_bot import generate_category_pie_chart
+    today = date.today()
+    window = _window(user, today.replace(day=1), today)
+    generate_category_pie_chart(window.series('day', split_by='category', type='expense'))
+
+
+def _advice(user):
+    from telegram_bot import generate_advice
+    today = date.today()
+    generate_advice(_window(user, today.replace(day=1), today))
+
+
+def _daily_notifications(user):
+    from finance.cron import send_daily_notifications
+    send_daily_notifications()
+
+
+def _view(path):
+    def run(user):
+        from django.test import Client
+
+        client = Client()
+        client.force_login(user)
+        response = client.get(path)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {path}: HTTP {response.status_code}')
+        # Файловые ответы отдаются потоком - дочитываем, чтобы измерить всю генерацию
+        if response.streaming:
+            for _chunk in response.streaming_content:
+                pass
+    return run
+
+
+CASES = {
+    'excel_report': _excel_report,
+    'pdf_report': _pdf_report,
+    'chart_weekly': _chart_weekly,
+    'chart_monthly': _chart_monthly,
+    'chart_yearly': _chart_yearly,
+    'chart_categories': _chart_categories,
+    'advice': _advice,
+    'daily_notifications': _daily_notifications,
+    'view_index': _view('/'),
+    'view_transactions': _view('/transactions/'),
+    'view_transactions_search': _view('/transactions/?q=%D0%9A%D0%BE%D1%84%D0%B5'),  # ?q=Кофе
+    'view_report_builder': _view('/transactions/reports/'),
+    'view_quick_report_pdf': _view('/transactions/reports/quick/?type=month&format=pdf'),
+    'view_quick_report_excel': _view('/transactions/reports/quick/?type=year&format=excel'),
+}
+# Графики и совет - функции бота (telegram_bot)
+BOT_CASES = {'chart_weekly', 'chart_monthly', 'chart_yearly', 'chart_categories', 'advice'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Reproducible benchmark on a scratch SQLite file seeded by seed_data: report generators, '
+        'bot charts and advice, daily notifications and main views. Records wall time, peak RSS '
+        'and query counts to JSON and compares them with a stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3, help='Users to seed')
+        parser.add_argument('--transactions', type=int, default=20_000, help='Transactions per user')
+        parser.add_argument('--days', type=int, default=730, help='History length in days')
+        parser.add_argument('--seed', type=int, default=42, help='seed_data random seed')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per case (median time is reported)')
+        parser.add_argument('--cases', nargs='+', choices=sorted(CASES), help='Run only these cases')
+        parser.add_argument('--output', default='bench_results.json', help='Where to write results')
+        parser.add_argument('--baseline', help='Baseline JSON to compare with')
+        parser.add_argument('--save-baseline', action='store_true', help='Also write results to --baseline')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative slowdown (0.2 = 20%%) reported as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error on regressions')
+
+    def handle(self, *args, **options):
+        if not fork_available():
+            raise CommandError('❌ Cases run in forked processes to isolate peak RSS (Linux/macOS only)')
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('❌ --save-baseline needs --baseline PATH')
+
+        cases = options['cases'] or list(CASES)
+        cases = self._available(cases)
+        self._warm_up()
+
+        # Работаем с временной базой и каталогом файлов, не трогая рабочие db.sqlite3 и media
+        results = {}
+        with scratch_database():
+            self.stdout.write(f"Seeding {options['users']} users x {options['transactions']:,} transactions...")
+            call_command(
+                'seed_data', users=options['users'], transactions=options['transactions'],
+                days=options['days'], seed=options['seed'], prefix='bench', stdout=io.StringIO(),
+            )
+            user_id = self._user_id(options['seed'])
+
+            for name in cases:
+                self.stdout.write(f'Running {name}...')
+                runs = [self._measure(name, user_id) for _ in range(options['repeat'])]
+                errors = [run['error'] for run in runs if 'error' in run]
+                if errors:
+                    self.stdout.write(self.style.ERROR(f'❌ {name}: {errors[0]}'))
+                    continue
+                results[name] = {
+                    'seconds': statistics.median(run['seconds'] for run in runs),
+                    'peak_rss_mb': max(run['peak_rss_mb'] for run in runs),
+                    'rss_growth_mb': max(run['rss_growth_mb'] for run in runs),
+                    'queries': runs[0]['queries'],
+                }
+
+        report = {'meta': self._meta(options), 'cases': results}
+        self._write(options['output'], report)
+        self._print(results)
+
+        if options['baseline'] and os.path.exists(options['baseline']) and not options['save_baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = self._compare(report, baseline, options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"❌ Regressions: {', '.join(regressions)}")
+        if options['save_baseline']:
+            self._write(options['baseline'], report)
+
+    def _available(self, cases):
+        """Функции бота нужны из telegram_bot: без aiogram/matplotlib эти замеры пропускаются."""
+        if not BOT_CASES & set(cases):
+            return cases
+        # Токен нужен только для импорта модуля бота: засеянные пользователи без telegram_id, сообщения не отправляются
+        os.environ.setdefault('BOT_TOKEN', '0:bench')
+        try:
+            import telegram_bot  # noqa: F401 - импорт один раз до fork, а не в каждом замере
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f'⚠️ Bot cases skipped: {e}'))
+            return [name for name in cases if name not in BOT_CASES]
+        return cases
+
+    def _warm_up(self):
+        """Генераторы, шрифт и стили загружаются до fork: замер не включает импорт модулей."""
+        import openpyxl  # noqa: F401
+        from finance.reports.pdf_report import get_styles
+        get_styles()
+
+    def _user_id(self, seed):
+        from django.contrib.auth.models import User
+        return User.objects.get(username=f'bench_{seed}_0').pk
+
+    def _measure(self, name, user_id):
+        """Замер в отдельном процессе: его пиковый RSS не смешивается с другими замерами."""
+        from finance.models import SavedReport
+
+        # Кэш готовых отчётов очищаем - каждый замер строит отчёт заново
+        SavedReport.objects.exclude(cache_key='').delete()
+        return measure_in_child(_run_case, name, user_id)
+
+    def _meta(self, options):
+        return {
+            'users': options['users'],
+            'transactions': options['transactions'],
+            'days': options['days'],
+            'seed': options['seed'],
+            'repeat': options['repeat'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'machine': platform.machine(),
+            'created_at': timezone.now().isoformat(),
+        }
+
+    def _write(self, path, report):
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2, ensure_ascii=False)
+        self.stdout.write(f'💾 Results written to {path}')
+
+    def _print(self, results):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'\n{"case":<26} {"seconds":>8} {"peak RSS":>9} {"RSS +":>8} {"queries":>8}'
+        ))
+        for name, data in results.items():
+            self.stdout.write(
+                f'{name:<26} {data["seconds"]:>8.3f} {data["peak_rss_mb"]:>7.1f}MB '
+                f'{data["rss_growth_mb"]:>6.1f}MB {data["queries"]:>8}'
+            )
+
+    def _compare(self, report, baseline, threshold):
+        """Сравнение с базовой линией; возвращает названия замеров с регрессией."""
+        keys = ('users', 'transactions', 'days', 'seed')
+        if any(report['meta'].get(key) != baseline.get('meta', {}).get(key) for key in keys):
+            self.stdout.write(self.style.WARNING('⚠️ Baseline was recorded with different data parameters'))
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'\n{"case":<26} {"base s":>8} {"now s":>8} {"change":>8} {"base q":>7} {"now q":>7}'
+        ))
+        regressions = []
+        for name, data in report['cases'].items():
+            base = baseline.get('cases', {}).get(name)
+            if base is None:
+                self.stdout.write(f'{name:<26} {"-":>8} {data["seconds"]:>8.3f}')
+                continue
+            change = data['seconds'] / base['seconds'] - 1 if base['seconds'] else 0.0
+            slower = change > threshold
+            more_queries = data['queries'] > base['queries']
+            line = (
+                f'{name:<26} {base["seconds"]:>8.3f} {data["seconds"]:>8.3f} {change:>+7.0%} '
+                f'{base["queries"]:>7} {data["queries"]:>7}'
+            )
+            if slower or more_queries:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(f'{line}  ❌'))
+            elif change < -threshold:
+                self.stdout.write(self.style.SUCCESS(f'{line}  ✅'))
+            else:
+                self.stdout.write(line)
+        return regressions
+
+
+def _run_case(name, user_id, queue):
+    from django.contrib.auth.models import User
+    from django.test.utils import setup_test_environment
+
+    try:
+        # testserver в ALLOWED_HOSTS для тестового клиента Django
+        setup_test_environment()
+        user = User.objects.get(pk=user_id)
+        with contextlib.ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            # print-отладка генераторов и уведомлений не попадает в вывод замера
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            rss_before = peak_rss_mb()
+            started = time.perf_counter()
+            CASES[name](user)
+            seconds = time.perf_counter() - started
+        peak = peak_rss_mb()
+        queue.put({
+            'seconds': seconds,
+            'peak_rss_mb': peak,
+            'rss_growth_mb': peak - rss_before,
+            'queries': sum(len(context.captured_queries) for context in captured),
+        })
+    except Exception as e:
+        queue.put({'error': f'{type(e).__name__}: {e}'})
+    finally:
+        connections.close_all()
@@ -0,0 +1,126 @@
+# finance/management/commands/bench_amount_sum.py
+import json
+import statistics
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+DECIMAL_TABLE = 'bench_amount_decimal'
+MINOR_TABLE = 'bench_amount_minor'
+
+# Как было (DECIMAL(12, 2)) и как стало (BIGINT копеек, finance.money)
+TABLES = {
+    DECIMAL_TABLE: 'numeric(12, 2)',
+    MINOR_TABLE: 'bigint',
+}
+
+# Суммы 0.01 .. 5000.00: копейки считаются на стороне БД из номера строки
+MINOR_EXPRESSION = '((g * 7919) % 500000) + 1'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare SUM() over a large synthetic amount column stored as DECIMAL(12, 2) '
+        'vs integer minor units (BIGINT kopecks), in SQL and in Python'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to use')
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Rows to generate in each table')
+        parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions per measurement')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark tables')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.stdout.write(self.style.ERROR('❌ This benchmark supports SQLite and PostgreSQL'))
+            return
+
+        results = {'vendor': connection.vendor, 'rows': options['rows'], 'tables': {}}
+        with connection.cursor() as cursor:
+            try:
+                expected = self._build(cursor, connection.vendor, options['rows'])
+                results['expected_sum'] = str(expected)
+                for table in TABLES:
+                    self.stdout.write(f'Measuring {table}...')
+                    results['tables'][table] = self._bench_table(cursor, table, expected, options['repeat'])
+            finally:
+                if not options['keep']:
+                    for table in TABLES:
+                        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self._print(results)
+
+    def _build(self, cursor, vendor, rows):
+        """Заполняет обе таблицы одними и теми же суммами, возвращает точный итог (Decimal)."""
+        if vendor == 'postgresql':
+            source = 'SELECT g FROM generate_series(1, %s) AS g'
+        else:
+            source = (
+                'WITH RECURSIVE seq(g) AS (SELECT 1 UNION ALL SELECT g + 1 FROM seq WHERE g < %s) '
+                'SELECT g FROM seq'
+            )
+        minor = MINOR_EXPRESSION.replace('%', '%%')
+        for table, column_type in TABLES.items():
+            self.stdout.write(f'Building {table} ({rows:,} rows)...')
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+            cursor.execute(f'CREATE TABLE {table} (id bigint PRIMARY KEY, amount {column_type} NOT NULL)')
+            value = f'({minor}) / 100.0' if table == DECIMAL_TABLE else minor
+            if vendor == 'postgresql':
+                insert = f'INSERT INTO {table} SELECT g, {value} FROM ({source}) AS s'
+            else:
+                insert = f'INSERT INTO {table} {source.replace("SELECT g FROM seq", f"SELECT g, {value} FROM seq")}'
+            cursor.execute(insert, [rows])
+            if vendor == 'postgresql':
+                cursor.execute(f'VACUUM ANALYZE {table}')
+
+        # Эталон - целочисленная сумма на стороне Python, без участия БД
+        g = np.arange(1, rows + 1, dtype=np.int64)
+        return Decimal(int((((g * 7919) % 500000) + 1).sum())).scaleb(-2)
+
+    def _bench_table(self, cursor, table, expected, repeat):
+        minor = table == MINOR_TABLE
+
+        def sql_sum():
+            cursor.execute(f'SELECT SUM(amount) FROM {table}')
+            total = cursor.fetchone()[0]
+            return Decimal(int(total)).scaleb(-2) if minor else Decimal(str(total))
+
+        def python_sum():
+            # Как отчёты и кэш бота: все суммы в процесс, свёртка на стороне Python
+            cursor.execute(f'SELECT amount FROM {table}')
+            if minor:
+                values = np.fromiter((row[0] for row in cursor.fetchall()), dtype=np.int64)
+                return Decimal(int(values.sum())).scaleb(-2)
+            # SQLite отдаёт DECIMAL как float - так же его переводит DecimalField
+            return sum((Decimal(str(row[0])) for row in cursor.fetchall()), Decimal('0')).quantize(Decimal('0.01'))
+
+        result = {}
+        for name, measure in (('sql_sum', sql_sum), ('python_sum', python_sum)):
+            times = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                total = measure()
+                times.append(time.perf_counter() - started)
+            result[name] = {
+                'median_ms': statistics.median(times) * 1000,
+                'total': str(total),
+                'exact': total == expected,
+            }
+        return result
+
+    def _print(self, results):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'\n{results["vendor"]}, {results["rows"]:,} rows, expected sum {results["expected_sum"]}'
+        ))
+        for table, data in results['tables'].items():
+            for name, timing in data.items():
+                mark = '✅' if timing['exact'] else f'❌ got {timing["total"]}'
+                self.stdout.write(f'  {table:<22} {name:<11} {timing["median_ms"]:10.1f} ms  {mark}')
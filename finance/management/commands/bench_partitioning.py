@@ -0,0 +1,182 @@
+# finance/management/commands/bench_partitioning.py
+import json
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from finance.partitioning import interval_start, next_start
+
+PLAIN_TABLE = 'bench_txn_plain'
+PARTITIONED_TABLE = 'bench_txn_partitioned'
+
+COLUMNS = """
+    id bigint NOT NULL,
+    user_id integer NOT NULL,
+    "date" date NOT NULL,
+    type varchar(10) NOT NULL,
+    amount bigint NOT NULL,
+    category_id integer NOT NULL,
+    description text
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare range queries and VACUUM/ANALYZE cost on a large synthetic transaction table, '
+        'plain vs partitioned by date (PostgreSQL only)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to use')
+        parser.add_argument('--rows', type=int, default=50_000_000, help='Rows to generate in each table')
+        parser.add_argument('--users', type=int, default=10_000, help='Distinct users in the data')
+        parser.add_argument('--years', type=int, default=5, help='Years of history, ending today')
+        parser.add_argument('--interval', choices=['month', 'year'], default='month', help='Partition interval')
+        parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions per query')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark tables')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.ERROR('❌ This benchmark needs PostgreSQL (use --settings with a PG database)'))
+            return
+
+        end = date.today()
+        start = end - timedelta(days=365 * options['years'])
+        results = {'rows': options['rows'], 'interval': options['interval'], 'tables': {}}
+
+        with connection.cursor() as cursor:
+            try:
+                for table, partitioned in ((PLAIN_TABLE, False), (PARTITIONED_TABLE, True)):
+                    self.stdout.write(f'Building {table} ({options["rows"]:,} rows)...')
+                    results['tables'][table] = self._bench_table(cursor, table, partitioned, start, end, options)
+            finally:
+                if not options['keep']:
+                    cursor.execute(f'DROP TABLE IF EXISTS {PLAIN_TABLE}, {PARTITIONED_TABLE}')
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, default=str))
+        else:
+            self._print(results)
+
+    def _bench_table(self, cursor, table, partitioned, start, end, options):
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+        if partitioned:
+            cursor.execute(f'CREATE TABLE {table} ({COLUMNS}) PARTITION BY RANGE ("date")')
+            current = interval_start(start, options['interval'])
+            while current <= end:
+                following = next_start(current, options['interval'])
+                cursor.execute(
+                    f"CREATE TABLE {table}_{current:%Y%m} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{current.isoformat()}') TO ('{following.isoformat()}')"
+                )
+                current = following
+        else:
+            cursor.execute(f'CREATE TABLE {table} ({COLUMNS})')
+
+        # Данные генерируются на стороне сервера, чтобы не гонять 50M строк через Python
+        days = (end - start).days + 1
+        load_started = time.perf_counter()
+        cursor.execute(
+            f"""
+            INSERT INTO {table}
+            SELECT g,
+                   (g %% %s) + 1,
+                   %s::date + (g %% %s)::integer,
+                   CASE WHEN g %% 5 = 0 THEN 'income' ELSE 'expense' END,
+                   (g * 7919) %% 500000,
+                   (g %% 12) + 1,
+                   NULL
+            FROM generate_series(1, %s) AS g
+            """,
+            [options['users'], start, days, options['rows']],
+        )
+        load_time = time.perf_counter() - load_started
+
+        index_started = time.perf_counter()
+        cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, "date")')
+        cursor.execute(f'CREATE INDEX {table}_user_date_type_idx ON {table} (user_id, "date", type)')
+        index_time = time.perf_counter() - index_started
+
+        maintenance = {
+            'load_s': load_time,
+            'index_s': index_time,
+            'vacuum_analyze_s': self._timed(cursor, f'VACUUM ANALYZE {table}'),
+            'analyze_s': self._timed(cursor, f'ANALYZE {table}'),
+        }
+        if partitioned:
+            # Обслуживание только "горячей" секции - типичный ежедневный случай
+            latest = f'{table}_{interval_start(end, options["interval"]):%Y%m}'
+            maintenance['vacuum_analyze_latest_partition_s'] = self._timed(cursor, f'VACUUM ANALYZE {latest}')
+
+        month_start = end.replace(day=1)
+        year_start = end.replace(month=1, day=1)
+        queries = {
+            'one user, current month': (
+                f'SELECT * FROM {table} WHERE user_id = 42 AND "date" >= %s AND "date" <= %s ORDER BY "date"',
+                [month_start, end],
+            ),
+            'one user, totals for year': (
+                f'SELECT type, SUM(amount) FROM {table} WHERE user_id = 42 AND "date" >= %s AND "date" <= %s GROUP BY type',
+                [year_start, end],
+            ),
+            'all users, totals for month': (
+                f'SELECT type, SUM(amount) FROM {table} WHERE "date" >= %s AND "date" <= %s GROUP BY type',
+                [month_start, end],
+            ),
+        }
+        timings = {}
+        for title, (sql, params) in queries.items():
+            timings[title] = self._explain(cursor, sql, params, options['repeat'])
+
+        cursor.execute('SELECT pg_total_relation_size(%s::regclass)', [table])
+        size = cursor.fetchone()[0]
+        if partitioned:
+            cursor.execute(
+                'SELECT COALESCE(SUM(pg_total_relation_size(inhrelid)), 0) FROM pg_inherits WHERE inhparent = %s::regclass',
+                [table],
+            )
+            size = cursor.fetchone()[0]
+
+        return {'maintenance': maintenance, 'queries': timings, 'size_mb': size / 1024 / 1024}
+
+    @staticmethod
+    def _timed(cursor, sql):
+        started = time.perf_counter()
+        cursor.execute(sql)
+        return time.perf_counter() - started
+
+    @staticmethod
+    def _explain(cursor, sql, params, repeat):
+        """Медиана времени выполнения по EXPLAIN ANALYZE и число просканированных секций/таблиц."""
+        times = []
+        relations = set()
+        for _ in range(repeat):
+            cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            times.append(plan[0]['Execution Time'])
+            relations = set(_relations(plan[0]['Plan']))
+        return {'median_ms': statistics.median(times), 'relations_scanned': len(relations)}
+
+    def _print(self, results):
+        for table, data in results['tables'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{table} ({data["size_mb"]:.0f} MB)'))
+            for name, seconds in data['maintenance'].items():
+                self.stdout.write(f'  {name:<36} {seconds:10.2f} s')
+            for title, timing in data['queries'].items():
+                self.stdout.write(
+                    f'  {title:<36} {timing["median_ms"]:10.2f} ms  ({timing["relations_scanned"]} relations scanned)'
+                )
+
+
+def _relations(plan):
+    if 'Relation Name' in plan:
+        yield plan['Relation Name']
+    for child in plan.get('Plans', []):
+        yield from _relations(child)
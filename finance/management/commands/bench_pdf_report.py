@@ -0,0 +1,105 @@
+# finance/management/commands/bench_pdf_report.py
+import json
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from finance.benchmarks import fork_available, measure_in_child, peak_rss_mb, scratch_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure PDF report generation time and peak RSS for N transactions on a scratch '
+        'SQLite file: full detail (chunked tables) vs the default 50-row preview'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000], help='Transaction counts to test')
+        parser.add_argument('--modes', nargs='+', choices=['full', 'preview'], default=['full', 'preview'])
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        if not fork_available():
+            self.stdout.write(self.style.ERROR('❌ Peak RSS is measured in forked processes (Linux/macOS only)'))
+            return
+
+        # Работаем с временной базой, не трогая рабочий db.sqlite3
+        results = []
+        with scratch_database(prefix='fincontrol_bench_pdf_'):
+            for rows in options['rows']:
+                self.stdout.write(f'Seeding {rows:,} transactions...')
+                user = self._seed(rows)
+                for mode in options['modes']:
+                    self.stdout.write(f'Generating {mode} PDF for {rows:,} rows...')
+                    # Отчёт строится в отдельном процессе: его пиковый RSS не смешивается с другими прогонами
+                    results.append({'rows': rows, 'mode': mode, **measure_in_child(_generate, user.pk, mode)})
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self._print(results)
+
+    def _seed(self, rows):
+        from django.contrib.auth.models import User
+        from finance.categories import category_registry
+        from finance.ledger import rebuild_ledger
+        from finance.models import Category, Transaction
+        from finance.rollups import rebuild_rollups
+
+        categories = [Category.objects.get_or_create(name=name)[0] for name in ('Еда', 'Транспорт', 'Зарплата', 'Кафе')]
+        category_registry.invalidate()
+        user = User.objects.create_user(username=f'bench_pdf_{rows}')
+
+        rnd = random.Random(rows)
+        today = date.today()
+        Transaction.objects.bulk_create(
+            (
+                Transaction(
+                    user=user, amount=Decimal(rnd.randint(100, 500000)) / 100,
+                    date=today - timedelta(days=rnd.randrange(365)), type=rnd.choice(['income', 'expense']),
+                    category=rnd.choice(categories), description=rnd.choice(['', 'Кофе', 'Такси до работы', None]),
+                )
+                for _ in range(rows)
+            ),
+            batch_size=5000,
+        )
+        rebuild_rollups(user=user)
+        rebuild_ledger(user=user)
+        return user
+
+    def _print(self, results):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'\n{"rows":>8} {"mode":<8} {"seconds":>8} {"pages":>6} {"size MB":>8} {"RSS before":>11} {"peak RSS":>9}'
+        ))
+        for data in results:
+            self.stdout.write(
+                f'{data["rows"]:>8} {data["mode"]:<8} {data["seconds"]:>8.2f} {data["pages"]:>6} '
+                f'{data["size_mb"]:>8.1f} {data["rss_before_mb"]:>9.1f}MB {data["peak_rss_mb"]:>7.1f}MB'
+            )
+
+
+def _generate(user_id, mode, queue):
+    from django.contrib.auth.models import User
+    from finance.reports.pdf_report import pdf_report_file
+
+    try:
+        user = User.objects.get(pk=user_id)
+        rss_before = peak_rss_mb()
+        started = time.perf_counter()
+        report = pdf_report_file(user, date.today() - timedelta(days=365), date.today(), full_detail=mode == 'full')
+        seconds = time.perf_counter() - started
+        content = report.read()
+        report.close()
+        queue.put({
+            'seconds': seconds,
+            'pages': content.count(b'/Type /Page\n') or content.count(b'/Type /Page'),
+            'size_mb': len(content) / 1024 / 1024,
+            'rss_before_mb': rss_before,
+            'peak_rss_mb': peak_rss_mb(),
+        })
+    finally:
+        connections.close_all()
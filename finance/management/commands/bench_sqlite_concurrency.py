@@ -0,0 +1,194 @@
+# finance/management/commands/bench_sqlite_concurrency.py
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from queue import SimpleQueue
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate bot writers alongside report readers on a scratch SQLite file and report '
+        'p50/p99 latency, with and without the SQLite profile (finance.sqlite_profile)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Concurrent writers (bot /add)')
+        parser.add_argument('--readers', type=int, default=2, help='Concurrent readers (reports, charts)')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per run')
+        parser.add_argument('--seed-rows', type=int, default=20000, help='Transactions seeded before each run')
+        parser.add_argument('--threads', action='store_true', help='Use threads instead of forked processes')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        from finance.sqlite_profile import sqlite_profile
+
+        if connection.vendor != 'sqlite':
+            self.stdout.write(self.style.ERROR('❌ This benchmark targets SQLite'))
+            return
+
+        # Работаем с временной копией схемы, не трогая рабочий db.sqlite3
+        database = connections.settings['default']
+        original = {key: database.get(key) for key in ('NAME', 'OPTIONS', 'WRITE_RETRIES')}
+        workdir = tempfile.mkdtemp(prefix='fincontrol_bench_')
+        results = {}
+        try:
+            for mode in ('plain', 'profile'):
+                configured = sqlite_profile(original) if mode == 'profile' else dict(original)
+                self._switch_database(database, os.path.join(workdir, f'{mode}.sqlite3'), configured)
+                self.stdout.write(f'Running {mode} ({options["writers"]} writers, {options["readers"]} readers)...')
+                results[mode] = self._run(options)
+        finally:
+            self._switch_database(database, original['NAME'], original)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self._print(results)
+
+    @staticmethod
+    def _switch_database(database, name, configured):
+        connections.close_all()
+        database['NAME'] = name
+        database['OPTIONS'] = configured.get('OPTIONS') or {}
+        if configured.get('WRITE_RETRIES'):
+            database['WRITE_RETRIES'] = configured['WRITE_RETRIES']
+        else:
+            database.pop('WRITE_RETRIES', None)
+
+    def _run(self, options):
+        from django.contrib.auth.models import User
+        from finance.categories import category_registry
+        from finance.ledger import rebuild_ledger
+        from finance.models import Category, Transaction
+        from finance.rollups import rebuild_rollups
+
+        call_command('migrate', verbosity=0)
+        category_registry.invalidate()
+        categories = [Category.objects.get_or_create(name=name)[0] for name in ('Еда', 'Транспорт', 'Зарплата')]
+        users = [User.objects.create_user(username=f'bench_writer_{i}') for i in range(options['writers'])]
+        category_registry.load()
+
+        rnd = random.Random(42)
+        today = date.today()
+        Transaction.objects.bulk_create(
+            [
+                Transaction(
+                    user=rnd.choice(users), amount=Decimal(rnd.randint(100, 500000)) / 100,
+                    date=today - timedelta(days=rnd.randrange(365)), type=rnd.choice(['income', 'expense']),
+                    category=rnd.choice(categories),
+                )
+                for _ in range(options['seed_rows'])
+            ],
+            batch_size=2000,
+        )
+        rebuild_rollups()
+        rebuild_ledger()
+        connections.close_all()
+
+        deadline = time.time() + options['duration']
+        jobs = [('write', user.pk) for user in users] + [('read', None)] * options['readers']
+        use_processes = not options['threads'] and 'fork' in multiprocessing.get_all_start_methods()
+
+        if use_processes:
+            # Отдельные процессы - как бот, веб и cron: у каждого своё соединение и свой GIL
+            context = multiprocessing.get_context('fork')
+            queue = context.Queue()
+            workers = [context.Process(target=_worker, args=(role, user_id, deadline, queue)) for role, user_id in jobs]
+        else:
+            queue = SimpleQueue()
+            workers = [threading.Thread(target=_worker, args=(role, user_id, deadline, queue)) for role, user_id in jobs]
+        for worker in workers:
+            worker.start()
+        outcomes = [queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+
+        samples = {'write': [], 'read': []}
+        errors = {'write': 0, 'read': 0}
+        for role, latencies, failed in outcomes:
+            samples[role].extend(latencies)
+            errors[role] += failed
+
+        return {
+            role: {
+                'ops': len(values),
+                'ops_per_sec': len(values) / options['duration'],
+                'p50_ms': _percentile(values, 50) * 1000,
+                'p99_ms': _percentile(values, 99) * 1000,
+                'errors': errors[role],
+            }
+            for role, values in samples.items()
+        }
+
+    def _print(self, results):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'\n{"mode":<8} {"role":<6} {"ops":>7} {"ops/s":>8} {"p50 ms":>9} {"p99 ms":>9} {"errors":>7}'
+        ))
+        for mode, roles in results.items():
+            for role, data in roles.items():
+                self.stdout.write(
+                    f'{mode:<8} {role:<6} {data["ops"]:>7} {data["ops_per_sec"]:>8.1f} '
+                    f'{data["p50_ms"]:>9.1f} {data["p99_ms"]:>9.1f} {data["errors"]:>7}'
+                )
+
+
+def _worker(role, user_id, deadline, queue):
+    """
+    Писатель (как /add в боте: операция + сводки и остатки в одной транзакции)
+    или читатель (как отчёт за месяц и график). Результат - (роль, задержки, ошибки).
+    """
+    from django.contrib.auth.models import User
+    from finance.analytics import series
+    from finance.categories import category_registry
+    from finance.models import Transaction
+    from finance.reports import generate_excel_report
+
+    rnd = random.Random(user_id)
+    today = date.today()
+    latencies, failed = [], 0
+    try:
+        users = list(User.objects.filter(username__startswith='bench_writer_'))
+        user = next((candidate for candidate in users if candidate.pk == user_id), None)
+        categories = category_registry.all()
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                if role == 'write':
+                    Transaction.objects.create(
+                        user=user, amount=Decimal(rnd.randint(100, 100000)) / 100,
+                        date=today - timedelta(days=rnd.randrange(30)),
+                        type=rnd.choice(['income', 'expense']),
+                        category=rnd.choice(categories), description='bench',
+                    )
+                else:
+                    reader_user = rnd.choice(users)
+                    generate_excel_report(reader_user, today - timedelta(days=30), today)
+                    series(reader_user, today - timedelta(days=30), today)
+            except OperationalError:
+                failed += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+    finally:
+        connections.close_all()
+        queue.put((role, latencies, failed))
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1] if percent < 100 else max(values)
@@ -0,0 +1,139 @@
+# finance/management/commands/explain_transactions.py
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+
+BENCH_USERNAME = 'explain_bench'
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN and timings for the canonical Transaction queries '
+        '(works with SQLite and with PostgreSQL via --settings)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to use')
+        parser.add_argument('--username', help='Use an existing user instead of seeding a synthetic one')
+        parser.add_argument('--years', type=int, default=3, help='Years of history to seed')
+        parser.add_argument('--per-day', type=int, default=5, help='Transactions per day to seed')
+        parser.add_argument('--repeat', type=int, default=20, help='Timing repetitions per query')
+        parser.add_argument('--analyze', action='store_true', help='EXPLAIN ANALYZE (PostgreSQL only)')
+        parser.add_argument('--keep', action='store_true', help='Keep seeded data instead of rolling back')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        connection = connections[alias]
+        self.stdout.write(f'Database: {connection.vendor} ({alias})')
+
+        with transaction.atomic(using=alias):
+            if options['username']:
+                user = User.objects.using(alias).get(username=options['username'])
+            else:
+                user = self._seed(alias, options['years'], options['per_day'])
+
+            # Обновляем статистику планировщика, иначе он может не выбрать индекс на свежих данных
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE finance_transaction')
+
+            for title, queryset in self._canonical_queries(alias, user):
+                self._report(title, queryset, options)
+
+            if not options['keep'] and not options['username']:
+                transaction.set_rollback(True, using=alias)
+                self.stdout.write('Seeded data rolled back (use --keep to preserve it).')
+
+    def _seed(self, alias, years, per_day):
+        from finance.models import Category, Transaction
+
+        user, _ = User.objects.using(alias).get_or_create(username=BENCH_USERNAME)
+        categories = list(Category.objects.using(alias).all())
+        if not categories:
+            categories = [
+                Category.objects.using(alias).create(name=f'Bench {i}')
+                for i in range(8)
+            ]
+
+        rng = random.Random(42)
+        end = timezone.now().date()
+        start = end - timedelta(days=365 * years)
+        batch = []
+        total = 0
+        day = start
+        while day <= end:
+            for _ in range(per_day):
+                batch.append(Transaction(
+                    user=user,
+                    amount=Decimal(rng.randint(100, 500000)) / 100,
+                    date=day,
+                    type='income' if rng.random() < 0.2 else 'expense',
+                    category=rng.choice(categories),
+                    description='',
+                ))
+            if len(batch) >= 5000:
+                Transaction.objects.using(alias).bulk_create(batch)
+                total += len(batch)
+                batch = []
+            day += timedelta(days=1)
+        if batch:
+            Transaction.objects.using(alias).bulk_create(batch)
+            total += len(batch)
+
+        self.stdout.write(f'Seeded {total} transactions for {user.username} ({start} - {end})')
+        return user
+
+    def _canonical_queries(self, alias, user):
+        from finance.models import Transaction
+
+        today = timezone.now().date()
+        month_start = today.replace(day=1)
+        week_start = today - timedelta(days=today.weekday())
+        base = Transaction.objects.using(alias).filter(user=user)
+        any_category = base.values_list('category_id', flat=True).first()
+
+        return [
+            ('History page (TransactionCreateView.get_queryset)',
+             base.filter(date__gte=month_start, date__lte=today).order_by('-date')),
+            ('Day (/today, cron daily)',
+             base.filter(date=today - timedelta(days=1))),
+            ('Week range (/week, graph_week)',
+             base.filter(date__gte=week_start, date__lte=today)),
+            ('Expenses in range (/chart_categories)',
+             base.filter(type='expense', date__gte=month_start, date__lte=today)),
+            ('Totals by type (reports summary)',
+             base.filter(date__gte=month_start, date__lte=today).values('type').annotate(total=Sum('amount'))),
+            ('Category breakdown (reports)',
+             base.filter(type='expense', date__gte=month_start, date__lte=today)
+                 .values('category__name').annotate(total=Sum('amount'))),
+            ('Single category (/category)',
+             base.filter(category_id=any_category).values('type').annotate(total=Sum('amount'))),
+        ]
+
+    def _report(self, title, queryset, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n=== {title} ==='))
+
+        explain_options = {}
+        if options['analyze'] and queryset.db and connections[queryset.db].vendor == 'postgresql':
+            explain_options['analyze'] = True
+        self.stdout.write(queryset.explain(**explain_options))
+
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(
+            f'median {statistics.median(timings):.2f} ms, '
+            f'min {min(timings):.2f} ms, max {max(timings):.2f} ms '
+            f'({options["repeat"]} runs)'
+        )
@@ -0,0 +1,56 @@
+# finance/management/commands/import_statement.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Stream a bank statement (CSV/XLSX) into Transaction for one user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the CSV or XLSX file')
+        parser.add_argument('--username', required=True, help='Owner of the imported transactions')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], help='File format (default: by extension)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows per bulk_create batch')
+        parser.add_argument('--default-category', help='Category for rows without one')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only, do not save')
+
+    def handle(self, *args, **options):
+        from finance.imports import import_statement
+
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            self.stdout.write(self.style.ERROR(f"❌ User '{options['username']}' not found"))
+            return
+
+        def progress(result):
+            self.stdout.write(
+                f'  ... {result.total} rows read, {result.imported} saved, '
+                f'{result.rejected} rejected ({result.rows_per_sec:.0f} rows/s)'
+            )
+
+        try:
+            with open(options['path'], 'rb') as statement:
+                result = import_statement(
+                    user, statement,
+                    filename=options['path'],
+                    file_format=options['format'],
+                    chunk_size=options['chunk_size'],
+                    default_category=options['default_category'],
+                    on_progress=progress,
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, ValueError) as e:
+            self.stdout.write(self.style.ERROR(f'❌ Import failed: {e}'))
+            return
+
+        for line_number, reason in result.errors:
+            self.stdout.write(self.style.WARNING(f'⚠️ Line {line_number}: {reason}'))
+        if result.rejected > len(result.errors):
+            self.stdout.write(self.style.WARNING(f'⚠️ ... {result.rejected - len(result.errors)} more rejected rows'))
+
+        action = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {action} {result.imported} of {result.total} rows, {result.rejected} rejected '
+            f'in {result.elapsed:.2f}s ({result.rows_per_sec:.0f} rows/s)'
+        ))
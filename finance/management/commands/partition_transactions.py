@@ -0,0 +1,53 @@
+# finance/management/commands/partition_transactions.py
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = 'Manage date-range partitions of finance_transaction (PostgreSQL only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to use')
+        parser.add_argument('--convert', action='store_true',
+                            help='Convert a plain table to a partitioned one (if the migration skipped it)')
+        parser.add_argument('--interval', choices=['month', 'year'],
+                            help='Partition interval (default: TRANSACTION_PARTITION_INTERVAL)')
+        parser.add_argument('--ahead', type=int, help='Future partitions to create (default: TRANSACTION_PARTITIONS_AHEAD)')
+        parser.add_argument('--list', action='store_true', help='List existing partitions')
+
+    def handle(self, *args, **options):
+        from finance import partitioning
+        from finance.models import Transaction
+
+        connection = connections[options['database']]
+        if not partitioning.is_supported(connection):
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ Partitioning is PostgreSQL-only; {connection.vendor} keeps finance_transaction unpartitioned'
+            ))
+            return
+
+        interval = options['interval'] or partitioning.get_interval() or 'month'
+
+        if options['convert']:
+            with connection.schema_editor() as schema_editor:
+                converted = partitioning.convert_to_partitioned(
+                    schema_editor, Transaction, interval, ahead=options['ahead']
+                )
+            if converted:
+                self.stdout.write(self.style.SUCCESS(f'✅ finance_transaction is now partitioned by {interval}'))
+            else:
+                self.stdout.write('finance_transaction is already partitioned')
+
+        if not partitioning.is_partitioned(connection):
+            self.stdout.write(self.style.ERROR('❌ finance_transaction is not partitioned (run with --convert)'))
+            return
+
+        created = partitioning.ensure_future_partitions(connection, ahead=options['ahead'], interval=interval)
+        if created:
+            self.stdout.write(self.style.SUCCESS(f'✅ Created {len(created)} partitions: {", ".join(created)}'))
+        else:
+            self.stdout.write('No new partitions needed')
+
+        if options['list']:
+            for name, bounds in partitioning.list_partitions(connection):
+                self.stdout.write(f'  {name}: {bounds}')
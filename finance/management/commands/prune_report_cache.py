@@ -0,0 +1,18 @@
+# finance/management/commands/prune_report_cache.py
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Evict cached PDF/Excel report files by age and total size (finance.report_cache)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-days', type=int, help='Drop files generated earlier (default: REPORT_CACHE_MAX_AGE_DAYS)')
+        parser.add_argument('--max-mb', type=int, help='Total cache size budget (default: REPORT_CACHE_MAX_MB)')
+
+    def handle(self, *args, **options):
+        from finance.report_cache import evict
+
+        removed, freed = evict(max_age_days=options['max_age_days'], max_mb=options['max_mb'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Removed {removed} cached reports, freed {freed / 1024 / 1024:.1f} MB'
+        ))
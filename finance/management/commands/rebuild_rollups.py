@@ -0,0 +1,28 @@
+# finance/management/commands/rebuild_rollups.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Rebuild DailySummary rollups and DailyBalance running balances from Transaction (backfill and repair)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Rebuild only for this user')
+
+    def handle(self, *args, **options):
+        from finance.ledger import rebuild_ledger
+        from finance.rollups import rebuild_rollups
+
+        user = None
+        if options['username']:
+            try:
+                user = User.objects.get(username=options['username'])
+            except User.DoesNotExist:
+                self.stdout.write(self.style.ERROR(f"❌ User '{options['username']}' not found"))
+                return
+
+        created = rebuild_rollups(user=user)
+        balances = rebuild_ledger(user=user)
+        scope = user.username if user else 'all users'
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt {created} daily summary rows for {scope}'))
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt {balances} daily balance rows for {scope}'))
@@ -0,0 +1,23 @@
+# finance/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = 'Create or rebuild the full-text search index over transaction descriptions (finance.search)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to use')
+
+    def handle(self, *args, **options):
+        from finance import search
+
+        connection = connections[options['database']]
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ {connection.vendor} has no full-text index, search uses a bounded icontains scan'
+            ))
+            return
+
+        search.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS(f'✅ Search index rebuilt on {connection.vendor}'))
@@ -0,0 +1,35 @@
+# finance/management/commands/restore_transactions.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Move archived transactions back from the columnar archive into finance_transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Restore only this user')
+        parser.add_argument('--year', type=int, help='Restore only this year')
+        parser.add_argument('--all', action='store_true', help='Restore the whole archive for all users')
+
+    def handle(self, *args, **options):
+        from finance.archive import restore_transactions
+
+        if not options['username'] and not options['all']:
+            raise CommandError('Pass --username or --all')
+
+        user = None
+        if options['username']:
+            try:
+                user = User.objects.get(username=options['username'])
+            except User.DoesNotExist:
+                self.stdout.write(self.style.ERROR(f"❌ User '{options['username']}' not found"))
+                return
+
+        restored = restore_transactions(user=user, year=options['year'])
+        if not restored:
+            self.stdout.write('Nothing to restore')
+            return
+        for user_id, year, rows in restored:
+            self.stdout.write(f'  user {user_id}, {year}: {rows} transactions')
+        total = sum(rows for _user_id, _year, rows in restored)
+        self.stdout.write(self.style.SUCCESS(f'✅ Restored {total} transactions from {len(restored)} archive files'))
@@ -0,0 +1,27 @@
+# finance/management/commands/run_report_worker.py
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Render queued PDF/Excel report jobs in a bounded process pool (finance.report_jobs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, help='Pool size (default: REPORT_WORKER_PROCESSES)')
+        parser.add_argument('--poll-interval', type=float, help='Seconds between queue checks (default: REPORT_WORKER_POLL_SECONDS)')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+
+    def handle(self, *args, **options):
+        from finance.report_jobs import serve
+
+        self.stdout.write('🚀 Report worker started')
+        try:
+            serve(
+                processes=options['processes'],
+                poll_interval=options['poll_interval'],
+                once=options['once'],
+                log=self.stdout.write,
+            )
+        except KeyboardInterrupt:
+            self.stdout.write('🛑 Report worker stopped')
+            return
+        self.stdout.write(self.style.SUCCESS('✅ Queue is empty'))
@@ -0,0 +1,159 @@
+# finance/management/commands/seed_data.py
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+# Категории расходов: (название, медиана суммы в рублях, разброс логнормального распределения, вес)
+EXPENSE_CATEGORIES = [
+    ('Продукты', 900, 0.8, 30),
+    ('Кафе', 600, 0.7, 12),
+    ('Транспорт', 250, 0.6, 18),
+    ('Такси', 450, 0.5, 6),
+    ('Коммунальные услуги', 5500, 0.3, 2),
+    ('Связь', 700, 0.2, 1),
+    ('Одежда', 3500, 0.9, 3),
+    ('Здоровье', 1500, 1.0, 3),
+    ('Развлечения', 1200, 0.8, 5),
+    ('Подарки', 2500, 0.9, 2),
+    ('Дом', 2000, 1.1, 3),
+    ('Образование', 4000, 0.7, 1),
+]
+INCOME_CATEGORIES = ['Зарплата', 'Подработка', 'Кэшбэк']
+DESCRIPTIONS = {
+    'Продукты': ['Пятёрочка', 'Магнит', 'Рынок', 'Продукты на неделю'],
+    'Кафе': ['Кофе', 'Обед', 'Ужин с друзьями'],
+    'Транспорт': ['Метро', 'Автобус', 'Электричка'],
+    'Такси': ['Такси до работы', 'Такси домой'],
+    'Подработка': ['Фриланс', 'Консультация'],
+}
+# Траты в выходные чаще (пн..вс)
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.0, 1.05, 1.2, 1.5, 1.3]
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate reproducible synthetic data with bulk_create: users, categories and transactions '
+        'with realistic dates and amounts (weekly rhythm, salary days, log-normal spending)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Users to create')
+        parser.add_argument('--categories', type=int, default=len(EXPENSE_CATEGORIES) + len(INCOME_CATEGORIES),
+                            help='Categories to use (extra ones get generic names)')
+        parser.add_argument('--transactions', type=int, default=5000, help='Transactions per user')
+        parser.add_argument('--days', type=int, default=730, help='History length in days, ending today')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (same seed - same data)')
+        parser.add_argument('--prefix', default='seed', help='Username prefix')
+        parser.add_argument('--telegram', action='store_true',
+                            help='Give consent and a fake telegram_id (scheduled reports will try to send!)')
+
+    def handle(self, *args, **options):
+        from django.contrib.auth.models import User
+        from finance.categories import category_registry
+        from finance.columnar import user_changed
+        from finance.ledger import rebuild_ledger
+        from finance.models import Category, Transaction, UserConsent
+        from finance.rollups import rebuild_rollups
+
+        if options['categories'] <= len(INCOME_CATEGORIES):
+            raise CommandError(f'--categories must be greater than {len(INCOME_CATEGORIES)} (income categories)')
+
+        rnd = random.Random(options['seed'])
+        end_date = date.today()
+        start_date = end_date - timedelta(days=options['days'] - 1)
+
+        categories = self._categories(Category, options['categories'])
+        category_registry.invalidate()
+        expense = [item for item in categories if item[1] == 'expense']
+        income = {item[0].name: item[0] for item in categories if item[1] == 'income'}
+        expense_weights = [item[4] for item in expense]
+
+        days = [start_date + timedelta(days=offset) for offset in range(options['days'])]
+        day_weights = [WEEKDAY_WEIGHTS[day.weekday()] for day in days]
+
+        created_users = 0
+        created_rows = 0
+        for index in range(options['users']):
+            username = f"{options['prefix']}_{options['seed']}_{index}"
+            if User.objects.filter(username=username).exists():
+                self.stdout.write(self.style.WARNING(f'⚠️ {username} already exists, skipped'))
+                continue
+
+            with transaction.atomic():
+                user = User.objects.create_user(username=username)  # без пароля: вход - force_login/бот
+                if options['telegram']:
+                    UserConsent.objects.create(user=user, telegram_id=10 ** 9 + user.pk, given_at=user.date_joined)
+
+                # Свой масштаб трат и зарплата у каждого пользователя
+                scale = rnd.lognormvariate(0, 0.35)
+                salary = round(rnd.uniform(45_000, 180_000), -3)
+                rows = self._salary_rows(Transaction, user, income, salary, start_date, end_date, rnd)
+                remaining = max(options['transactions'] - len(rows), 0)
+                rows = rows[:options['transactions']]
+
+                spending_days = rnd.choices(days, weights=day_weights, k=remaining)
+                spending = rnd.choices(expense, weights=expense_weights, k=remaining)
+                for day, (category, _type, median, sigma, _weight) in zip(spending_days, spending):
+                    # Редкий доход вместо траты: подработка и кэшбэк
+                    if income and rnd.random() < 0.04:
+                        name = rnd.choice(list(income))
+                        amount = rnd.lognormvariate(0, 0.8) * (8000 if name == 'Подработка' else 300)
+                        rows.append(self._transaction(Transaction, user, day, 'income', income[name], amount, rnd))
+                    else:
+                        amount = median * scale * rnd.lognormvariate(0, sigma)
+                        rows.append(self._transaction(Transaction, user, day, 'expense', category, amount, rnd))
+
+                Transaction.objects.bulk_create(rows, batch_size=5000)
+                # bulk_create не вызывает сигналы: сводки, остатки и версию данных обновляем явно
+                rebuild_rollups(user=user)
+                rebuild_ledger(user=user)
+                user_changed(user.pk, {row.date for row in rows})
+
+            created_users += 1
+            created_rows += len(rows)
+            self.stdout.write(f'👤 {username}: {len(rows):,} transactions')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Created {created_users} users, {created_rows:,} transactions, '
+            f'{len(categories)} categories (seed {options["seed"]})'
+        ))
+
+    def _categories(self, Category, count):
+        """[(Category, тип, медиана, разброс, вес)]: сначала реальные названия, потом 'Категория N'."""
+        specs = [(name, 'income', 0, 0, 0) for name in INCOME_CATEGORIES]
+        specs += [(name, 'expense', median, sigma, weight) for name, median, sigma, weight in EXPENSE_CATEGORIES]
+        for extra in range(len(specs), count):
+            specs.append((f'Категория {extra + 1}', 'expense', 1000, 0.9, 1))
+        specs = specs[:count]
+
+        existing = {category.name: category for category in Category.objects.filter(name__in=[spec[0] for spec in specs])}
+        Category.objects.bulk_create([Category(name=spec[0]) for spec in specs if spec[0] not in existing])
+        by_name = {category.name: category for category in Category.objects.filter(name__in=[spec[0] for spec in specs])}
+        return [(by_name[name], type, median, sigma, weight) for name, type, median, sigma, weight in specs]
+
+    def _salary_rows(self, Transaction, user, income, salary, start_date, end_date, rnd):
+        """Аванс 20-го и зарплата 5-го числа каждого месяца."""
+        rows = []
+        month = start_date.replace(day=1)
+        while month <= end_date:
+            for day, share, description in ((5, 0.6, 'Зарплата'), (20, 0.4, 'Аванс')):
+                payday = month.replace(day=day)
+                if start_date <= payday <= end_date:
+                    rows.append(self._transaction(
+                        Transaction, user, payday, 'income', income['Зарплата'], salary * share, rnd, description,
+                    ))
+            month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        return rows
+
+    def _transaction(self, Transaction, user, day, type, category, amount, rnd, description=None):
+        choices = DESCRIPTIONS.get(category.name)
+        if description is None:
+            description = rnd.choice(choices) if choices and rnd.random() < 0.7 else ''
+        return Transaction(
+            user=user, date=day, type=type, category=category,
+            amount=Decimal(f'{max(amount, 1):.2f}'),
+            description=description,
+        )
@@ -0,0 +1,38 @@
+# finance/management/commands/sync_sqlite_replica.py
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Copy the default SQLite database into SQLite read replicas (local testing of finance.db_router)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replica', help='Replica alias (default: all DATABASE_REPLICAS)')
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES['default']
+        aliases = [options['replica']] if options['replica'] else settings.DATABASE_REPLICAS
+        if not aliases:
+            self.stdout.write(self.style.WARNING('⚠️ No replicas configured (set SQLITE_REPLICA_PATH)'))
+            return
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            self.stdout.write(self.style.ERROR('❌ Only SQLite databases can be copied this way'))
+            return
+
+        source = sqlite3.connect(str(primary['NAME']))
+        try:
+            for alias in aliases:
+                replica = settings.DATABASES[alias]
+                if replica['ENGINE'] != 'django.db.backends.sqlite3':
+                    self.stdout.write(self.style.WARNING(f'⚠️ {alias} is not SQLite, skipped'))
+                    continue
+                target = sqlite3.connect(str(replica['NAME']))
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(self.style.SUCCESS(f"✅ Copied {primary['NAME']} -> {replica['NAME']} ({alias})"))
+        finally:
+            source.close()
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:05
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_daily_summaries(apps, schema_editor):
+    """Заполняем сводки по уже существующим операциям."""
+    Transaction = apps.get_model('finance', 'Transaction')
+    DailySummary = apps.get_model('finance', 'DailySummary')
+    grouped = (
+        Transaction.objects.order_by()
+        .values('user_id', 'date', 'type', 'category_id')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    DailySummary.objects.bulk_create(
+        (DailySummary(**row) for row in grouped.iterator(chunk_size=2000)),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0007_transaction_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('type', models.CharField(choices=[('income', 'Доход'), ('expense', 'Расход')], max_length=10, verbose_name='Тип операции')),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14, verbose_name='Сумма')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество операций')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='finance.category', verbose_name='Категория')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Дневная сводка',
+                'verbose_name_plural': 'Дневные сводки',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date', 'type', 'category'), name='unique_daily_summary')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:15
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def backfill_daily_balances(apps, schema_editor):
+    """Считаем нарастающие остатки по уже существующим операциям."""
+    Transaction = apps.get_model('finance', 'Transaction')
+    DailyBalance = apps.get_model('finance', 'DailyBalance')
+    grouped = (
+        Transaction.objects.order_by('user_id', 'date')
+        .values('user_id', 'date')
+        .annotate(income=Sum('amount', filter=Q(type='income')), expense=Sum('amount', filter=Q(type='expense')))
+    )
+
+    def rows():
+        current_user, running = None, Decimal('0')
+        for row in grouped.iterator(chunk_size=2000):
+            if row['user_id'] != current_user:
+                current_user, running = row['user_id'], Decimal('0')
+            net = (row['income'] or Decimal('0')) - (row['expense'] or Decimal('0'))
+            if net:
+                running += net
+                yield DailyBalance(user_id=row['user_id'], date=row['date'], net=net, balance=running)
+
+    DailyBalance.objects.bulk_create(rows(), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0010_dataversion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('net', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14, verbose_name='Изменение за день')),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16, verbose_name='Остаток на конец дня')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Остаток на дату',
+                'verbose_name_plural': 'Остатки по дням',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='unique_daily_balance')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# finance/migrations/0012_transaction_partitioning.py
+"""
+Секционирование finance_transaction по дате на PostgreSQL (см. finance.partitioning).
+На SQLite и при TRANSACTION_PARTITION_INTERVAL = None миграция ничего не делает.
+"""
+from django.db import migrations
+
+
+def partition_transactions(apps, schema_editor):
+    from finance import partitioning
+
+    interval = partitioning.get_interval()
+    if interval and partitioning.is_supported(schema_editor.connection):
+        Transaction = apps.get_model('finance', 'Transaction')
+        partitioning.convert_to_partitioned(schema_editor, Transaction, interval)
+
+
+def unpartition_transactions(apps, schema_editor):
+    from finance import partitioning
+
+    Transaction = apps.get_model('finance', 'Transaction')
+    partitioning.convert_to_plain(schema_editor, Transaction)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0011_dailybalance'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_transactions, unpartition_transactions),
+    ]
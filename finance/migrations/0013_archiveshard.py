@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0012_transaction_partitioning'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='Год')),
+                ('file', models.FileField(upload_to='archive/transactions/', verbose_name='Файл архива')),
+                ('rows', models.PositiveIntegerField(default=0, verbose_name='Количество операций')),
+                ('first_date', models.DateField(verbose_name='Первая дата')),
+                ('last_date', models.DateField(verbose_name='Последняя дата')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлён')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Архив операций',
+                'verbose_name_plural': 'Архивы операций',
+                'ordering': ['user', 'year'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'year'), name='unique_archive_shard')],
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# finance/migrations/0014_transaction_amount_minor.py
+"""
+Transaction.amount: DECIMAL(12, 2) -> BIGINT в копейках (см. finance.money).
+
+Данные переносятся через временную колонку amount_minor одним UPDATE;
+миграция обратима (копейки снова превращаются в DECIMAL).
+"""
+import django.core.validators
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F, Value
+from django.db.models.functions import Cast, Round
+
+import finance.money
+
+
+def amount_to_minor(apps, schema_editor):
+    Transaction = apps.get_model('finance', 'Transaction')
+    # ROUND нужен SQLite: там DECIMAL хранится как REAL, и 0.29 * 100 = 28.999...
+    Transaction.objects.using(schema_editor.connection.alias).update(
+        amount_minor=Cast(Round(F('amount') * 100), models.BigIntegerField())
+    )
+
+
+def minor_to_amount(apps, schema_editor):
+    Transaction = apps.get_model('finance', 'Transaction')
+    Transaction.objects.using(schema_editor.connection.alias).update(
+        amount=ExpressionWrapper(
+            F('amount_minor') * Value(Decimal('0.01')), output_field=models.DecimalField(max_digits=12, decimal_places=2)
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0013_archiveshard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='amount_minor',
+            field=models.BigIntegerField(null=True),
+        ),
+        # Старая колонка временно допускает NULL - иначе откат не сможет добавить её обратно
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, max_digits=12, null=True, verbose_name='Сумма'),
+        ),
+        migrations.RunPython(amount_to_minor, minor_to_amount),
+        migrations.RemoveField(
+            model_name='transaction',
+            name='amount',
+        ),
+        migrations.RenameField(
+            model_name='transaction',
+            old_name='amount_minor',
+            new_name='amount',
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount',
+            field=finance.money.MinorUnitAmountField(
+                validators=[django.core.validators.MinValueValidator(Decimal('0.01'))], verbose_name='Сумма'
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# finance/migrations/0015_transaction_search.py
+"""
+Полнотекстовый поиск по Transaction.description (см. finance.search):
+FTS5 с триггерами на SQLite, GIN-индекс по tsvector на PostgreSQL.
+"""
+from django.db import migrations
+
+
+def install_search(apps, schema_editor):
+    from finance import search
+
+    search.install(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    from finance import search
+
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0014_transaction_amount_minor'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0015_transaction_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedreport',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64, verbose_name='Ключ кэша'),
+        ),
+        migrations.AddField(
+            model_name='savedreport',
+            name='data_version',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='Версия данных'),
+        ),
+        migrations.AddField(
+            model_name='savedreport',
+            name='file_size',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Размер файла'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0016_savedreport_cache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_format', models.CharField(choices=[('pdf', 'PDF'), ('excel', 'Excel'), ('filter', 'Фильтр')], max_length=10, verbose_name='Формат отчета')),
+                ('params', models.JSONField(verbose_name='Параметры отчета')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Строится'), ('done', 'Готов'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Готовность, %')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начало построения')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание построения')),
+                ('report', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='finance.savedreport', verbose_name='Отчёт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Задание на отчёт',
+                'verbose_name_plural': 'Задания на отчёты',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='fin_reportjob_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0017_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('weekly', 'Еженедельный'), ('monthly', 'Ежемесячный')], max_length=10, verbose_name='Вид рассылки')),
+                ('period_start', models.DateField(verbose_name='Начало периода')),
+                ('period_end', models.DateField(verbose_name='Конец периода')),
+                ('report_format', models.CharField(choices=[('pdf', 'PDF'), ('excel', 'Excel'), ('filter', 'Фильтр')], max_length=10, verbose_name='Формат отчета')),
+                ('last_user_id', models.BigIntegerField(default=0, verbose_name='Обработано до пользователя')),
+                ('sent', models.PositiveIntegerField(default=0, verbose_name='Отправлено')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='Ошибок')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='Начало рассылки')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание рассылки')),
+            ],
+            options={
+                'verbose_name': 'Рассылка отчётов',
+                'verbose_name_plural': 'Рассылки отчётов',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'period_start'), name='unique_report_run')],
+            },
+        ),
+    ]
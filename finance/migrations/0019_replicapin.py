@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0018_reportrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplicaPin',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(unique=True, verbose_name='Пользователь')),
+                ('pinned_until', models.DateTimeField(verbose_name='Читать из основной БД до')),
+            ],
+            options={
+                'verbose_name': 'Закрепление за основной БД',
+                'verbose_name_plural': 'Закрепления за основной БД',
+            },
+        ),
+    ]
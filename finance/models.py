@@ -3,9 +3,12 @@ import json # Импортируем json для сериализации пар
 import django
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, router, transaction as db_transaction
 from decimal import Decimal
 
+from .money import MinorUnitAmountField
+from .sqlite_profile import retry_write
+
 # Определим класс согласия
 class UserConsent(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='consent')
@@ -54,9 +57,8 @@ class Transaction(models.Model):
         on_delete=models.CASCADE, # При удалении пользователя удаляются его транзакции
         verbose_name="Пользователь"
     )
-    amount = models.DecimalField(
-        max_digits=12, # Общее количество цифр (например, 999999999.99)
-        decimal_places=2, # Количество знаков после запятой
+    # В БД - целое число копеек (BIGINT), в Python - Decimal с двумя знаками (см. finance.money)
+    amount = MinorUnitAmountField(
         validators=[MinValueValidator(Decimal('0.01'))], # Сумма должна быть > 0
         verbose_name="Сумма"
     )
@@ -81,10 +83,114 @@ class Transaction(models.Model):
         verbose_name = "Финансовая операция"
         verbose_name_plural = "Финансовые операции"
         ordering = ["-date"] # Сортировка по умолчанию по дате (новые сверху)
+        indexes = [
+            # Основной путь доступа: операции пользователя за период (история, отчёты, бот, cron)
+            models.Index(fields=['user', 'date', 'type'], name='fin_txn_user_date_type_idx'),
+            # Только доходы или только расходы за период (/chart_categories, суммы по типу)
+            models.Index(fields=['user', 'type', 'date'], name='fin_txn_user_type_date_idx'),
+            # Разбивка по категориям и /category
+            models.Index(fields=['user', 'category', 'date'], name='fin_txn_user_cat_date_idx'),
+            # Keyset-пагинация истории по (date, id) от новых к старым
+            models.Index(fields=['user', '-date', '-id'], name='fin_txn_user_date_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.type} {self.amount} {self.user.username} - {self.category.name}"
 
+    # Сохранение и удаление выполняются атомарно вместе с обновлением сводок
+    # (сигналы finance.signals срабатывают внутри этой же транзакции БД).
+    # При занятой SQLite транзакция повторяется (finance.sqlite_profile, если профиль включён)
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        retry_write(self._save_atomic, using, *args, **kwargs)
+
+    def _save_atomic(self, *args, **kwargs):
+        with db_transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        return retry_write(self._delete_atomic, using, *args, **kwargs)
+
+    def _delete_atomic(self, *args, **kwargs):
+        with db_transaction.atomic(using=kwargs.get('using')):
+            return super().delete(*args, **kwargs)
+
+
+class DailySummary(models.Model):
+    """
+    Дневная сводка по операциям пользователя: сумма и количество
+    для каждой пары (тип, категория) за день.
+    Поддерживается инкрементально сигналами при изменении Transaction
+    (см. finance.rollups), полная пересборка - команда rebuild_rollups.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Пользователь")
+    date = models.DateField(verbose_name="Дата")
+    type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES, verbose_name="Тип операции")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, verbose_name="Категория")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'), verbose_name="Сумма")
+    count = models.PositiveIntegerField(default=0, verbose_name="Количество операций")
+
+    class Meta:
+        verbose_name = "Дневная сводка"
+        verbose_name_plural = "Дневные сводки"
+        ordering = ["-date"]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'type', 'category'], name='unique_daily_summary')
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.date} {self.type} {self.category.name}: {self.total} ({self.count})"
+
+
+class DailyBalance(models.Model):
+    """
+    Нарастающий остаток пользователя по дням (префиксная сумма доходов минус расходов).
+    Строка есть только для дней с ненулевым изменением; остаток на любую дату -
+    это balance последней строки не позже этой даты (см. finance.ledger).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Пользователь")
+    date = models.DateField(verbose_name="Дата")
+    net = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'), verbose_name="Изменение за день")
+    balance = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'), verbose_name="Остаток на конец дня")
+
+    class Meta:
+        verbose_name = "Остаток на дату"
+        verbose_name_plural = "Остатки по дням"
+        ordering = ["-date"]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_daily_balance')
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.date}: {self.balance}"
+
+
+class ArchiveShard(models.Model):
+    """
+    Архив старых операций пользователя за один год: сжатый колоночный файл
+    (.npz) в MEDIA_ROOT. Строки архива удалены из Transaction, но по-прежнему
+    учтены в DailySummary и DailyBalance (см. finance.archive).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Пользователь")
+    year = models.PositiveSmallIntegerField(verbose_name="Год")
+    file = models.FileField(upload_to='archive/transactions/', verbose_name="Файл архива")
+    rows = models.PositiveIntegerField(default=0, verbose_name="Количество операций")
+    first_date = models.DateField(verbose_name="Первая дата")
+    last_date = models.DateField(verbose_name="Последняя дата")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлён")
+
+    class Meta:
+        verbose_name = "Архив операций"
+        verbose_name_plural = "Архивы операций"
+        ordering = ["user", "year"]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'year'], name='unique_archive_shard')
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.year}: {self.rows} операций"
+
 
 class SavedReport(models.Model):
     REPORT_FORMATS = [
@@ -117,6 +223,11 @@ class SavedReport(models.Model):
         blank=True,
         verbose_name="Время генерации файла"
     )
+    # Кэш готовых отчётов (finance.report_cache): ключ (формат, период, фильтры),
+    # версия данных, по которой построен файл, и его размер
+    cache_key = models.CharField(max_length=64, blank=True, default='', db_index=True, verbose_name="Ключ кэша")
+    data_version = models.CharField(max_length=64, blank=True, default='', verbose_name="Версия данных")
+    file_size = models.PositiveBigIntegerField(default=0, verbose_name="Размер файла")
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
@@ -140,4 +251,116 @@ class SavedReport(models.Model):
 
     @property
     def has_file(self):
-        return bool(self.file) and os.path.exists(self.file.path)
\ No newline at end of file
+        return bool(self.file) and self.file.storage.exists(self.file.name)
+
+class DataVersion(models.Model):
+    """
+    Счётчик версии данных (например, справочника категорий).
+    Увеличивается при каждом изменении; процессы (веб, бот, cron) сравнивают
+    его со своей копией, чтобы понять, что локальный кэш устарел.
+    """
+    key = models.CharField(max_length=100, unique=True, verbose_name="Ключ")
+    version = models.PositiveBigIntegerField(default=0, verbose_name="Версия")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Версия данных"
+        verbose_name_plural = "Версии данных"
+
+    def __str__(self):
+        return f"{self.key}: {self.version}"
+
+
+class ReplicaPin(models.Model):
+    """
+    Отметка "пользователь только что записал - читать из основной БД" до
+    pinned_until (finance.db_router). Хранится в основной БД, поэтому её видят
+    все процессы: веб, бот, импорт, воркеры отчётов и cron.
+    Без внешнего ключа: отметка может появиться при каскадном удалении пользователя.
+    """
+    user_id = models.BigIntegerField(unique=True, verbose_name="Пользователь")
+    pinned_until = models.DateTimeField(verbose_name="Читать из основной БД до")
+
+    class Meta:
+        verbose_name = "Закрепление за основной БД"
+        verbose_name_plural = "Закрепления за основной БД"
+
+    def __str__(self):
+        return f"#{self.user_id} до {self.pinned_until}"
+
+
+class ReportJob(models.Model):
+    """
+    Задание на построение отчёта в фоне (finance.report_jobs): очередь в БД,
+    которую разбирает команда run_report_worker. Готовый файл - в SavedReport
+    (кэш отчётов, finance.report_cache).
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Строится'),
+        (DONE, 'Готов'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='report_jobs', verbose_name="Пользователь")
+    report_format = models.CharField(max_length=10, choices=SavedReport.REPORT_FORMATS, verbose_name="Формат отчета")
+    params = models.JSONField(verbose_name="Параметры отчета")
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING, verbose_name="Статус")
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="Готовность, %")
+    report = models.ForeignKey(
+        SavedReport, null=True, blank=True, on_delete=models.SET_NULL, related_name='jobs', verbose_name="Отчёт"
+    )
+    error = models.TextField(blank=True, default='', verbose_name="Ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начало построения")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Окончание построения")
+
+    class Meta:
+        verbose_name = "Задание на отчёт"
+        verbose_name_plural = "Задания на отчёты"
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='fin_reportjob_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_report_format_display()} #{self.pk} ({self.get_status_display()})"
+
+
+class ReportRun(models.Model):
+    """
+    Рассылка отчётов за период (еженедельная или ежемесячная, finance.report_delivery).
+    last_user_id - контрольная точка: пользователи до неё включительно уже
+    обработаны, после сбоя рассылка продолжается с неё, а не с начала.
+    """
+    WEEKLY = 'weekly'
+    MONTHLY = 'monthly'
+    KINDS = [
+        (WEEKLY, 'Еженедельный'),
+        (MONTHLY, 'Ежемесячный'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KINDS, verbose_name="Вид рассылки")
+    period_start = models.DateField(verbose_name="Начало периода")
+    period_end = models.DateField(verbose_name="Конец периода")
+    report_format = models.CharField(max_length=10, choices=SavedReport.REPORT_FORMATS, verbose_name="Формат отчета")
+    last_user_id = models.BigIntegerField(default=0, verbose_name="Обработано до пользователя")
+    sent = models.PositiveIntegerField(default=0, verbose_name="Отправлено")
+    failed = models.PositiveIntegerField(default=0, verbose_name="Ошибок")
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name="Начало рассылки")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Окончание рассылки")
+
+    class Meta:
+        verbose_name = "Рассылка отчётов"
+        verbose_name_plural = "Рассылки отчётов"
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'period_start'], name='unique_report_run')
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.period_start} - {self.period_end}"
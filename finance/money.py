@@ -0,0 +1,99 @@
+# finance/money.py
+"""
+Денежные суммы в целых копейках.
+
+Transaction.amount хранится в БД как BIGINT - число копеек (MinorUnitAmountField),
+а в Python по-прежнему виден как Decimal с двумя знаками: формы, шаблоны,
+фильтры amount__gte=Decimal('10.50') и Sum('amount') работают как раньше.
+
+Суммирование в БД идёт по целым числам - точно и без REAL-арифметики SQLite.
+Когда нужны именно копейки (NumPy, колоночный кэш, архив), используются
+minor()/MinorSum/sum_minor/minor_array: они возвращают int без перевода в Decimal.
+"""
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django import forms
+from django.core import exceptions
+from django.db import models
+from django.db.models import ExpressionWrapper, F, Sum
+
+CENT = Decimal('0.01')
+
+
+def to_minor(amount):
+    """Сумма (Decimal, float, str, int в рублях) -> целое число копеек."""
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))  # float из бота: str() даёт то, что ввёл пользователь
+    return int(amount.quantize(CENT) * 100)
+
+
+def from_minor(value):
+    """Копейки -> Decimal с двумя знаками."""
+    return Decimal(int(value)).scaleb(-2)
+
+
+class MinorUnitAmountField(models.Field):
+    """
+    Сумма денег: в БД - BIGINT копеек, в Python - Decimal с двумя знаками.
+    """
+    description = "Сумма в копейках"
+    max_digits = 12
+    decimal_places = 2
+
+    def get_internal_type(self):
+        return 'BigIntegerField'
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return from_minor(value)
+
+    def to_python(self, value):
+        if value is None or value == '':
+            return None
+        try:
+            if isinstance(value, float):
+                value = str(value)
+            return Decimal(value).quantize(CENT)
+        except (InvalidOperation, TypeError, ValueError):
+            raise exceptions.ValidationError(
+                "Значение «%(value)s» должно быть числом.", code='invalid', params={'value': value},
+            )
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        return to_minor(self.to_python(value))
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{
+            'form_class': forms.DecimalField,
+            'max_digits': self.max_digits,
+            'decimal_places': self.decimal_places,
+            **kwargs,
+        })
+
+
+def minor(field='amount'):
+    """Выражение: сумма в копейках как есть (int), без перевода в Decimal."""
+    return ExpressionWrapper(F(field), output_field=models.BigIntegerField())
+
+
+class MinorSum(Sum):
+    """Sum по полю-сумме, возвращающий целое число копеек."""
+
+    def __init__(self, field='amount', **extra):
+        super().__init__(minor(field), output_field=models.BigIntegerField(), **extra)
+
+
+def sum_minor(queryset, field='amount'):
+    """Точная сумма по queryset в копейках (0, если строк нет)."""
+    return queryset.aggregate(total=MinorSum(field))['total'] or 0
+
+
+def minor_array(queryset, field='amount'):
+    """Суммы строк queryset в копейках - массив int64 для NumPy."""
+    values = queryset.order_by().values_list(minor(field), flat=True)
+    return np.fromiter(values.iterator(chunk_size=5000), dtype=np.int64)
@@ -0,0 +1,58 @@
+# finance/pagination.py
+"""
+Keyset-пагинация операций по (date, id) - от новых к старым.
+
+В отличие от OFFSET/COUNT, каждая страница - это поиск по индексу
+от позиции курсора, поэтому страница N стоит столько же, сколько первая.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.db.models import Q
+
+CURSOR_DATE_FORMAT = '%Y-%m-%d'
+
+
+@dataclass
+class KeysetPage:
+    """Одна страница: строки и курсор для следующей страницы (None - страниц больше нет)."""
+    object_list: list
+    next_cursor: str = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(obj):
+    """Курсор вида '2025-10-21:1234' по последней строке страницы."""
+    return f"{obj.date.strftime(CURSOR_DATE_FORMAT)}:{obj.pk}"
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор; для некорректного значения возвращает None (первая страница)."""
+    if not cursor:
+        return None
+    try:
+        date_str, pk_str = cursor.split(':', 1)
+        return datetime.strptime(date_str, CURSOR_DATE_FORMAT).date(), int(pk_str)
+    except (ValueError, TypeError):
+        return None
+
+
+def keyset_page(queryset, cursor=None, page_size=50):
+    """
+    Возвращает страницу queryset, упорядоченного по (-date, -id), после курсора.
+    Выбирается page_size + 1 строка, чтобы узнать о следующей странице без COUNT.
+    """
+    queryset = queryset.order_by('-date', '-id')
+    position = decode_cursor(cursor)
+    if position is not None:
+        cursor_date, cursor_pk = position
+        queryset = queryset.filter(Q(date__lt=cursor_date) | Q(date=cursor_date, pk__lt=cursor_pk))
+
+    rows = list(queryset[:page_size + 1])
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return KeysetPage(object_list=rows, next_cursor=encode_cursor(rows[-1]))
+    return KeysetPage(object_list=rows)
@@ -0,0 +1,258 @@
+# finance/partitioning.py
+"""
+Декларативное секционирование finance_transaction по дате (только PostgreSQL).
+
+Таблица операций растёт почти только добавлением и читается диапазонами дат,
+поэтому на PostgreSQL она разбивается на секции по месяцам или годам
+(PARTITION BY RANGE ("date")). Фильтры ORM date__gte/date__lte превращаются
+в условия на ключ секционирования, и планировщик отбрасывает лишние секции.
+
+- convert_to_partitioned() - перевод существующей таблицы (миграция 0012
+  или команда partition_transactions --convert);
+- ensure_partitions() - создание секций наперёд (cron и та же команда);
+- строки вне существующих секций попадают в секцию DEFAULT и переносятся
+  в свою секцию, когда она создаётся.
+
+На SQLite все функции ничего не делают - таблица остаётся обычной.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+
+from . import search
+
+TABLE = 'finance_transaction'
+DEFAULT_PARTITION = f'{TABLE}_default'
+SEQUENCE = f'{TABLE}_id_seq'
+INTERVALS = ('month', 'year')
+
+
+def get_interval():
+    """Интервал секционирования из настроек: 'month', 'year' или None (не секционировать)."""
+    interval = getattr(settings, 'TRANSACTION_PARTITION_INTERVAL', 'month')
+    if interval not in INTERVALS + (None,):
+        raise ValueError(f"Неизвестный интервал секционирования: {interval}")
+    return interval
+
+
+def is_supported(connection):
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned(connection):
+    """Секционирована ли таблица операций в этой БД."""
+    if not is_supported(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))',
+            [TABLE],
+        )
+        return cursor.fetchone()[0]
+
+
+def interval_start(day, interval):
+    """Начало секции, в которую попадает дата."""
+    if interval == 'year':
+        return date(day.year, 1, 1)
+    return date(day.year, day.month, 1)
+
+
+def next_start(start, interval):
+    """Начало следующей секции."""
+    if interval == 'year':
+        return date(start.year + 1, 1, 1)
+    return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def partition_name(start, interval):
+    """finance_transaction_p2025_01 (по месяцам) или finance_transaction_p2025 (по годам)."""
+    if interval == 'year':
+        return f'{TABLE}_p{start.year}'
+    return f'{TABLE}_p{start.year}_{start.month:02d}'
+
+
+def list_partitions(connection):
+    """Секции таблицы: [(имя, границы)], по имени."""
+    if not is_partitioned(connection):
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            ORDER BY child.relname
+            """,
+            [TABLE],
+        )
+        return cursor.fetchall()
+
+
+def create_partition(connection, start, interval):
+    """
+    Создаёт секцию [start, следующий интервал). Если подходящие строки уже
+    лежат в секции DEFAULT, они переносятся в новую секцию.
+    Возвращает True, если секция создана.
+    """
+    name = partition_name(start, interval)
+    end = next_start(start, interval)
+    quote = connection.ops.quote_name
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+        if cursor.fetchone()[0]:
+            return False
+
+        cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [DEFAULT_PARTITION])
+        has_default = cursor.fetchone()[0]
+        stray_rows = False
+        if has_default:
+            cursor.execute(
+                f'SELECT EXISTS (SELECT 1 FROM {quote(DEFAULT_PARTITION)} WHERE "date" >= %s AND "date" < %s)',
+                [start, end],
+            )
+            stray_rows = cursor.fetchone()[0]
+
+        if stray_rows:
+            # Новая секция пересекается со строками в DEFAULT - сначала отсоединяем её
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(DEFAULT_PARTITION)}')
+        cursor.execute(
+            f"CREATE TABLE {quote(name)} PARTITION OF {quote(TABLE)} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        if stray_rows:
+            cursor.execute(
+                f'INSERT INTO {quote(name)} SELECT * FROM {quote(DEFAULT_PARTITION)} '
+                f'WHERE "date" >= %s AND "date" < %s',
+                [start, end],
+            )
+            cursor.execute(
+                f'DELETE FROM {quote(DEFAULT_PARTITION)} WHERE "date" >= %s AND "date" < %s',
+                [start, end],
+            )
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} ATTACH PARTITION {quote(DEFAULT_PARTITION)} DEFAULT')
+    return True
+
+
+def ensure_partitions(connection, start, end, interval=None):
+    """Создаёт недостающие секции, покрывающие [start, end]. Возвращает имена созданных."""
+    if not is_partitioned(connection):
+        return []
+    interval = interval or get_interval() or 'month'
+    created = []
+    current = interval_start(start, interval)
+    while current <= end:
+        if create_partition(connection, current, interval):
+            created.append(partition_name(current, interval))
+        current = next_start(current, interval)
+    return created
+
+
+def ensure_future_partitions(connection, ahead=None, today=None, interval=None):
+    """Секции от текущего интервала на ahead интервалов вперёд (для cron)."""
+    interval = interval or get_interval() or 'month'
+    if ahead is None:
+        ahead = getattr(settings, 'TRANSACTION_PARTITIONS_AHEAD', 3)
+    start = interval_start(today or date.today(), interval)
+    end = start
+    for _ in range(ahead):
+        end = next_start(end, interval)
+    return ensure_partitions(connection, start, end, interval)
+
+
+def convert_to_partitioned(schema_editor, model, interval, ahead=None):
+    """
+    Переводит обычную таблицу операций в секционированную с сохранением данных.
+
+    Первичный ключ секционированной таблицы обязан включать ключ секционирования,
+    поэтому в БД он становится (id, date); для ORM первичным ключом остаётся id.
+    Индексы из Transaction.Meta.indexes создаются на родительской таблице
+    и наследуются всеми секциями.
+    """
+    connection = schema_editor.connection
+    if not is_supported(connection) or is_partitioned(connection):
+        return False
+
+    quote = connection.ops.quote_name
+    old_table = f'{TABLE}_unpartitioned'
+    # Поисковый GIN-индекс не описан в Meta (он только для PostgreSQL) - переносим отдельно
+    with_search = search.is_installed(connection)
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} RENAME TO {quote(old_table)}')
+        cursor.execute(
+            f'CREATE TABLE {quote(TABLE)} (LIKE {quote(old_table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ("date")'
+        )
+        cursor.execute(f'CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {quote(TABLE)} DEFAULT')
+
+        # Секции под уже имеющиеся данные и на несколько интервалов вперёд
+        cursor.execute(f'SELECT MIN("date"), MAX("date"), COALESCE(MAX(id), 0) FROM {quote(old_table)}')
+        first_day, last_day, max_id = cursor.fetchone()
+        today = date.today()
+        ensure_partitions(connection, first_day or today, max(last_day or today, today), interval)
+        ensure_future_partitions(connection, ahead=ahead, interval=interval)
+
+        cursor.execute(f'INSERT INTO {quote(TABLE)} SELECT * FROM {quote(old_table)}')
+        # Вместе со старой таблицей удаляются её identity-последовательность, индексы и внешние ключи
+        cursor.execute(f'DROP TABLE {quote(old_table)}')
+
+        cursor.execute(f'CREATE SEQUENCE {quote(SEQUENCE)} OWNED BY {quote(TABLE)}.id')
+        cursor.execute('SELECT setval(%s::regclass, %s, false)', [SEQUENCE, max_id + 1])
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(TABLE + "_pkey")} PRIMARY KEY (id, "date")')
+
+        for field_name in ('user', 'category'):
+            field = model._meta.get_field(field_name)
+            target = field.target_field
+            cursor.execute(
+                f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(f"{TABLE}_{field.column}_fk")} '
+                f'FOREIGN KEY ({quote(field.column)}) '
+                f'REFERENCES {quote(target.model._meta.db_table)} ({quote(target.column)}) '
+                f'DEFERRABLE INITIALLY DEFERRED'
+            )
+        # Индекс по category_id нужен для проверки PROTECT при удалении категории
+        cursor.execute(f'CREATE INDEX {quote(TABLE + "_category_id_idx")} ON {quote(TABLE)} (category_id)')
+        for index in model._meta.indexes:
+            schema_editor.add_index(model, index)
+        if with_search:
+            search.install(connection)
+    return True
+
+
+def convert_to_plain(schema_editor, model):
+    """Обратный перевод: обычная таблица с теми же данными (для отката миграции)."""
+    connection = schema_editor.connection
+    if not is_partitioned(connection):
+        return False
+
+    quote = connection.ops.quote_name
+    partitioned_table = f'{TABLE}_partitioned'
+    with_search = search.is_installed(connection)
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} RENAME TO {quote(partitioned_table)}')
+        cursor.execute(f'ALTER TABLE {quote(partitioned_table)} ALTER COLUMN id DROP DEFAULT')
+        cursor.execute(f'DROP SEQUENCE {quote(SEQUENCE)}')
+        # Имена индексов и первичного ключа уникальны в схеме - освобождаем их для новой таблицы
+        cursor.execute(f'ALTER TABLE {quote(partitioned_table)} DROP CONSTRAINT {quote(TABLE + "_pkey")}')
+        for index_name in [index.name for index in model._meta.indexes] + [TABLE + '_category_id_idx', search.PG_INDEX]:
+            cursor.execute(f'DROP INDEX IF EXISTS {quote(index_name)}')
+        schema_editor.create_model(model)
+        columns = ', '.join(quote(field.column) for field in model._meta.concrete_fields)
+        cursor.execute(
+            f'INSERT INTO {quote(TABLE)} ({columns}) OVERRIDING SYSTEM VALUE '
+            f'SELECT {columns} FROM {quote(partitioned_table)}'
+        )
+        cursor.execute(f'DROP TABLE {quote(partitioned_table)} CASCADE')
+        if with_search:
+            search.install(connection)
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) "
+            f"FROM {quote(TABLE)}",
+            [TABLE],
+        )
+    return True
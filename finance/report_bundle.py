@@ -0,0 +1,214 @@
+# finance/report_bundle.py
+"""
+Архив за год (ZIP) для бухгалтера: PDF за каждый месяц со всеми операциями,
+Excel за год и CSV всех операций.
+
+- операции года читаются один раз (ReportDataset.for_period), наборы за
+  месяцы - срезы тех же колонок (ReportDataset.part);
+- файлы, которые уже есть в кэше отчётов по текущей версии данных
+  (finance.report_cache), берутся из хранилища как есть; остальные строятся
+  в пуле процессов и сохраняются в кэш - тот же месяц, запрошенный потом
+  в конструкторе отчётов, строить уже не придётся;
+- пул один на процесс веб-сервера и общий для всех запросов: не больше
+  REPORT_WORKER_PROCESSES отчётов строятся одновременно, сколько бы архивов
+  ни скачивали; процессы пула запускаются через spawn - fork многопоточного
+  сервера небезопасен;
+- архив пишется zipfile в поток без seek (данные каждой записи - после неё,
+  в data descriptor) и отдаётся порциями по мере готовности записей: в памяти
+  нет ни всего архива, ни всех файлов сразу - только текущая порция;
+- пока пул строит отчёты, основной процесс пишет CSV и готовые файлы из кэша.
+"""
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .report_cache import lookup, open_report, report_filters, store
+from .reports import worker
+from .reports.dataset import ReportDataset
+
+CHUNK_SIZE = 64 * 1024
+CSV_HEADERS = ['date', 'type', 'category', 'amount', 'description']
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class _ZipStream:
+    """Поток для zipfile без seek: копит записанные байты, пока их не заберёт drain()."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def months(year, today=None):
+    """[(начало, конец)] месяцев года - не позже текущего."""
+    today = today or timezone.now().date()
+    result = []
+    for month in range(1, 13):
+        start_date = date(year, month, 1)
+        if start_date > today:
+            break
+        result.append((start_date, date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)))
+    return result
+
+
+def _file_chunks(fileobj):
+    with fileobj:
+        while chunk := fileobj.read(CHUNK_SIZE):
+            yield chunk
+
+
+def _csv_chunks(dataset):
+    """CSV операций (UTF-8 с BOM - чтобы Excel узнал кириллицу) порциями около CHUNK_SIZE."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(CSV_HEADERS)
+    for day, type, category, amount, description in dataset.rows():
+        writer.writerow([day.isoformat(), type, category, amount, description or ''])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _entry(archive, stream, name, chunks, compress=False):
+    """Пишет запись архива и отдаёт байты архива по мере записи."""
+    info = zipfile.ZipInfo(name, date_time=timezone.localtime().timetuple()[:6])
+    # PDF и xlsx уже сжаты - храним как есть, CSV сжимаем
+    info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with archive.open(info, 'w') as entry:
+        for chunk in chunks:
+            entry.write(chunk)
+            if data := stream.drain():
+                yield data
+    if data := stream.drain():
+        yield data
+
+
+def _new_pool():
+    return ProcessPoolExecutor(
+        max_workers=getattr(settings, 'REPORT_WORKER_PROCESSES', 2),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=worker.init_worker,
+    )
+
+
+def _submit(report_format, dataset):
+    """Задание в общий пул; пул создаётся при первом архиве и заново - если процесс пула упал."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _new_pool()
+        try:
+            return _pool.submit(worker.render_dataset, report_format, dataset)
+        except BrokenProcessPool:
+            _pool = _new_pool()
+            return _pool.submit(worker.render_dataset, report_format, dataset)
+
+
+def _discard(future):
+    """Построенный, но уже не нужный отчёт: удаляем временный файл."""
+    if not future.cancelled() and future.exception() is None:
+        os.unlink(future.result())
+
+
+def year_bundle(user, year, today=None):
+    """
+    Генератор байтов ZIP-архива за год (для StreamingHttpResponse).
+    Месяцы без операций в архив не попадают.
+    """
+    start_date, end_date = date(year, 1, 1), date(year, 12, 31)
+    dataset = ReportDataset.for_period(user, start_date, end_date)
+
+    # (имя в архиве, фильтры кэша, набор данных) - что должно оказаться в архиве
+    plan = [
+        (f'{year}/pdf/{month_start:%Y-%m}.pdf',
+         report_filters('pdf', month_start, month_end, full_detail=True),
+         dataset.part(month_start, month_end))
+        for month_start, month_end in months(year, today)
+    ]
+    plan = [item for item in plan if len(item[2])]
+    if len(dataset):
+        plan.append((f'{year}/fincontrol_{year}.xlsx', report_filters('excel', start_date, end_date), dataset))
+
+    cached, missing = [], []
+    for name, filters, part in plan:
+        key, version, report = lookup(user, filters)
+        if report is not None:
+            cached.append((name, report))
+        else:
+            missing.append((name, filters, part, key, version))
+    logger.info("📦 Архив за %s: файлов %s, из кэша %s, строится %s", year, len(plan) + 1, len(cached), len(missing))
+
+    stream = _ZipStream()
+    archive = zipfile.ZipFile(stream, 'w', allowZip64=True)
+    errors = []
+    futures = {}
+    try:
+        for name, filters, part, key, version in missing:
+            futures[_submit(filters['format'], part)] = (name, filters, key, version)
+
+        # Пока пул строит отчёты - CSV и готовые файлы из кэша
+        yield from _entry(archive, stream, f'{year}/transactions_{year}.csv', _csv_chunks(dataset), compress=True)
+        for name, report in cached:
+            fileobj, _content_type = open_report(report)
+            yield from _entry(archive, stream, name, _file_chunks(fileobj))
+
+        for future in as_completed(list(futures)):
+            name, filters, key, version = futures.pop(future)
+            try:
+                path = future.result()
+            except Exception as e:
+                logger.error("❌ Ошибка построения %s: %s", name, e)
+                errors.append(f"{name}: {e}")
+                continue
+            try:
+                with open(path, 'rb') as report_file:
+                    report = store(user, key, version, filters, report_file)
+            finally:
+                os.unlink(path)
+            fileobj, _content_type = open_report(report)
+            yield from _entry(archive, stream, name, _file_chunks(fileobj))
+
+        if errors:
+            yield from _entry(archive, stream, f'{year}/errors.txt', ['\n'.join(errors).encode('utf-8')], compress=True)
+        archive.close()
+        yield stream.drain()
+    finally:
+        # Клиент оборвал загрузку - ждущие задания этого архива снимаем с пула,
+        # файлы уже построенных и ещё строящихся удаляем по готовности
+        for future in futures:
+            future.cancel()
+            future.add_done_callback(_discard)
+
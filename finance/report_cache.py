@@ -0,0 +1,251 @@
+# finance/report_cache.py
+"""
+Кэш готовых отчётов (PDF/Excel) в SavedReport.file.
+
+Ключ - пользователь, формат, период и фильтры (cache_key); рядом хранится
+версия данных, по которой построен файл:
+- сумма версий месяцев периода DataVersion 'transactions:<user_id>:<ГГГГ-ММ>'
+  (версия месяца увеличивается при каждом изменении операции с датой в нём,
+  см. finance.columnar) - изменения вне периода отчёт не устаревают;
+- остаток на начало периода - он меняется от правок до периода;
+- версия справочника категорий (в отчёте - названия категорий).
+
+Если версия не изменилась, файл отдаётся из хранилища как есть - reportlab
+и openpyxl при этом даже не импортируются. Иначе отчёт строится заново и
+заменяет старый файл той же записи. Старые файлы вытесняются по возрасту
+(REPORT_CACHE_MAX_AGE_DAYS) и по общему размеру (REPORT_CACHE_MAX_MB,
+сначала давно не запрошенные).
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, router, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .categories import VERSION_KEY as CATEGORY_VERSION_KEY
+from .columnar import month_key
+from .db_router import read_replica
+from .ledger import balance_at
+from .models import DataVersion, SavedReport
+from .rollups import to_decimal
+from .versions import get_version
+
+FORMATS = {
+    'pdf': ('pdf', 'application/pdf'),
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+@dataclass
+class CachedReport:
+    """Открытый файл отчёта и признак попадания в кэш."""
+    file: object
+    content_type: str
+    hit: bool
+
+
+def _periods(filters):
+    """Периоды, данные которых попадают в отчёт: сравнение - ещё прошлый период и год назад."""
+    start_date, end_date = date.fromisoformat(filters['start_date']), date.fromisoformat(filters['end_date'])
+    if filters.get('mode') != 'comparison':
+        return [(start_date, end_date)]
+    from .comparison import previous_period, year_ago_period
+    return [(start_date, end_date), previous_period(start_date, end_date), year_ago_period(start_date, end_date)]
+
+
+def data_version(user, filters):
+    """
+    Версия данных, от которых зависит отчёт пользователя: меняется, только
+    если изменились операции внутри его периодов или остаток на начало.
+    """
+    user_id = getattr(user, 'pk', user)
+    changes = 0
+    for start_date, end_date in _periods(filters):
+        # Ключи месяцев одного пользователя упорядочены - период одним диапазоном
+        changes += DataVersion.objects.filter(
+            key__gte=month_key(user_id, start_date), key__lte=month_key(user_id, end_date),
+        ).aggregate(total=Sum('version'))['total'] or 0
+    opening = to_decimal(balance_at(user_id, _periods(filters)[0][0] - timedelta(days=1)))
+    return f'{changes}.{opening}.{get_version(CATEGORY_VERSION_KEY)}'
+
+
+def report_filters(report_format, start_date, end_date, categories=None, full_detail=False, comparison=False):
+    """
+    Параметры отчёта в виде словаря (сохраняется в SavedReport.filters).
+    comparison=True - сравнение с предыдущим периодом и годом ранее (mode='comparison').
+    """
+    filters = {
+        'format': report_format,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'categories': sorted(categories) if categories else [],
+    }
+    if comparison:
+        filters['mode'] = 'comparison'
+    elif report_format == 'pdf':
+        filters['detail'] = 'full' if full_detail else 'preview'
+    return filters
+
+
+def cache_key(user, filters):
+    payload = json.dumps({'user': getattr(user, 'pk', user), **filters}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cache_entries(using=None):
+    return SavedReport.objects.using(using or router.db_for_write(SavedReport)).exclude(cache_key='')
+
+
+def _generate(user, report_format, start_date, end_date, categories, full_detail, progress=None, comparison=False):
+    """Строит отчёт во временном файле (импорт генераторов - только здесь, при промахе)."""
+    if comparison and report_format == 'excel':
+        from .reports.excel_report import comparison_excel_file
+        return comparison_excel_file(user, start_date, end_date, categories=categories)
+    if comparison:
+        from .reports.pdf_report import comparison_pdf_file
+        return comparison_pdf_file(user, start_date, end_date, categories=categories)
+    if report_format == 'excel':
+        from .reports.excel_report import excel_report_file
+        return excel_report_file(user, start_date, end_date, categories=categories, progress=progress)
+    from .reports.pdf_report import pdf_report_file
+    return pdf_report_file(user, start_date, end_date, categories=categories, full_detail=full_detail, progress=progress)
+
+
+def _store(user, key, version, filters, report_file):
+    """Сохраняет файл в запись кэша; прежний файл удаляется после фиксации."""
+    extension = FORMATS[filters['format']][0]
+    entries = _cache_entries()
+    with transaction.atomic(using=entries.db):
+        report = entries.select_for_update().filter(user=user, cache_key=key).first()
+        previous_name = report.file.name if report is not None and report.file else None
+        if report is None:
+            report = SavedReport(
+                user=user,
+                name=f"Кэш {filters.get('mode', filters['format'])} {filters['start_date']} - {filters['end_date']} #{key[:12]}",
+                report_format=filters['format'],
+                cache_key=key,
+            )
+        report.filters = filters
+        report.data_version = version
+        report.file.save(f'{key[:16]}.{extension}', File(report_file), save=False)
+        report.file_size = report.file.size
+        report.file_generated_at = timezone.now()
+        try:
+            with transaction.atomic(using=entries.db):
+                report.save(using=entries.db)
+        except IntegrityError:
+            # Ту же запись одновременно создал другой запрос - оставляем его файл
+            report.file.storage.delete(report.file.name)
+            return entries.get(user=user, cache_key=key)
+        if previous_name:
+            storage = report.file.storage
+            transaction.on_commit(lambda: storage.delete(previous_name), using=entries.db)
+    return report
+
+
+def _fresh(user, filters):
+    """Ключ, текущая версия данных и запись кэша, если её файл построен по этой версии."""
+    key = cache_key(user, filters)
+    # Версию читаем до построения: если данные изменятся во время генерации,
+    # файл сохранится со старой версией и следующий запрос построит его заново
+    with read_replica(user):
+        version = data_version(user, filters)
+    report = _cache_entries().filter(user=user, cache_key=key).first()
+    if report is not None and report.data_version == version and report.has_file:
+        _cache_entries().filter(pk=report.pk).update(updated_at=timezone.now())
+        return key, version, report
+    return key, version, None
+
+
+def find_report(user, filters):
+    """Готовый актуальный отчёт из кэша (SavedReport) или None - без построения."""
+    return _fresh(user, filters)[2]
+
+
+def lookup(user, filters):
+    """
+    (ключ, версия данных, актуальная запись или None) - для тех, кто строит
+    файл сам (finance.report_bundle); построенный файл сохраняется через store().
+    """
+    return _fresh(user, filters)
+
+
+def store(user, key, version, filters, report_file):
+    """Сохраняет построенный файл отчёта в кэш (см. lookup) и вытесняет лишнее."""
+    report = _store(user, key, version, filters, report_file)
+    evict()
+    return report
+
+
+def cached_report(user, report_format, start_date, end_date, categories=None, full_detail=False, progress=None,
+                  comparison=False):
+    """
+    Отчёт за период из кэша или построенный заново: (SavedReport, попадание в кэш).
+    progress(done, total) вызывается по ходу построения (см. finance.report_jobs).
+    """
+    if report_format not in FORMATS:
+        raise ValueError(f"Неизвестный формат отчета: {report_format}")
+    filters = report_filters(report_format, start_date, end_date, categories, full_detail, comparison)
+    key, version, report = _fresh(user, filters)
+    if report is not None:
+        return report, True
+
+    report_file = _generate(user, report_format, start_date, end_date, categories, full_detail, progress, comparison)
+    try:
+        report = store(user, key, version, filters, report_file)
+    finally:
+        report_file.close()
+    return report, False
+
+
+def open_report(report):
+    """Файл отчёта из кэша, открытый на чтение (для FileResponse), и его content type."""
+    return report.file.storage.open(report.file.name, 'rb'), FORMATS[report.report_format][1]
+
+
+def get_report(user, report_format, start_date, end_date, categories=None, full_detail=False, comparison=False):
+    """
+    Отчёт за период из кэша или построенный заново.
+    Возвращает CachedReport с файлом, открытым на чтение (для FileResponse).
+    """
+    report, hit = cached_report(user, report_format, start_date, end_date, categories, full_detail,
+                                comparison=comparison)
+    fileobj, content_type = open_report(report)
+    return CachedReport(file=fileobj, content_type=content_type, hit=hit)
+
+
+def evict(max_age_days=None, max_mb=None):
+    """
+    Удаляет из кэша файлы старше max_age_days и, если общий размер больше
+    max_mb, - давно не запрошенные. Возвращает (удалено записей, освобождено байт).
+    """
+    if max_age_days is None:
+        max_age_days = getattr(settings, 'REPORT_CACHE_MAX_AGE_DAYS', 30)
+    if max_mb is None:
+        max_mb = getattr(settings, 'REPORT_CACHE_MAX_MB', 500)
+    entries = _cache_entries()
+
+    expired = list(
+        entries.filter(file_generated_at__lt=timezone.now() - timedelta(days=max_age_days))
+        .values_list('pk', 'file_size')
+    )
+    removed = dict(expired)
+
+    budget = max_mb * 1024 * 1024
+    total = (entries.aggregate(total=Sum('file_size'))['total'] or 0) - sum(removed.values())
+    if total > budget:
+        for pk, size in entries.exclude(pk__in=list(removed)).order_by('updated_at').values_list('pk', 'file_size').iterator():
+            if total <= budget:
+                break
+            removed[pk] = size
+            total -= size
+
+    if removed:
+        # Файлы удаляет сигнал post_delete после фиксации (finance.signals)
+        entries.filter(pk__in=list(removed)).delete()
+    return len(removed), sum(removed.values())
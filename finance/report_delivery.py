@@ -0,0 +1,198 @@
+# finance/report_delivery.py
+"""
+Рассылка еженедельных и ежемесячных отчётов в Telegram (cron
+send_weekly_reports / send_monthly_reports).
+
+Конвейер:
+- получатели - один запрос: действующее согласие, telegram_id и хотя бы
+  одна операция за период (по дневным сводкам), по возрастанию id;
+- отчёты строятся в пуле процессов (REPORT_WORKER_PROCESSES) теми же
+  генераторами, что и в вебе, и сохраняются в SavedReport.file через кэш
+  отчётов (finance.report_cache);
+- готовые файлы отправляются асинхронно, не больше REPORT_DELIVERY_CONCURRENCY
+  отправок одновременно, пока пул строит следующие;
+- пользователи идут порциями по REPORT_DELIVERY_BATCH_SIZE; после каждой
+  обработанной порции в ReportRun записывается контрольная точка (последний
+  id), и упавшая рассылка при следующем запуске продолжается с неё. Порции,
+  которые были в работе в момент сбоя (не больше IN_FLIGHT_BATCHES),
+  проходят заново: файлы берутся из кэша, но сообщение может прийти дважды.
+"""
+import asyncio
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, router
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from .models import DailySummary, ReportRun, SavedReport
+from .report_cache import FORMATS, open_report
+from .report_jobs import _concurrent_writes_ok
+from .reports import worker
+from .sqlite_profile import retry_write
+
+# Сколько порций одновременно в работе: пока одна досылается, следующая уже строится
+IN_FLIGHT_BATCHES = 2
+
+TITLES = {
+    ReportRun.WEEKLY: 'Еженедельный отчет',
+    ReportRun.MONTHLY: 'Ежемесячный отчет',
+}
+
+
+def previous_week(today):
+    """Прошлая неделя с понедельника по воскресенье."""
+    monday = today - timedelta(days=today.weekday())
+    return monday - timedelta(days=7), monday - timedelta(days=1)
+
+
+def previous_month(today):
+    """Прошлый календарный месяц."""
+    end = today.replace(day=1) - timedelta(days=1)
+    return end.replace(day=1), end
+
+
+PERIODS = {
+    ReportRun.WEEKLY: previous_week,
+    ReportRun.MONTHLY: previous_month,
+}
+
+
+def recipients(start_date, end_date, after=0):
+    """[(user_id, telegram_id)] получателей рассылки с id больше after - одним запросом."""
+    active = DailySummary.objects.filter(user=OuterRef('pk'), date__gte=start_date, date__lte=end_date)
+    return list(
+        User.objects.filter(
+            id__gt=after,
+            consent__given_at__isnull=False,
+            consent__revoked_at__isnull=True,
+            consent__telegram_id__isnull=False,
+        )
+        .filter(Exists(active))
+        .order_by('id')
+        .values_list('id', 'consent__telegram_id')
+    )
+
+
+async def send_document(telegram_id, filename, content, caption):
+    """Отправка файла отчёта ботом (telegram_bot.bot)."""
+    from aiogram.types import BufferedInputFile
+    from telegram_bot import bot
+
+    await bot.send_document(telegram_id, BufferedInputFile(content, filename=filename), caption=caption)
+
+
+def _read_report(report_id):
+    fileobj, _content_type = open_report(SavedReport.objects.get(pk=report_id))
+    with fileobj:
+        return fileobj.read()
+
+
+def _save_checkpoint(run_id, last_user_id, sent, failed):
+    runs = ReportRun.objects.filter(id=run_id)
+    retry_write(
+        runs.update, router.db_for_write(ReportRun),
+        last_user_id=last_user_id, sent=F('sent') + sent, failed=F('failed') + failed, updated_at=timezone.now(),
+    )
+
+
+async def _deliver_all(run, users, pool, deliver, batch_size, concurrency, log):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    caption = f"📊 {TITLES[run.kind]} за {run.period_start:%d.%m.%Y} - {run.period_end:%d.%m.%Y}"
+    filename = f"{run.kind}_{run.period_start}_{run.period_end}.{FORMATS[run.report_format][0]}"
+    read_report = sync_to_async(_read_report)
+    save_checkpoint = sync_to_async(_save_checkpoint)
+
+    async def handle(user_id, telegram_id):
+        try:
+            report_id = await loop.run_in_executor(
+                pool, worker.render_report, user_id, run.report_format, run.period_start, run.period_end,
+            )
+            content = await read_report(report_id)
+            async with semaphore:
+                await deliver(telegram_id, filename, content, caption)
+            return True
+        except Exception as e:
+            log(f"❌ Ошибка отправки отчета пользователю {user_id}: {e}")
+            return False
+
+    async def process(batch):
+        results = await asyncio.gather(*(handle(user_id, telegram_id) for user_id, telegram_id in batch))
+        return results.count(True), results.count(False)
+
+    started = time.perf_counter()
+    processed = 0
+
+    async def checkpoint():
+        nonlocal processed
+        last_user_id, size, task = in_flight.popleft()
+        sent, failed = await task
+        await save_checkpoint(run.id, last_user_id, sent, failed)
+        processed += size
+        minutes = (time.perf_counter() - started) / 60
+        log(f"📈 {processed}/{len(users)}: отправлено {sent}, ошибок {failed}, {processed / minutes:.0f} отчетов/мин")
+
+    in_flight = deque()
+    rows = iter(users)
+    while batch := list(islice(rows, batch_size)):
+        in_flight.append((batch[-1][0], len(batch), asyncio.create_task(process(batch))))
+        if len(in_flight) >= IN_FLIGHT_BATCHES:
+            await checkpoint()
+    while in_flight:
+        await checkpoint()
+
+
+def send_reports(kind, today=None, report_format=None, processes=None, deliver=None, log=print):
+    """
+    Рассылает отчёты kind (ReportRun.WEEKLY/MONTHLY) за прошлый период.
+    Повторный запуск за тот же период продолжает незаконченную рассылку
+    с контрольной точки, законченную - пропускает. Возвращает ReportRun.
+    deliver(telegram_id, filename, content, caption) - корутина отправки (по умолчанию ботом).
+    """
+    start_date, end_date = PERIODS[kind](today or timezone.now().date())
+    run, _created = ReportRun.objects.get_or_create(
+        kind=kind, period_start=start_date,
+        defaults={
+            'period_end': end_date,
+            'report_format': report_format or getattr(settings, 'REPORT_DELIVERY_FORMAT', 'pdf'),
+        },
+    )
+    if run.finished_at is not None:
+        log(f"ℹ️ {TITLES[kind]} за {start_date:%d.%m.%Y} - {end_date:%d.%m.%Y} уже разослан")
+        return run
+    if run.last_user_id:
+        log(f"♻️ Продолжаем рассылку после пользователя #{run.last_user_id}")
+
+    users = recipients(start_date, end_date, after=run.last_user_id)
+    log(f"📬 {TITLES[kind]} за {start_date:%d.%m.%Y} - {end_date:%d.%m.%Y}: получателей {len(users)}")
+
+    if users:
+        processes = processes or getattr(settings, 'REPORT_WORKER_PROCESSES', 2)
+        if processes > 1 and not _concurrent_writes_ok():
+            log("⚠️ SQLite без WAL (SQLITE_PROFILE=wal): отчеты строятся в один процесс")
+            processes = 1
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        # Соединения родителя не должны достаться процессам пула
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=worker.init_worker) as pool:
+            asyncio.run(_deliver_all(
+                run, users, pool, deliver or send_document,
+                batch_size=getattr(settings, 'REPORT_DELIVERY_BATCH_SIZE', 100),
+                concurrency=getattr(settings, 'REPORT_DELIVERY_CONCURRENCY', 10),
+                log=log,
+            ))
+
+    run.refresh_from_db()
+    run.finished_at = timezone.now()
+    retry_write(run.save, router.db_for_write(ReportRun), update_fields=['finished_at', 'updated_at'])
+    log(f"✅ Рассылка завершена: отправлено {run.sent}, ошибок {run.failed}")
+    return run
@@ -0,0 +1,238 @@
+# finance/report_jobs.py
+"""
+Фоновое построение отчётов: очередь заданий ReportJob в БД и пул процессов.
+
+- submit() только записывает задание (или сразу отдаёт готовый файл из кэша
+  отчётов finance.report_cache) - запрос не ждёт генерации;
+- команда run_report_worker (serve) забирает задания из очереди без внешнего
+  брокера: задание "захватывается" условным UPDATE status='pending' -> 'running',
+  поэтому несколько воркеров не возьмут одно и то же;
+- отчёт строится в ограниченном пуле процессов (REPORT_WORKER_PROCESSES)
+  теми же генераторами, что и в вебе; шрифт и стили reportlab загружаются
+  один раз при старте процесса пула (finance.reports.worker);
+- по ходу построения процессы пула присылают прогресс через очередь, serve()
+  пишет его в задание; результат - запись SavedReport с файлом.
+
+На SQLite без WAL (SQLITE_PROFILE=wal) долгое чтение одного процесса
+блокирует запись другого, поэтому пул там работает в один процесс.
+"""
+import multiprocessing
+import queue
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import OperationalError, connections, router
+from django.utils import timezone
+
+from .models import ReportJob
+from .report_cache import FORMATS, cached_report, find_report, report_filters
+from .reports import worker
+from .sqlite_profile import is_locked_error, retry_write
+
+PROGRESS_INTERVAL = 1.0
+# Доля прогресса на вёрстку операций; остальное - сохранение файла
+RENDER_PROGRESS = 95
+
+
+def submit(user, report_format, start_date, end_date, categories=None, full_detail=False, comparison=False):
+    """Ставит отчёт в очередь. Если актуальный файл уже в кэше, задание сразу готово."""
+    if report_format not in FORMATS:
+        raise ValueError(f"Неизвестный формат отчета: {report_format}")
+    params = report_filters(report_format, start_date, end_date, categories, full_detail, comparison)
+    report = find_report(user, params)
+    if report is not None:
+        now = timezone.now()
+        return ReportJob.objects.create(
+            user=user, report_format=report_format, params=params,
+            status=ReportJob.DONE, progress=100, report=report, started_at=now, finished_at=now,
+        )
+    return ReportJob.objects.create(user=user, report_format=report_format, params=params)
+
+
+def claim_next():
+    """Захватывает самое старое задание из очереди; id задания или None."""
+    candidates = ReportJob.objects.filter(status=ReportJob.PENDING).order_by('created_at', 'id')
+    for job_id in candidates.values_list('id', flat=True)[:10]:
+        now = timezone.now()
+        claimed = ReportJob.objects.filter(id=job_id, status=ReportJob.PENDING).update(
+            status=ReportJob.RUNNING, progress=0, started_at=now, updated_at=now,
+        )
+        if claimed:
+            return job_id
+    return None
+
+
+def requeue_stale(minutes=None):
+    """
+    Задания в статусе 'running', которые давно не обновляли прогресс (воркер
+    остановлен или упал), возвращаются в очередь.
+    """
+    if minutes is None:
+        minutes = getattr(settings, 'REPORT_JOB_STALE_MINUTES', 15)
+    return ReportJob.objects.filter(
+        status=ReportJob.RUNNING, updated_at__lt=timezone.now() - timedelta(minutes=minutes),
+    ).update(status=ReportJob.PENDING, progress=0, updated_at=timezone.now())
+
+
+def _finish(job_id, **fields):
+    """Итоговый статус задания; при занятой SQLite запись повторяется (finance.sqlite_profile)."""
+    now = timezone.now()
+    jobs = ReportJob.objects.filter(id=job_id)
+    retry_write(jobs.update, router.db_for_write(ReportJob), finished_at=now, updated_at=now, **fields)
+
+
+def _fail(job_id, error):
+    _finish(job_id, status=ReportJob.FAILED, error=str(error)[:2000])
+
+
+class ProgressReporter:
+    """
+    callback(done, total) для генераторов в процессе пула: отправляет процент
+    (не чаще раза в PROGRESS_INTERVAL) в send((job_id, percent)).
+
+    Обычно send кладёт его в очередь, а в БД пишет serve(): у процесса пула
+    открыт курсор чтения операций, и при нескольких процессах его запись ждала
+    бы чужие блокировки (в WAL - упиралась бы в устаревший снимок). На SQLite
+    без WAL пул из одного процесса пишет прогресс сам (write_progress).
+    """
+
+    def __init__(self, job_id, send):
+        self.job_id = job_id
+        self.send = send
+        self.last = 0.0
+
+    def __call__(self, done, total):
+        now = time.monotonic()
+        if now - self.last < PROGRESS_INTERVAL:
+            return
+        self.last = now
+        percent = min(RENDER_PROGRESS, done * RENDER_PROGRESS // total) if total else RENDER_PROGRESS
+        self.send((self.job_id, percent))
+
+
+def write_progress(item):
+    """Пишет (job_id, percent) в задание; если база занята - пропускает (придёт следующий)."""
+    job_id, percent = item
+    try:
+        ReportJob.objects.filter(id=job_id, status=ReportJob.RUNNING).update(
+            progress=percent, updated_at=timezone.now(),
+        )
+    except OperationalError as e:
+        if not is_locked_error(e):
+            raise
+
+
+def _save_progress(progress_queue):
+    """Последний присланный процент по каждому заданию - в БД."""
+    latest = {}
+    while True:
+        try:
+            job_id, percent = progress_queue.get_nowait()
+        except queue.Empty:
+            break
+        latest[job_id] = percent
+    for item in latest.items():
+        write_progress(item)
+
+
+def run_job(job_id, progress=None):
+    """
+    Строит отчёт захваченного задания (выполняется в процессе пула).
+    Возвращает None при успехе, иначе текст ошибки - его выводит serve() в свой log.
+    progress(done, total) - см. ProgressReporter.
+    """
+    job = ReportJob.objects.select_related('user').get(id=job_id)
+    params = job.params
+    try:
+        report, _hit = cached_report(
+            job.user, job.report_format,
+            date.fromisoformat(params['start_date']), date.fromisoformat(params['end_date']),
+            categories=params.get('categories') or None,
+            full_detail=params.get('detail') == 'full',
+            progress=progress,
+            comparison=params.get('mode') == 'comparison',
+        )
+    except Exception as e:
+        _fail(job_id, e)
+        return str(e)
+
+    _finish(job_id, status=ReportJob.DONE, progress=100, report=report, error='')
+    return None
+
+
+def _concurrent_writes_ok():
+    """Могут ли процессы пула и serve() писать, пока другие процессы читают операции."""
+    connection = connections[router.db_for_write(ReportJob)]
+    if connection.vendor != 'sqlite':
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        return cursor.fetchone()[0].lower() == 'wal'
+
+
+def serve(processes=None, poll_interval=None, once=False, log=print):
+    """
+    Разбирает очередь заданий пулом из processes процессов.
+    once=True - выйти, когда очередь опустела (для cron и проверки), иначе работать бесконечно.
+    """
+    processes = processes or getattr(settings, 'REPORT_WORKER_PROCESSES', 2)
+    concurrent = _concurrent_writes_ok()
+    if processes > 1 and not concurrent:
+        log("⚠️ SQLite без WAL (SQLITE_PROFILE=wal): отчеты строятся в один процесс")
+        processes = 1
+    poll_interval = poll_interval or getattr(settings, 'REPORT_WORKER_POLL_SECONDS', 1.0)
+    # fork - процессы пула наследуют настроенный Django; spawn - настраивают его сами (worker.init_worker)
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+
+    requeued = requeue_stale()
+    if requeued:
+        log(f"♻️ Возвращено в очередь зависших заданий: {requeued}")
+
+    progress_queue = context.Queue() if concurrent else None
+    while True:
+        running = {}
+        try:
+            with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                                     initializer=worker.init_worker, initargs=(progress_queue,)) as pool:
+                while True:
+                    while len(running) < processes:
+                        job_id = claim_next()
+                        if job_id is None:
+                            break
+                        # Соединения родителя не должны достаться дочерним процессам
+                        connections.close_all()
+                        running[pool.submit(worker.run_job, job_id)] = (job_id, time.perf_counter())
+
+                    if not running:
+                        if once:
+                            return
+                        time.sleep(poll_interval)
+                        continue
+
+                    done, _pending = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    if progress_queue is not None:
+                        _save_progress(progress_queue)
+                    for future in done:
+                        job_id, started = running[future]
+                        try:
+                            error = future.result()
+                        except BrokenProcessPool:
+                            raise
+                        except Exception as e:
+                            _fail(job_id, e)
+                            error = str(e)
+                        del running[future]
+                        elapsed = time.perf_counter() - started
+                        if error is None:
+                            log(f"✅ Отчет #{job_id}: {elapsed:.1f} с")
+                        else:
+                            log(f"❌ Ошибка построения отчета #{job_id} ({elapsed:.1f} с): {error}")
+        except BrokenProcessPool as e:
+            # Процесс пула аварийно завершился - его задания помечаем ошибкой и поднимаем пул заново
+            for job_id, _started in running.values():
+                _fail(job_id, e)
+            log(f"❌ Пул процессов отчетов перезапущен: {e}")
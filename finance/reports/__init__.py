@@ -1,3 +1,14 @@
 # finance/reports/__init__.py
-from .excel_report import generate_excel_report
-from .pdf_report import generate_pdf_report
\ No newline at end of file
+# Генераторы импортируются при первом обращении: reportlab и openpyxl не
+# загружаются, пока отчёт не нужно строить (готовые отдаёт finance.report_cache)
+_EXPORTS = {
+    'generate_excel_report': 'excel_report',
+    'generate_pdf_report': 'pdf_report',
+}
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    return getattr(import_module(f'.{_EXPORTS[name]}', __name__), name)
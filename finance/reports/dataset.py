@@ -0,0 +1,270 @@
+# finance/reports/dataset.py
+"""
+Данные отчёта за период (ReportDataset) - общие для PDF, Excel и следующих форматов.
+
+- операции периода читаются одним запросом values_list (без экземпляров
+  моделей) порциями в компактные колонки NumPy (около 25 байт на операцию,
+  без описаний), плюс архивные файлы старой истории (finance.archive);
+  названия категорий - из реестра в памяти (finance.categories), без JOIN и
+  запросов на строку;
+- итоги, количества и разбивка по категориям считаются по этим колонкам за
+  один проход (ColumnWindow, PeriodSummary.from_columns);
+- остаток на начало периода - одна индексная выборка из DailyBalance; на
+  конец - остаток на начало плюс баланс периода (с фильтром категорий -
+  ещё одна выборка, остаток считается по всему счёту);
+- данные для диаграмм (series, expense_slices) - уже свёрнутые ряды, их
+  размер зависит от длины периода, а не от числа операций;
+- детальные строки (rows) с описаниями не хранятся: при каждом обходе они
+  читаются заново курсором по таблице порциями и из архивных файлов, так что
+  память не растёт с числом операций;
+- part() - набор за часть периода (например, месяц из года) срезом тех же
+  колонок, без повторного чтения из БД.
+"""
+import heapq
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+
+import numpy as np
+
+from finance.archive import CREATE_CHUNK, TYPE_FLAGS, TYPES, load_shard, shard_descriptions
+from finance.categories import category_registry
+from finance.columnar import DTYPES, ColumnWindow
+from finance.db_router import read_replica
+from finance.ledger import balance_at
+from finance.models import ArchiveShard, Transaction
+from finance.money import from_minor, minor
+from finance.summaries import PeriodSummary
+
+COLUMNS = ('id', 'date', 'amount', 'type', 'category_id')
+# Больше категорий на круговой диаграмме не различить - остальные объединяются
+CHART_MAX_SLICES = 8
+OTHER_LABEL = 'Прочее'
+
+
+def chart_granularity(start_date, end_date):
+    """Шаг ряда для диаграммы динамики: не больше пары месяцев точек по дням."""
+    days = (end_date - start_date).days + 1
+    if days <= 62:
+        return 'day'
+    if days <= 366:
+        return 'week'
+    return 'month'
+
+
+def _table_queryset(user_id, start_date, end_date, category_ids, using=None):
+    queryset = Transaction.objects.using(using).filter(user_id=user_id, date__gte=start_date, date__lte=end_date)
+    if category_ids is not None:
+        queryset = queryset.filter(category_id__in=category_ids)
+    return queryset.order_by('date', 'id')
+
+
+def _table_columns(user_id, start_date, end_date, category_ids):
+    """Операции из таблицы: колонки по порциям CREATE_CHUNK."""
+    rows = (
+        _table_queryset(user_id, start_date, end_date, category_ids)
+        .values_list('id', 'date', minor('amount'), 'type', 'category_id')
+        .iterator(chunk_size=CREATE_CHUNK)
+    )
+
+    parts = []
+    while chunk := list(islice(rows, CREATE_CHUNK)):
+        parts.append({
+            'id': np.array([row[0] for row in chunk], dtype=np.int64),
+            'date': np.array([row[1].toordinal() for row in chunk], dtype=np.int32),
+            'amount': np.array([row[2] for row in chunk], dtype=np.int64),  # копейки прямо из БД
+            'type': np.array([TYPE_FLAGS[row[3]] for row in chunk], dtype=np.int8),
+            'category_id': np.array([row[4] for row in chunk], dtype=np.int32),
+        })
+    return parts
+
+
+def _shard_names(user_id, start_date, end_date, using=None):
+    return list(
+        ArchiveShard.objects.using(using)
+        .filter(user_id=user_id, first_date__lte=end_date, last_date__gte=start_date)
+        .order_by('year').values_list('file', flat=True)
+    )
+
+
+def _shard_indexes(shard, start_date, end_date, category_ids):
+    mask = (shard['date'] >= start_date.toordinal()) & (shard['date'] <= end_date.toordinal())
+    if category_ids is not None:
+        mask &= np.isin(shard['category_id'], list(category_ids))
+    return np.flatnonzero(mask)
+
+
+def _archive_columns(user_id, start_date, end_date, category_ids):
+    """Операции из архивных файлов, пересекающихся с периодом."""
+    parts = []
+    for name in _shard_names(user_id, start_date, end_date):
+        shard = load_shard(name)
+        indexes = _shard_indexes(shard, start_date, end_date, category_ids)
+        parts.append({column: shard[column][indexes] for column in COLUMNS})
+    return parts
+
+
+def _table_rows(user_id, start_date, end_date, category_ids, using):
+    """(дата, id, флаг типа, копейки, id категории, описание) из таблицы - курсором порциями."""
+    rows = (
+        _table_queryset(user_id, start_date, end_date, category_ids, using)
+        .values_list('date', 'id', 'type', minor('amount'), 'category_id', 'description')
+        .iterator(chunk_size=CREATE_CHUNK)
+    )
+    for day, transaction_id, type, amount, category_id, description in rows:
+        yield day.toordinal(), transaction_id, TYPE_FLAGS[type], amount, category_id, description
+
+
+def _archive_rows(names, start_date, end_date, category_ids):
+    """Те же строки из архивных файлов - порциями по CREATE_CHUNK."""
+    for name in names:
+        shard = load_shard(name)
+        indexes = _shard_indexes(shard, start_date, end_date, category_ids)
+        for offset in range(0, len(indexes), CREATE_CHUNK):
+            chunk = indexes[offset:offset + CREATE_CHUNK]
+            yield from zip(
+                shard['date'][chunk].tolist(), shard['id'][chunk].tolist(), shard['type'][chunk].tolist(),
+                shard['amount'][chunk].tolist(), shard['category_id'][chunk].tolist(),
+                shard_descriptions(shard, chunk),
+            )
+
+
+@dataclass
+class ReportDataset:
+    """Операции пользователя за период в колонках и посчитанные по ним итоги."""
+    start_date: date
+    end_date: date
+    window: ColumnWindow
+    summary: PeriodSummary
+    opening_balance: Decimal
+    closing_balance: Decimal
+    # Откуда rows() читает детальные строки
+    user_id: int = None
+    category_ids: object = None
+
+    @classmethod
+    def for_period(cls, user, start_date, end_date, categories=None):
+        """categories - список названий категорий для фильтра (как в отчётах)."""
+        with read_replica(user):
+            return cls._load(user, start_date, end_date, categories)
+
+    @classmethod
+    def _load(cls, user, start_date, end_date, categories):
+        user_id = getattr(user, 'pk', user)
+        category_ids = category_registry.ids_for_names(categories) if categories else None
+
+        parts = (
+            _archive_columns(user_id, start_date, end_date, category_ids)
+            + _table_columns(user_id, start_date, end_date, category_ids)
+        )
+        if parts:
+            columns = {name: np.concatenate([part[name] for part in parts]).astype(DTYPES[name]) for name in COLUMNS}
+        else:
+            columns = {name: np.empty(0, dtype=DTYPES[name]) for name in COLUMNS}
+
+        # Порядок (дата, id); строка, которую архивировали во время чтения, могла прочитаться дважды
+        _unique, first = np.unique(columns['id'], return_index=True)
+        order = first[np.lexsort((columns['id'][first], columns['date'][first]))]
+        if len(order) != len(columns['id']) or np.any(order != np.arange(len(order))):
+            columns = {name: values[order] for name, values in columns.items()}
+
+        window = ColumnWindow(
+            start=start_date,
+            end=end_date,
+            dates=columns['date'],
+            amounts=columns['amount'],
+            types=columns['type'],
+            categories=columns['category_id'],
+        )
+        summary = PeriodSummary.from_columns(window, with_categories=True)
+
+        opening_balance = balance_at(user_id, start_date - timedelta(days=1))
+        if category_ids is None:
+            closing_balance = opening_balance + summary.balance
+        else:
+            closing_balance = balance_at(user_id, end_date)
+
+        return cls(
+            start_date=start_date,
+            end_date=end_date,
+            window=window,
+            summary=summary,
+            opening_balance=opening_balance,
+            closing_balance=closing_balance,
+            user_id=user_id,
+            category_ids=category_ids,
+        )
+
+    def __len__(self):
+        return len(self.window)
+
+    def part(self, start_date, end_date):
+        """
+        Набор за [start_date, end_date] внутри периода - срез колонок (даты
+        отсортированы) без запросов к БД. Остатки считаются от остатка на начало
+        всего периода, поэтому верны только для набора без фильтра категорий.
+        """
+        window = self.window
+        low = int(np.searchsorted(window.dates, start_date.toordinal(), side='left'))
+        high = int(np.searchsorted(window.dates, end_date.toordinal(), side='right'))
+        before = ColumnWindow(
+            start=self.start_date, end=start_date - timedelta(days=1),
+            dates=window.dates[:low], amounts=window.amounts[:low],
+            types=window.types[:low], categories=window.categories[:low],
+        )
+        part = ColumnWindow(
+            start=start_date, end=end_date,
+            dates=window.dates[low:high], amounts=window.amounts[low:high],
+            types=window.types[low:high], categories=window.categories[low:high],
+        )
+        summary = PeriodSummary.from_columns(part, with_categories=True)
+        opening_balance = self.opening_balance + before.income - before.expense
+        return ReportDataset(
+            start_date=start_date,
+            end_date=end_date,
+            window=part,
+            summary=summary,
+            opening_balance=opening_balance,
+            closing_balance=opening_balance + summary.balance,
+            user_id=self.user_id,
+            category_ids=self.category_ids,
+        )
+
+    def rows(self):
+        """
+        Строки детальных данных по (дата, id): (дата, 'income'/'expense',
+        название категории, сумма Decimal, описание или None).
+        Читаются заново при каждом обходе - архив и курсор по таблице, порциями.
+        """
+        with read_replica(self.user_id) as alias:
+            names = _shard_names(self.user_id, self.start_date, self.end_date, alias)
+        rows = heapq.merge(
+            _archive_rows(names, self.start_date, self.end_date, self.category_ids),
+            _table_rows(self.user_id, self.start_date, self.end_date, self.category_ids, alias),
+            key=lambda row: row[:2],
+        )
+        previous_id = None
+        for day, transaction_id, flag, amount, category_id, description in rows:
+            if transaction_id == previous_id:
+                continue  # строку архивировали во время чтения
+            previous_id = transaction_id
+            yield (
+                date.fromordinal(day),
+                TYPES[flag],
+                category_registry.name(category_id),
+                from_minor(amount),
+                description,
+            )
+
+    def series(self, granularity=None):
+        """Доходы и расходы по интервалам (analytics.Series) для диаграммы динамики."""
+        return self.window.series(granularity or chart_granularity(self.start_date, self.end_date))
+
+    def expense_slices(self, limit=CHART_MAX_SLICES):
+        """Расходы по категориям для круговой диаграммы: крупнейшие и OTHER_LABEL для остальных."""
+        items = self.summary.expense_by_category()
+        if len(items) <= limit:
+            return items
+        head = items[:limit - 1]
+        return head + [(OTHER_LABEL, sum(amount for _name, amount in items[limit - 1:]))]
@@ -1,125 +1,287 @@
-# finance/reports/excel_report.py - ИСПРАВИТЬ
+# finance/reports/excel_report.py
+"""
+Excel-отчёт в режиме write-only (openpyxl): строки пишутся в файл по мере
+чтения из ReportDataset и не накапливаются в памяти в виде ячеек.
+
+- generate_excel_report() - отчёт в BytesIO (как раньше, для небольших периодов);
+- excel_report_file() - отчёт во временном файле для FileResponse:
+  в памяти только компактные колонки ReportDataset, без ячеек и моделей.
+
+Диаграммы - встроенные объекты Excel (PieChart, LineChart), которые
+ссылаются на уже свёрнутые таблицы категорий и динамики: их размер и время
+построения не зависят от числа операций.
+
+write_comparison_excel() - сравнение периода с предыдущим и с годом ранее
+(finance.comparison), по листу на итоги, категории и интервалы.
+"""
+import io
+import tempfile
+from itertools import chain, islice
+
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.chart import LineChart, PieChart, Reference
+from openpyxl.chart.label import DataLabelList
 from openpyxl.styles import Font, Alignment, PatternFill
-from django.db.models import Sum
-import io
+from openpyxl.utils import get_column_letter
+
+from ..comparison import PERIOD_LABELS, PERIODS, ComparisonRow, PeriodComparison
+from .dataset import ReportDataset
+from .progress import track_progress
+
+HEADERS = ['Дата', 'Тип', 'Категория', 'Сумма', 'Описание']
+MAX_COLUMN_WIDTH = 50
+# Ширина колонок считается по первой порции строк: в write-only листе
+# размеры колонок записываются в файл до первой строки данных
+WIDTH_SAMPLE_ROWS = 2000
+
+
+def _header_cell(ws, value):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.font = Font(bold=True, color="FFFFFF")
+    cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    cell.alignment = Alignment(horizontal='center')
+    return cell
+
 
+def _bold_cell(ws, value):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.font = Font(bold=True)
+    return cell
 
-def generate_excel_report(user, start_date, end_date, categories=None):
-    """Генерация Excel отчета с графиками"""
-    from finance.models import Transaction
 
-    # Получаем транзакции
-    transactions = Transaction.objects.filter(
-        user=user,
-        date__gte=start_date,
-        date__lte=end_date
-    ).order_by('date')
+def _detail_rows(rows):
+    """Значения строк листа "Детальные данные" из ReportDataset.rows()."""
+    for day, type, category, amount, description in rows:
+        yield (
+            day.strftime('%d.%m.%Y'),
+            'Доход' if type == 'income' else 'Расход',
+            category,
+            amount,
+            description or '',
+        )
 
-    if categories:
-        transactions = transactions.filter(category__name__in=categories)
 
-    # Создание workbook
-    wb = openpyxl.Workbook()
+def _write_details(ws, dataset_rows):
+    rows = _detail_rows(dataset_rows)
+    sample = list(islice(rows, WIDTH_SAMPLE_ROWS))
+
+    # Автоширина колонок - по заголовку и первой порции строк, без второго прохода по листу
+    widths = [len(header) for header in HEADERS]
+    for values in sample:
+        for index, value in enumerate(values):
+            widths[index] = max(widths[index], len(str(value)))
+    for index, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(index)].width = min(width + 2, MAX_COLUMN_WIDTH)
+
+    ws.append([_header_cell(ws, header) for header in HEADERS])
+    for values in chain(sample, rows):
+        # Decimal пишется в ячейку как есть - без погрешности float
+        amount = WriteOnlyCell(ws, value=values[3])
+        amount.number_format = '0.00'
+        ws.append([values[0], values[1], values[2], amount, values[4]])
+
+
+def _expense_pie(ws, header_row, rows):
+    """Круговая диаграмма по блоку-источнику: заголовок в header_row и rows строк под ним."""
+    chart = PieChart()
+    chart.title = "Расходы по категориям"
+    chart.add_data(Reference(ws, min_col=2, min_row=header_row, max_row=header_row + rows), titles_from_data=True)
+    chart.set_categories(Reference(ws, min_col=1, min_row=header_row + 1, max_row=header_row + rows))
+    chart.dataLabels = DataLabelList()
+    chart.dataLabels.showPercent = True
+    chart.height, chart.width = 9, 14
+    return chart
+
+
+def _write_trend(ws, series):
+    """Таблица доходов и расходов по интервалам и линейная диаграмма по ней."""
+    ws.column_dimensions['A'].width = 12
+    ws.append([_header_cell(ws, header) for header in ("Период", "Доходы", "Расходы")])
+    for label, income, expense in zip(series.labels(), series.get('income'), series.get('expense')):
+        ws.append([label, round(income, 2), round(expense, 2)])
+    if not series.buckets:
+        return
+
+    chart = LineChart()
+    chart.title = "Доходы и расходы"
+    chart.y_axis.title = "руб."
+    chart.add_data(Reference(ws, min_col=2, max_col=3, min_row=1, max_row=len(series.buckets) + 1), titles_from_data=True)
+    chart.set_categories(Reference(ws, min_col=1, min_row=2, max_row=len(series.buckets) + 1))
+    chart.height, chart.width = 9, 18
+    ws.add_chart(chart, 'E2')
+
+
+def write_excel_report(user, start_date, end_date, fileobj, categories=None, progress=None, dataset=None):
+    """
+    Пишет Excel-отчёт за период в fileobj (файл или BytesIO).
+    progress(done, total) - необязательный callback по ходу записи операций;
+    dataset - уже загруженный ReportDataset (иначе загружается здесь).
+    """
+    # Операции, итоги и остатки - ReportDataset (один запрос к операциям + архив)
+    if dataset is None:
+        dataset = ReportDataset.for_period(user, start_date, end_date, categories)
+    summary = dataset.summary
+
+    # Создание workbook без хранения ячеек в памяти
+    wb = openpyxl.Workbook(write_only=True)
 
     # === Лист с детальными данными ===
-    ws_data = wb.active
-    ws_data.title = "Детальные данные"
-
-    # Заголовки
-    headers = ['Дата', 'Тип', 'Категория', 'Сумма', 'Описание']
-    for col, header in enumerate(headers, 1):
-        cell = ws_data.cell(row=1, column=col, value=header)
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        cell.alignment = Alignment(horizontal='center')
-
-    # Данные транзакций
-    for row, transaction in enumerate(transactions, 2):
-        ws_data.cell(row=row, column=1, value=transaction.date.strftime('%d.%m.%Y'))
-        ws_data.cell(row=row, column=2, value='Доход' if transaction.type == 'income' else 'Расход')
-        ws_data.cell(row=row, column=3, value=transaction.category.name)
-        ws_data.cell(row=row, column=4, value=float(transaction.amount))  # Конвертируем Decimal в float
-        ws_data.cell(row=row, column=5, value=transaction.description or '')
-
-    # Автоширина колонок
-    for column in ws_data.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws_data.column_dimensions[column_letter].width = adjusted_width
+    ws_data = wb.create_sheet("Детальные данные")
+    _write_details(ws_data, track_progress(dataset.rows(), summary.total_count, progress))
 
     # === Лист со сводкой ===
     ws_summary = wb.create_sheet("Сводка")
 
-    # Основные показатели - КОНВЕРТИРУЕМ Decimal в float
-    total_income_result = transactions.filter(type='income').aggregate(Sum('amount'))['amount__sum']
-    total_income = float(total_income_result) if total_income_result else 0.0
-
-    total_expense_result = transactions.filter(type='expense').aggregate(Sum('amount'))['amount__sum']
-    total_expense = float(total_expense_result) if total_expense_result else 0.0
-
+    total_income = float(summary.income)
+    total_expense = float(summary.expense)
     balance = total_income - total_expense
+    opening_balance = float(dataset.opening_balance)
+    closing_balance = float(dataset.closing_balance)
 
     summary_data = [
         ['Показатель', 'Значение'],
         ['Период отчета', f"{start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}"],
-        ['Общее количество операций', len(transactions)],
-        ['Количество доходов', transactions.filter(type='income').count()],
-        ['Количество расходов', transactions.filter(type='expense').count()],
+        ['Общее количество операций', summary.total_count],
+        ['Количество доходов', summary.income_count],
+        ['Количество расходов', summary.expense_count],
         ['Общие доходы', f"{total_income:.2f} руб."],
         ['Общие расходы', f"{total_expense:.2f} руб."],
         ['Баланс', f"{balance:.2f} руб."],
+        ['Остаток на начало периода', f"{opening_balance:.2f} руб."],
+        ['Остаток на конец периода', f"{closing_balance:.2f} руб."],
     ]
 
-    for row, (label, value) in enumerate(summary_data, 1):
-        ws_summary.cell(row=row, column=1, value=label).font = Font(bold=True)
-        ws_summary.cell(row=row, column=2, value=value)
+    for label, value in summary_data:
+        ws_summary.append([_bold_cell(ws_summary, label), value])
 
     # === Лист с анализом по категориям ===
     ws_categories = wb.create_sheet("Анализ по категориям")
 
-    # Анализ расходов по категориям - КОНВЕРТИРУЕМ Decimal в float
-    expense_categories = {}
-    for transaction in transactions.filter(type='expense'):
-        cat_name = transaction.category.name
-        if cat_name not in expense_categories:
-            expense_categories[cat_name] = 0.0
-        expense_categories[cat_name] += float(transaction.amount)  # Конвертируем здесь
+    # Анализ расходов по категориям (уже посчитан в ReportDataset), по убыванию суммы
+    sorted_categories = [(name, float(amount)) for name, amount in summary.expense_by_category()]
 
-    # Сортируем по убыванию суммы
-    sorted_categories = sorted(expense_categories.items(), key=lambda x: x[1], reverse=True)
+    ws_categories.append([
+        _bold_cell(ws_categories, "Категория"),
+        _bold_cell(ws_categories, "Сумма расходов"),
+        _bold_cell(ws_categories, "Доля"),
+    ])
+    for category, amount in sorted_categories:
+        percentage = (amount / total_expense * 100) if total_expense > 0 else 0
+        ws_categories.append([category, amount, f"{percentage:.1f}%"])
 
-    ws_categories.cell(row=1, column=1, value="Категория").font = Font(bold=True)
-    ws_categories.cell(row=1, column=2, value="Сумма расходов").font = Font(bold=True)
-    ws_categories.cell(row=1, column=3, value="Доля").font = Font(bold=True)
+    # Круговая диаграмма - по тем же долям, что и в PDF: крупнейшие категории и "Прочее"
+    # (ReportDataset.expense_slices) в отдельном блоке под таблицей
+    if sorted_categories:
+        slices = dataset.expense_slices()
+        header_row = len(sorted_categories) + 3
+        ws_categories.append([])
+        ws_categories.append([
+            _bold_cell(ws_categories, "Для диаграммы"),
+            _bold_cell(ws_categories, "Сумма расходов"),
+        ])
+        for name, amount in slices:
+            ws_categories.append([name, float(amount)])
+        ws_categories.add_chart(_expense_pie(ws_categories, header_row, len(slices)), 'E2')
 
-    for row, (category, amount) in enumerate(sorted_categories, 2):
-        # ИСПРАВЛЕННАЯ СТРОКА: используем float значения
-        percentage = (amount / total_expense * 100) if total_expense > 0 else 0
-        ws_categories.cell(row=row, column=1, value=category)
-        ws_categories.cell(row=row, column=2, value=amount)
-        ws_categories.cell(row=row, column=3, value=f"{percentage:.1f}%")
-
-    # Убираем круговую диаграмму пока что (чтобы избежать ошибок)
-    # if sorted_categories:
-    #     pie_chart = PieChart()
-    #     labels = Reference(ws_categories, min_col=1, min_row=2, max_row=len(sorted_categories)+1)
-    #     data = Reference(ws_categories, min_col=2, min_row=1, max_row=len(sorted_categories)+1)
-    #     pie_chart.add_data(data, titles_from_data=True)
-    #     pie_chart.set_categories(labels)
-    #     pie_chart.title = "Расходы по категориям"
-    #     ws_categories.add_chart(pie_chart, "E2")
-
-    # Сохранение в buffer
-    buffer = io.BytesIO()
-    wb.save(buffer)
+    # === Лист с динамикой доходов и расходов ===
+    ws_trend = wb.create_sheet("Динамика")
+    _write_trend(ws_trend, dataset.series())
+
+    wb.save(fileobj)
+    return fileobj
+
+
+def generate_excel_report(user, start_date, end_date, categories=None, progress=None, dataset=None):
+    """Генерация Excel отчета в памяти (BytesIO)"""
+    buffer = write_excel_report(user, start_date, end_date, io.BytesIO(), categories=categories,
+                                progress=progress, dataset=dataset)
     buffer.seek(0)
+    return buffer
+
+
+def excel_report_file(user, start_date, end_date, categories=None, progress=None, dataset=None):
+    """
+    Excel-отчёт во временном файле (удаляется при закрытии) - для FileResponse,
+    который отдаёт его клиенту порциями.
+    """
+    report_file = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        write_excel_report(user, start_date, end_date, report_file, categories=categories,
+                           progress=progress, dataset=dataset)
+    except Exception:
+        report_file.close()
+        raise
+    report_file.seek(0)
+    return report_file
+
+
+COMPARISON_HEADERS = ['Текущий', 'Предыдущий', 'Изменение', 'Изменение, %', 'Год назад', 'Изменение', 'Изменение, %']
+
+
+def _amount_cell(ws, value, number_format='0.00'):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.number_format = number_format
+    return cell
+
+
+def _write_comparison(ws, rows, first_header):
+    """Строки ComparisonRow: суммы за три периода и изменения (в процентах - доля, формат 0.0%)."""
+    ws.column_dimensions['A'].width = 25
+    for index in range(2, len(COMPARISON_HEADERS) + 2):
+        ws.column_dimensions[get_column_letter(index)].width = 14
+    ws.append([_header_cell(ws, header) for header in [first_header, *COMPARISON_HEADERS]])
+    for row in rows:
+        changes = [row.change_previous, row.change_year_ago]
+        ws.append([
+            str(row.label),
+            _amount_cell(ws, row.current),
+            _amount_cell(ws, row.previous),
+            _amount_cell(ws, row.delta_previous),
+            _amount_cell(ws, changes[0] / 100 if changes[0] is not None else None, '0.0%'),
+            _amount_cell(ws, row.year_ago),
+            _amount_cell(ws, row.delta_year_ago),
+            _amount_cell(ws, changes[1] / 100 if changes[1] is not None else None, '0.0%'),
+        ])
+
+
+def write_comparison_excel(user, start_date, end_date, fileobj, categories=None, comparison=None):
+    """
+    Пишет Excel со сравнением периода с предыдущим и с тем же периодом год назад.
+    comparison - уже посчитанный PeriodComparison (иначе считается здесь).
+    """
+    if comparison is None:
+        comparison = PeriodComparison.for_period(user, start_date, end_date, categories=categories)
+
+    wb = openpyxl.Workbook(write_only=True)
+
+    # === Итоги ===
+    ws_totals = wb.create_sheet("Итоги")
+    income, expense = comparison.total('income'), comparison.total('expense')
+    income.label, expense.label = 'Доходы', 'Расходы'
+    balance = ComparisonRow('Баланс', *(getattr(income, name) - getattr(expense, name) for name in PERIODS))
+    _write_comparison(ws_totals, [income, expense, balance], 'Показатель')
+    ws_totals.append([])
+    for name in comparison.periods:
+        ws_totals.append([_bold_cell(ws_totals, PERIOD_LABELS[name]), comparison.period_label(name)])
+
+    # === По категориям и интервалам ===
+    _write_comparison(wb.create_sheet("Расходы по категориям"), comparison.by_category('expense'), 'Категория')
+    _write_comparison(wb.create_sheet("Доходы по категориям"), comparison.by_category('income'), 'Категория')
+    _write_comparison(wb.create_sheet("Расходы по интервалам"), comparison.by_bucket('expense'), 'Интервал')
+    _write_comparison(wb.create_sheet("Доходы по интервалам"), comparison.by_bucket('income'), 'Интервал')
+
+    wb.save(fileobj)
+    return fileobj
+
 
-    return buffer
\ No newline at end of file
+def comparison_excel_file(user, start_date, end_date, categories=None, comparison=None):
+    """Excel со сравнением периодов во временном файле (удаляется при закрытии)."""
+    report_file = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        write_comparison_excel(user, start_date, end_date, report_file, categories=categories, comparison=comparison)
+    except Exception:
+        report_file.close()
+        raise
+    report_file.seek(0)
+    return report_file
@@ -1,40 +1,250 @@
-# finance/reports/pdf_report.py - ИСПРАВЛЕННАЯ ВЕРСИЯ
+# finance/reports/pdf_report.py
+"""
+PDF-отчёт (reportlab).
+
+Шрифт и стили создаются один раз на процесс (get_styles). Детальные данные
+выводятся серией таблиц по DETAIL_CHUNK_ROWS строк: reportlab не раскладывает
+одну огромную таблицу, а таблицы создаются по мере вёрстки страниц
+(StreamingDocTemplate). Операции и итоги - из ReportDataset (компактные колонки),
+поэтому в памяти нет ни экземпляров моделей, ни свёрстанных таблиц.
+
+- по умолчанию в отчёт попадают первые DETAIL_PREVIEW_ROWS операций;
+- full_detail=True - все операции за период.
+
+Диаграммы - векторные рисунки reportlab.graphics по уже свёрнутым рядам
+ReportDataset (категории, доходы/расходы по интервалам), без растровых
+картинок matplotlib: время и размер не зависят от числа операций.
+
+write_comparison_pdf() - сравнение периода с предыдущим и с годом ранее
+(finance.comparison): только таблицы по уже свёрнутым суммам.
+"""
+import io
+import os
+import tempfile
+from functools import lru_cache
+from itertools import chain, islice
+
+from django.conf import settings
+from django.utils import timezone
+from reportlab.graphics.charts.legends import Legend
+from reportlab.graphics.charts.linecharts import HorizontalLineChart
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from django.http import HttpResponse
-from django.utils import timezone
-from django.db.models import Sum
-import io
 
+from ..comparison import PERIOD_LABELS, PERIODS, ComparisonRow, PeriodComparison
+from .dataset import ReportDataset
+from .progress import track_progress
+
+MAIN_FONT = 'DejaVuSans'
+DETAIL_HEADERS = ['Дата', 'Тип', 'Категория', 'Сумма', 'Описание']
+DETAIL_PREVIEW_ROWS = 50
+# Строк в одной таблице детальных данных - примерно одна страница A4
+DETAIL_CHUNK_ROWS = 50
+# Фиксированные ширины колонок (в пунктах, сумма - ширина страницы без полей),
+# чтобы таблицы-порции совпадали по колонкам и не измеряли содержимое
+DETAIL_COL_WIDTHS = [55, 45, 85, 60, 206]
+DESCRIPTION_MAX_CHARS = 55
+# Ширина диаграмм - как у таблицы детальных данных
+CHART_WIDTH = sum(DETAIL_COL_WIDTHS)
+CHART_COLORS = [colors.HexColor(color) for color in (
+    '#4472C4', '#ED7D31', '#A5A5A5', '#FFC000', '#5B9BD5', '#70AD47', '#264478', '#9E480E',
+)]
+INCOME_COLOR = colors.HexColor('#70AD47')
+EXPENSE_COLOR = colors.HexColor('#C00000')
+# Подписей по оси X не больше стольких - остальные пропускаются
+TREND_MAX_LABELS = 12
+
+CATEGORY_TABLE_STYLE = TableStyle([
+    # Заголовок таблицы
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), MAIN_FONT),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+
+    # Данные таблицы - ВАЖНО: явно задаем цвета
+    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F2F2F2')),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),  # Черный текст для данных
+    ('FONTNAME', (0, 1), (-1, -1), MAIN_FONT),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+
+    # Общие стили
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+DETAIL_TABLE_STYLE = TableStyle([
+    # Заголовок таблицы
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), MAIN_FONT),
+    ('FONTSIZE', (0, 0), (-1, 0), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+
+    # Данные таблицы - ВАЖНО: явно задаем цвета
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),  # Черный текст для данных
+    ('FONTNAME', (0, 1), (-1, -1), MAIN_FONT),
+    ('FONTSIZE', (0, 1), (-1, -1), 7),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F8F8F8')]),
+
+    # Общие стили
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+])
+
+
+@lru_cache(maxsize=None)
+def get_styles():
+    """Регистрирует шрифт с кириллицей и собирает стили абзацев - один раз на процесс."""
+    if MAIN_FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(MAIN_FONT, os.path.join(settings.BASE_DIR, 'DejaVuSans.ttf')))
 
-def generate_pdf_report(user, start_date, end_date, categories=None):
-    """Генерация PDF отчета с графиками"""
-    from finance.models import Transaction
+    styles = getSampleStyleSheet()
+    for name in ('Normal', 'Heading1', 'Heading2', 'Heading3'):
+        styles[name].fontName = MAIN_FONT
+    return styles
 
-    # Регистрируем шрифт
-    pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
-    main_font = 'DejaVuSans'
 
-    # Получаем транзакции
-    transactions = Transaction.objects.filter(
-        user=user,
-        date__gte=start_date,
-        date__lte=end_date
-    ).order_by('date')
+class StreamingDocTemplate(SimpleDocTemplate):
+    """
+    SimpleDocTemplate, который дочитывает flowables из генератора по ходу
+    вёрстки (build_stream): в памяти только ближайшие LOOKAHEAD элементов, а не
+    весь документ. Список для build обычный; пополняется он в handle_flowable
+    до и после обработки элемента, так что не опустеет, пока генератор не исчерпан
+    (служебные списки reportlab, например _hanging, не трогаем).
+    """
+    # Запас впереди: reportlab заглядывает вперёд для keepWithNext
+    LOOKAHEAD = 16
+
+    def build_stream(self, head, tail):
+        """Вёрстка head (список), затем элементов генератора tail."""
+        self._tail = iter(tail)
+        self._stream = flowables = list(head)
+        self._fill(flowables)
+        self.build(flowables)
+
+    def _fill(self, flowables):
+        tail = getattr(self, '_tail', None)
+        if flowables is not getattr(self, '_stream', None):
+            return
+        while tail is not None and len(flowables) < self.LOOKAHEAD:
+            try:
+                flowables.append(next(tail))
+            except StopIteration:
+                self._tail = tail = None
+
+    def handle_flowable(self, flowables):
+        self._fill(flowables)
+        super().handle_flowable(flowables)
+        self._fill(flowables)
+
+
+def expense_pie(slices, total_expense):
+    """Круговая диаграмма расходов: slices - [(категория, сумма)], см. ReportDataset.expense_slices."""
+    drawing = Drawing(CHART_WIDTH, 170)
+
+    pie = Pie()
+    pie.x, pie.y, pie.width, pie.height = 10, 10, 150, 150
+    pie.data = [float(amount) for _name, amount in slices]
+    pie.slices.strokeColor = colors.white
+    for index in range(len(slices)):
+        pie.slices[index].fillColor = CHART_COLORS[index % len(CHART_COLORS)]
+    drawing.add(pie)
+
+    legend = Legend()
+    legend.x, legend.y = 190, 150
+    legend.fontName, legend.fontSize = MAIN_FONT, 8
+    legend.alignment = 'right'
+    legend.colorNamePairs = [
+        (CHART_COLORS[index % len(CHART_COLORS)], f"{name} - {float(amount) / total_expense * 100:.1f}%")
+        for index, (name, amount) in enumerate(slices)
+    ]
+    drawing.add(legend)
+    return drawing
+
+
+def trend_chart(series):
+    """Линейная диаграмма доходов и расходов по интервалам (analytics.Series)."""
+    drawing = Drawing(CHART_WIDTH, 200)
+
+    chart = HorizontalLineChart()
+    chart.x, chart.y, chart.width, chart.height = 45, 45, CHART_WIDTH - 55, 130
+    chart.data = [series.get('income'), series.get('expense')]
+    chart.lines[0].strokeColor = INCOME_COLOR
+    chart.lines[1].strokeColor = EXPENSE_COLOR
+    chart.lines.strokeWidth = 1.5
+
+    labels = series.labels()
+    step = max(1, -(-len(labels) // TREND_MAX_LABELS))
+    chart.categoryAxis.categoryNames = [label if index % step == 0 else '' for index, label in enumerate(labels)]
+    chart.categoryAxis.labels.fontName = MAIN_FONT
+    chart.categoryAxis.labels.fontSize = 7
+    chart.categoryAxis.labels.angle = 45
+    chart.categoryAxis.labels.boxAnchor = 'ne'
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontName = MAIN_FONT
+    chart.valueAxis.labels.fontSize = 7
+    drawing.add(chart)
+
+    legend = Legend()
+    legend.x, legend.y = 45, 195
+    legend.fontName, legend.fontSize = MAIN_FONT, 8
+    legend.alignment = 'right'
+    legend.columnMaximum = 1
+    legend.colorNamePairs = [(INCOME_COLOR, 'Доходы'), (EXPENSE_COLOR, 'Расходы')]
+    drawing.add(legend)
+    return drawing
+
+
+def _detail_row(row):
+    day, type, category, amount, description = row
+    description = description or '-'
+    if len(description) > DESCRIPTION_MAX_CHARS:
+        description = description[:DESCRIPTION_MAX_CHARS - 1] + '…'
+    return [
+        day.strftime('%d.%m.%Y'),
+        'Доход' if type == 'income' else 'Расход',
+        category,
+        f"{amount:.2f}",
+        description,
+    ]
+
+
+def detail_tables(rows, chunk_rows=DETAIL_CHUNK_ROWS):
+    """Таблицы детальных данных по chunk_rows строк (ReportDataset.rows()), каждая со своим заголовком."""
+    rows = iter(rows)
+    while True:
+        table_rows = [_detail_row(row) for row in islice(rows, chunk_rows)]
+        if not table_rows:
+            return
+        table = Table([DETAIL_HEADERS] + table_rows, colWidths=DETAIL_COL_WIDTHS, repeatRows=1)
+        table.setStyle(DETAIL_TABLE_STYLE)
+        yield table
+
+
+def write_pdf_report(user, start_date, end_date, fileobj, categories=None, full_detail=False, progress=None,
+                     dataset=None):
+    """
+    Пишет PDF-отчёт за период в fileobj (файл или BytesIO).
+    progress(done, total) - необязательный callback по ходу вёрстки детальных данных;
+    dataset - уже загруженный ReportDataset (иначе загружается здесь).
+    """
+    styles = get_styles()
 
-    if categories:
-        transactions = transactions.filter(category__name__in=categories)
+    # Операции, итоги и остатки - ReportDataset (один запрос к операциям + архив)
+    if dataset is None:
+        dataset = ReportDataset.for_period(user, start_date, end_date, categories)
+    summary_data = dataset.summary
 
-    # Создание PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
+    doc = StreamingDocTemplate(
+        fileobj,
         pagesize=A4,
         rightMargin=72,
         leftMargin=72,
@@ -45,12 +255,6 @@ def generate_pdf_report(user, start_date, end_date, categories=None):
     )
     elements = []
 
-    styles = getSampleStyleSheet()
-    styles['Normal'].fontName = main_font
-    styles['Heading1'].fontName = main_font
-    styles['Heading2'].fontName = main_font
-    styles['Heading3'].fontName = main_font
-
     # === ЗАГОЛОВОК ===
     title = Paragraph(f"Финансовый отчет", styles['Heading1'])
     elements.append(title)
@@ -62,22 +266,23 @@ def generate_pdf_report(user, start_date, end_date, categories=None):
     elements.append(Spacer(1, 0.25 * inch))
 
     # === СВОДНАЯ ИНФОРМАЦИЯ ===
-    total_income_result = transactions.filter(type='income').aggregate(Sum('amount'))['amount__sum']
-    total_income = float(total_income_result) if total_income_result else 0.0
-
-    total_expense_result = transactions.filter(type='expense').aggregate(Sum('amount'))['amount__sum']
-    total_expense = float(total_expense_result) if total_expense_result else 0.0
-
+    # Все показатели и разбивка по категориям посчитаны в ReportDataset за один проход
+    total_income = float(summary_data.income)
+    total_expense = float(summary_data.expense)
     balance = total_income - total_expense
+    opening_balance = float(dataset.opening_balance)
+    closing_balance = float(dataset.closing_balance)
 
     summary_text = f"""
     <b>Сводная информация:</b><br/>
-    • Общее количество операций: <b>{len(transactions)}</b><br/>
+    • Общее количество операций: <b>{summary_data.total_count}</b><br/>
     • Доходы: <b>{total_income:.2f} руб.</b><br/>
     • Расходы: <b>{total_expense:.2f} руб.</b><br/>
     • Баланс: <b>{balance:.2f} руб.</b><br/>
-    • Доходов: {transactions.filter(type='income').count()}<br/>
-    • Расходов: {transactions.filter(type='expense').count()}<br/>
+    • Остаток на начало периода: <b>{opening_balance:.2f} руб.</b><br/>
+    • Остаток на конец периода: <b>{closing_balance:.2f} руб.</b><br/>
+    • Доходов: {summary_data.income_count}<br/>
+    • Расходов: {summary_data.expense_count}<br/>
     """
     summary = Paragraph(summary_text, styles['Normal'])
     elements.append(summary)
@@ -85,15 +290,9 @@ def generate_pdf_report(user, start_date, end_date, categories=None):
     elements.append(Spacer(1, 0.3 * inch))
 
     # === АНАЛИЗ ПО КАТЕГОРИЯМ ===
-    if transactions.filter(type='expense').exists():
-        expense_categories = {}
-        for transaction in transactions.filter(type='expense'):
-            cat_name = transaction.category.name
-            if cat_name not in expense_categories:
-                expense_categories[cat_name] = 0.0
-            expense_categories[cat_name] += float(transaction.amount)
-
-        sorted_categories = sorted(expense_categories.items(), key=lambda x: x[1], reverse=True)
+    # Разбивка по категориям уже посчитана в ReportDataset
+    sorted_categories = [(name, float(amount)) for name, amount in summary_data.expense_by_category()]
+    if sorted_categories:
 
         cat_title = Paragraph("<b>Расходы по категориям:</b>", styles['Heading3'])
         elements.append(cat_title)
@@ -104,80 +303,158 @@ def generate_pdf_report(user, start_date, end_date, categories=None):
             cat_data.append([category, f"{amount:.2f} руб.", f"{percentage:.1f}%"])
 
         cat_table = Table(cat_data)
-        cat_table.setStyle(TableStyle([
-            # Заголовок таблицы
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('FONTNAME', (0, 0), (-1, 0), main_font),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-
-            # Данные таблицы - ВАЖНО: явно задаем цвета
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F2F2F2')),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),  # Черный текст для данных
-            ('FONTNAME', (0, 1), (-1, -1), main_font),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-
-            # Общие стили
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
+        cat_table.setStyle(CATEGORY_TABLE_STYLE)
 
         elements.append(cat_table)
+        elements.append(Spacer(1, 0.2 * inch))
+        elements.append(expense_pie(dataset.expense_slices(), total_expense))
+        elements.append(Spacer(1, 0.3 * inch))
+
+    # === ДИНАМИКА ===
+    if summary_data.total_count:
+        trend_title = Paragraph("<b>Доходы и расходы по периодам:</b>", styles['Heading3'])
+        elements.append(trend_title)
+        elements.append(trend_chart(dataset.series()))
         elements.append(Spacer(1, 0.3 * inch))
 
     # === ДЕТАЛЬНЫЕ ДАННЫЕ ===
-    if transactions.exists():
+    details = []
+    if summary_data.total_count:
         details_title = Paragraph("<b>Детальные данные:</b>", styles['Heading3'])
         elements.append(details_title)
 
-        display_transactions = transactions[:50]
-
-        data = [['Дата', 'Тип', 'Категория', 'Сумма', 'Описание']]
-        for transaction in display_transactions:
-            data.append([
-                transaction.date.strftime('%d.%m.%Y'),
-                'Доход' if transaction.type == 'income' else 'Расход',
-                transaction.category.name,
-                f"{float(transaction.amount):.2f}",
-                transaction.description or '-'
-            ])
-
-        if len(transactions) > 50:
-            data.append(['...', f"и еще {len(transactions) - 50} операций", '', '', ''])
-
-        table = Table(data, repeatRows=1)
-        table.setStyle(TableStyle([
-            # Заголовок таблицы
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('FONTNAME', (0, 0), (-1, 0), main_font),
-            ('FONTSIZE', (0, 0), (-1, 0), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-
-            # Данные таблицы - ВАЖНО: явно задаем цвета
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),  # Черный текст для данных
-            ('FONTNAME', (0, 1), (-1, -1), main_font),
-            ('FONTSIZE', (0, 1), (-1, -1), 7),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F8F8F8')]),
-
-            # Общие стили
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ]))
-
-        elements.append(table)
+        if full_detail:
+            details = detail_tables(track_progress(dataset.rows(), summary_data.total_count, progress))
+        else:
+            details = list(detail_tables(islice(dataset.rows(), DETAIL_PREVIEW_ROWS), DETAIL_PREVIEW_ROWS))
+            if summary_data.total_count > DETAIL_PREVIEW_ROWS:
+                more = summary_data.total_count - DETAIL_PREVIEW_ROWS
+                details.append(Paragraph(f"... и еще {more} операций", styles['Normal']))
     else:
         no_data = Paragraph("<b>Нет данных для отображения</b>", styles['Normal'])
         elements.append(no_data)
 
     # === ФУТЕР ===
-    elements.append(Spacer(1, 0.2 * inch))
-    footer = Paragraph(f"<i>Отчет сгенерирован: {timezone.now().strftime('%d.%m.%Y %H:%M')}</i>", styles['Normal'])
-    elements.append(footer)
+    footer = [
+        Spacer(1, 0.2 * inch),
+        Paragraph(f"<i>Отчет сгенерирован: {timezone.now().strftime('%d.%m.%Y %H:%M')}</i>", styles['Normal']),
+    ]
 
-    # Генерация PDF
-    doc.build(elements)
+    # Генерация PDF: таблицы детальных данных создаются по ходу вёрстки
+    doc.build_stream(elements, chain(details, footer))
+    return fileobj
+
+
+def generate_pdf_report(user, start_date, end_date, categories=None, full_detail=False, progress=None,
+                        dataset=None):
+    """Генерация PDF отчета в памяти (BytesIO)"""
+    buffer = write_pdf_report(user, start_date, end_date, io.BytesIO(), categories=categories,
+                              full_detail=full_detail, progress=progress, dataset=dataset)
     buffer.seek(0)
+    return buffer
+
+
+def pdf_report_file(user, start_date, end_date, categories=None, full_detail=False, progress=None, dataset=None):
+    """PDF-отчёт во временном файле (удаляется при закрытии) - для FileResponse."""
+    report_file = tempfile.TemporaryFile(suffix='.pdf')
+    try:
+        write_pdf_report(user, start_date, end_date, report_file, categories=categories,
+                         full_detail=full_detail, progress=progress, dataset=dataset)
+    except Exception:
+        report_file.close()
+        raise
+    report_file.seek(0)
+    return report_file
+
+
+def _change(delta, percent):
+    """Изменение: сумма со знаком и процент, если база ненулевая."""
+    if percent is None:
+        return f"{delta:+.2f}"
+    return f"{delta:+.2f} ({percent:+.1f}%)"
+
+
+def comparison_table(rows, first_header):
+    """Таблица строк ComparisonRow: текущий, предыдущий, год назад и изменения."""
+    data = [[first_header, 'Текущий', 'Предыдущий', 'Изменение', 'Год назад', 'Изменение']]
+    for row in rows:
+        data.append([
+            str(row.label),
+            f"{row.current:.2f}",
+            f"{row.previous:.2f}",
+            _change(row.delta_previous, row.change_previous),
+            f"{row.year_ago:.2f}",
+            _change(row.delta_year_ago, row.change_year_ago),
+        ])
+    table = Table(data, colWidths=[101, 60, 60, 80, 60, 80], repeatRows=1)
+    table.setStyle(DETAIL_TABLE_STYLE)
+    return table
+
+
+def write_comparison_pdf(user, start_date, end_date, fileobj, categories=None, comparison=None):
+    """
+    Пишет PDF со сравнением периода с предыдущим и с тем же периодом год назад.
+    comparison - уже посчитанный PeriodComparison (иначе считается здесь).
+    """
+    styles = get_styles()
+    if comparison is None:
+        comparison = PeriodComparison.for_period(user, start_date, end_date, categories=categories)
 
-    return buffer
\ No newline at end of file
+    doc = SimpleDocTemplate(
+        fileobj,
+        pagesize=A4,
+        rightMargin=72,
+        leftMargin=72,
+        topMargin=72,
+        bottomMargin=18,
+        title=f"Сравнение периодов {start_date} - {end_date}",
+        encoding='utf-8'
+    )
+    elements = [Paragraph("Сравнение периодов", styles['Heading1'])]
+
+    periods_text = "<br/>".join(
+        f"• {PERIOD_LABELS[name]}: <b>{comparison.period_label(name)}</b>" for name in comparison.periods
+    )
+    elements.append(Paragraph(periods_text, styles['Normal']))
+    elements.append(Spacer(1, 0.25 * inch))
+
+    if comparison.is_empty():
+        elements.append(Paragraph("<b>Нет данных для отображения</b>", styles['Normal']))
+    else:
+        # === ИТОГИ ===
+        income, expense = comparison.total('income'), comparison.total('expense')
+        income.label, expense.label = 'Доходы', 'Расходы'
+        balance = ComparisonRow('Баланс', *(getattr(income, name) - getattr(expense, name) for name in PERIODS))
+        elements.append(Paragraph("<b>Итоги:</b>", styles['Heading3']))
+        elements.append(comparison_table([income, expense, balance], 'Показатель'))
+        elements.append(Spacer(1, 0.3 * inch))
+
+        # === ПО КАТЕГОРИЯМ ===
+        for type, title in (('expense', 'Расходы по категориям'), ('income', 'Доходы по категориям')):
+            rows = comparison.by_category(type)
+            if rows:
+                elements.append(Paragraph(f"<b>{title}:</b>", styles['Heading3']))
+                elements.append(comparison_table(rows, 'Категория'))
+                elements.append(Spacer(1, 0.3 * inch))
+
+        # === ПО ИНТЕРВАЛАМ ===
+        elements.append(Paragraph("<b>Расходы по интервалам:</b>", styles['Heading3']))
+        elements.append(comparison_table(comparison.by_bucket('expense'), 'Интервал'))
+
+    elements.append(Spacer(1, 0.2 * inch))
+    elements.append(Paragraph(f"<i>Отчет сгенерирован: {timezone.now().strftime('%d.%m.%Y %H:%M')}</i>", styles['Normal']))
+
+    doc.build(elements)
+    return fileobj
+
+
+def comparison_pdf_file(user, start_date, end_date, categories=None, comparison=None):
+    """PDF со сравнением периодов во временном файле (удаляется при закрытии)."""
+    report_file = tempfile.TemporaryFile(suffix='.pdf')
+    try:
+        write_comparison_pdf(user, start_date, end_date, report_file, categories=categories, comparison=comparison)
+    except Exception:
+        report_file.close()
+        raise
+    report_file.seek(0)
+    return report_file
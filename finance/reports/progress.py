@@ -0,0 +1,17 @@
+# finance/reports/progress.py
+"""Прогресс построения отчёта: callback(done, total) по ходу чтения операций."""
+PROGRESS_EVERY_ROWS = 1000
+
+
+def track_progress(rows, total, callback, every=PROGRESS_EVERY_ROWS):
+    """Пропускает строки как есть и каждые every строк (и в конце) вызывает callback(done, total)."""
+    if callback is None:
+        yield from rows
+        return
+    done = 0
+    for row in rows:
+        yield row
+        done += 1
+        if done % every == 0:
+            callback(done, total)
+    callback(done, total)
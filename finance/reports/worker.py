@@ -0,0 +1,70 @@
+# finance/reports/worker.py
+"""
+Точки входа процессов пула отчётов (finance.report_jobs).
+
+Модуль не импортирует Django на верхнем уровне: при запуске процессов через
+spawn (Windows) он загружается в новом интерпретаторе до настройки Django.
+"""
+
+_progress_queue = None
+
+
+def init_worker(progress_queue=None):
+    """Старт процесса пула: свои соединения с БД и один раз - шрифт и стили reportlab."""
+    global _progress_queue
+    _progress_queue = progress_queue
+
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+    from django.db import connections
+    connections.close_all()
+
+    import openpyxl  # noqa: F401 - импорт один раз на процесс, а не в первом задании
+    from .pdf_report import get_styles
+    get_styles()
+
+
+def run_job(job_id):
+    from finance.report_jobs import ProgressReporter, run_job, write_progress
+
+    # Без очереди (SQLite без WAL, один процесс) прогресс пишется в БД отсюда же
+    send = _progress_queue.put if _progress_queue is not None else write_progress
+    return run_job(job_id, progress=ProgressReporter(job_id, send))
+
+
+def render_report(user_id, report_format, start_date, end_date):
+    """Отчёт пользователя за период для рассылки (finance.report_delivery): id записи SavedReport."""
+    from django.contrib.auth.models import User
+    from finance.report_cache import cached_report
+
+    report, _hit = cached_report(User.objects.get(pk=user_id), report_format, start_date, end_date)
+    return report.pk
+
+
+def render_dataset(report_format, dataset):
+    """
+    Отчёт по уже загруженному ReportDataset (архив за год, finance.report_bundle).
+    Файл остаётся на диске: возвращается его путь, удаляет файл вызывающий.
+    """
+    import os
+    import tempfile
+
+    extension = 'xlsx' if report_format == 'excel' else 'pdf'
+    with tempfile.NamedTemporaryFile(suffix=f'.{extension}', delete=False) as report_file:
+        try:
+            if report_format == 'excel':
+                from .excel_report import write_excel_report
+                write_excel_report(None, dataset.start_date, dataset.end_date, report_file, dataset=dataset)
+            else:
+                from .pdf_report import write_pdf_report
+                write_pdf_report(None, dataset.start_date, dataset.end_date, report_file,
+                                 full_detail=True, dataset=dataset)
+        except Exception:
+            report_file.close()
+            os.unlink(report_file.name)
+            raise
+    return report_file.name
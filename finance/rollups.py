@@ -0,0 +1,148 @@
+# finance/rollups.py
+"""
+Инкрементальные дневные сводки (DailySummary) по операциям пользователя.
+
+Каждое изменение Transaction превращается в "дельту" (сумма, количество)
+для ключа (пользователь, дата, тип, категория). Статистика бота и cron
+читает сводки (см. finance.summaries), поэтому её стоимость зависит от
+числа дней в периоде, а не от числа операций.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import DailySummary, Transaction
+
+
+def to_decimal(amount):
+    """Приводит сумму (Decimal, float, str) к Decimal с двумя знаками."""
+    if amount is None:
+        return Decimal('0.00')
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))
+    return amount.quantize(Decimal('0.01'))
+
+
+def apply_delta(user_id, date, type, category_id, amount, count):
+    """
+    Применяет изменение суммы и количества к дневной сводке.
+    Должна вызываться внутри транзакции БД вместе с изменением Transaction.
+    """
+    amount = to_decimal(amount)
+    if not amount and not count:
+        return
+
+    summary = DailySummary.objects.filter(
+        user_id=user_id, date=date, type=type, category_id=category_id
+    )
+    updated = summary.update(total=F('total') + amount, count=F('count') + count)
+
+    if not updated:
+        if count <= 0:
+            # Сводки нет (например, пользователь удаляется каскадно) - вычитать не из чего
+            return
+        try:
+            with transaction.atomic():
+                DailySummary.objects.create(
+                    user_id=user_id, date=date, type=type,
+                    category_id=category_id, total=amount, count=count
+                )
+        except IntegrityError:
+            # Строку только что создал другой процесс - обновляем её
+            summary.update(total=F('total') + amount, count=F('count') + count)
+    elif count < 0:
+        # Удаляем опустевшие строки, чтобы таблица не росла от удалённых операций
+        summary.filter(count__lte=0).delete()
+
+
+def apply_deltas(user_id, deltas):
+    """
+    Применяет много положительных дельт одного пользователя разом (массовый импорт):
+    deltas - {(date, type, category_id): (amount, count)}.
+    Существующие сводки обновляются одним bulk_update, новые создаются одним bulk_create.
+    """
+    if not deltas:
+        return
+    dates = {key[0] for key in deltas}
+    existing = {
+        (row.date, row.type, row.category_id): row
+        for row in DailySummary.objects.select_for_update().filter(
+            user_id=user_id, date__gte=min(dates), date__lte=max(dates)
+        )
+        if (row.date, row.type, row.category_id) in deltas
+    }
+
+    to_update, to_create = [], []
+    for key, (amount, count) in deltas.items():
+        row = existing.get(key)
+        if row is not None:
+            row.total = to_decimal(row.total + to_decimal(amount))
+            row.count += count
+            to_update.append(row)
+        else:
+            to_create.append(DailySummary(
+                user_id=user_id, date=key[0], type=key[1], category_id=key[2],
+                total=to_decimal(amount), count=count
+            ))
+
+    DailySummary.objects.bulk_update(to_update, ['total', 'count'], batch_size=500)
+    try:
+        with transaction.atomic():
+            DailySummary.objects.bulk_create(to_create, batch_size=500)
+    except IntegrityError:
+        # Часть строк параллельно создал другой процесс - досоздаём по одной
+        for row in to_create:
+            apply_delta(user_id, row.date, row.type, row.category_id, row.total, row.count)
+
+
+def rollup_key(values):
+    """Ключ сводки из словаря значений транзакции."""
+    return values['user_id'], values['date'], values['type'], values['category_id']
+
+
+def rebuild_rollups(user=None):
+    """
+    Полностью пересобирает дневные сводки по таблице Transaction и архиву
+    (для всех пользователей или для одного). Возвращает число строк сводки.
+    """
+    with transaction.atomic():
+        summaries = DailySummary.objects.all()
+        transactions = Transaction.objects.all()
+        if user is not None:
+            summaries = summaries.filter(user=user)
+            transactions = transactions.filter(user=user)
+        summaries.delete()
+
+        grouped = (
+            transactions
+            .order_by()
+            .values('user_id', 'date', 'type', 'category_id')
+            .annotate(total=Sum('amount'), count=Count('id'))
+        )
+
+        created = 0
+        batch = []
+        for row in grouped.iterator(chunk_size=2000):
+            batch.append(DailySummary(
+                user_id=row['user_id'], date=row['date'], type=row['type'],
+                category_id=row['category_id'], total=to_decimal(row['total']), count=row['count']
+            ))
+            if len(batch) >= 2000:
+                DailySummary.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            DailySummary.objects.bulk_create(batch)
+            created += len(batch)
+
+        # Архивных операций (finance.archive) в таблице нет, но в сводках они учитываются
+        from .archive import archived_rollup_deltas
+        archived = archived_rollup_deltas(user)
+        for user_id, deltas in archived:
+            apply_deltas(user_id, deltas)
+        if archived:
+            created = summaries.count()
+
+    return created
+
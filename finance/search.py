@@ -0,0 +1,246 @@
+# finance/search.py
+"""
+Полнотекстовый поиск по описаниям операций.
+
+- SQLite: виртуальная таблица FTS5 finance_transaction_fts (external content
+  поверх finance_transaction), синхронизируется триггерами - в том числе при
+  bulk_create импорта и удалении строк архивом через сырой SQL. Токенизатор
+  unicode61 + porter: английские слова приводятся к основе, русские ищутся
+  по префиксу ("кофе" находит "кофейня");
+- PostgreSQL: GIN-индекс по выражению to_tsvector('russian') || to_tsvector('english'),
+  поддерживается самой БД; на секционированной таблице он создаётся на
+  родителе (см. finance.partitioning);
+- остальные БД: icontains только по строкам пользователя за ограниченный
+  период (SEARCH_FALLBACK_DAYS) - без просмотра всей таблицы;
+- архив (finance.archive): перенесённых в файлы строк в индексе нет, их
+  описания просматриваются в файлах архива пользователя (search_archived).
+
+Результаты из таблицы упорядочены по релевантности (bm25 / ts_rank), затем
+от новых к старым; за ними идут архивные - от новых к старым. Страницы
+фиксированного размера отдаются без COUNT.
+"""
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connections, router
+
+from .archive import search_archived
+from .models import ArchiveShard, Transaction
+
+TABLE = 'finance_transaction'
+FTS_TABLE = 'finance_transaction_fts'
+PG_INDEX = 'fin_txn_description_search_idx'
+PG_VECTOR = (
+    "(to_tsvector('russian', COALESCE(description, '')) || "
+    "to_tsvector('english', COALESCE(description, '')))"
+)
+MAX_TERMS = 8
+
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        AFTER INSERT ON {TABLE} WHEN new.description IS NOT NULL BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description);
+        END""",
+    f'{FTS_TABLE}_ad': f"""
+        AFTER DELETE ON {TABLE} WHEN old.description IS NOT NULL BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description);
+        END""",
+    f'{FTS_TABLE}_au': f"""
+        AFTER UPDATE OF description ON {TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description)
+                SELECT 'delete', old.id, old.description WHERE old.description IS NOT NULL;
+            INSERT INTO {FTS_TABLE}(rowid, description)
+                SELECT new.id, new.description WHERE new.description IS NOT NULL;
+        END""",
+}
+
+
+@dataclass
+class SearchPage:
+    """Страница результатов поиска (номер с 1)."""
+    object_list: list
+    number: int = 1
+    has_next: bool = False
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+
+def parse_terms(query):
+    """Слова запроса в нижнем регистре (не больше MAX_TERMS); знаки и операторы отбрасываются."""
+    return re.findall(r'\w+', (query or '').lower())[:MAX_TERMS]
+
+
+def install(connection):
+    """
+    Создаёт поисковый индекс и (на SQLite) триггеры синхронизации, если их нет.
+    Безопасно вызывать повторно: после migrate (Django пересоздаёт таблицу
+    SQLite при изменении полей и теряет триггеры) и из rebuild_search_index.
+    """
+    created = not is_installed(connection)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"description, content='{TABLE}', content_rowid='id', "
+                f"tokenize='porter unicode61 remove_diacritics 2')"
+            )
+            for name, body in SQLITE_TRIGGERS.items():
+                cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+            if created:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {PG_INDEX} ON {TABLE} USING gin ({PG_VECTOR})')
+
+
+def is_installed(connection):
+    """Есть ли поисковый индекс в этой БД (миграция 0015 применена)."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            return cursor.fetchone() is not None
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [PG_INDEX])
+            return cursor.fetchone()[0]
+    return False
+
+
+def repair(connection):
+    """После migrate: возвращает триггеры FTS5, если индекс есть, а таблицу пересоздали без них."""
+    if connection.vendor == 'sqlite' and is_installed(connection):
+        with connection.cursor() as cursor:
+            for name, body in SQLITE_TRIGGERS.items():
+                cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {PG_INDEX}')
+
+
+def rebuild(connection):
+    """Полная пересборка индекса FTS5 из таблицы (на PostgreSQL индекс всегда актуален)."""
+    install(connection)
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _filters(alias, start_date, end_date, category_ids, type):
+    """Общие условия на строки finance_transaction (псевдоним alias) и их параметры."""
+    conditions, params = [], []
+    if start_date:
+        conditions.append(f'{alias}."date" >= %s')
+        params.append(start_date)
+    if end_date:
+        conditions.append(f'{alias}."date" <= %s')
+        params.append(end_date)
+    if category_ids is not None:
+        category_ids = [int(category_id) for category_id in category_ids] or [0]
+        conditions.append(f'{alias}.category_id IN ({", ".join(["%s"] * len(category_ids))})')
+        params.extend(category_ids)
+    if type:
+        conditions.append(f'{alias}.type = %s')
+        params.append(type)
+    return ''.join(f' AND {condition}' for condition in conditions), params
+
+
+def _sqlite_ids(cursor, user_id, terms, filters, limit, offset):
+    where, params = filters
+    # Каждое слово - отдельная фраза с префиксным поиском: "кофе"* AND "uber"*
+    match = ' AND '.join(f'"{term}"*' for term in terms)
+    cursor.execute(
+        f'SELECT t.id FROM {FTS_TABLE} JOIN {TABLE} t ON t.id = {FTS_TABLE}.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s AND t.user_id = %s{where} '
+        f'ORDER BY bm25({FTS_TABLE}), t."date" DESC, t.id DESC LIMIT %s OFFSET %s',
+        [match, user_id, *params, limit, offset],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _postgresql_ids(cursor, user_id, terms, filters, limit, offset):
+    where, params = filters
+    # Слово ищется по основе в обоих словарях и по префиксу: кофе:* & uber:*
+    tsquery = ' & '.join(f'{term}:*' for term in terms)
+    query = "(to_tsquery('russian', %s) || to_tsquery('english', %s))"
+    cursor.execute(
+        f'SELECT t.id FROM {TABLE} t '
+        f'WHERE t.user_id = %s AND {PG_VECTOR} @@ {query}{where} '
+        f'ORDER BY ts_rank({PG_VECTOR}, {query}) DESC, t."date" DESC, t.id DESC LIMIT %s OFFSET %s',
+        [user_id, tsquery, tsquery, *params, tsquery, tsquery, limit, offset],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_ids(using, user_id, terms, start_date, end_date, category_ids, type, limit, offset):
+    """Без полнотекстового индекса: строки пользователя за ограниченный период (индекс user, date)."""
+    if start_date is None:
+        start_date = (end_date or date.today()) - timedelta(days=getattr(settings, 'SEARCH_FALLBACK_DAYS', 365))
+    queryset = Transaction.objects.using(using).filter(user_id=user_id, date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+    if category_ids is not None:
+        queryset = queryset.filter(category_id__in=category_ids)
+    if type:
+        queryset = queryset.filter(type=type)
+    for term in terms:
+        queryset = queryset.filter(description__icontains=term)
+    return list(queryset.order_by('-date', '-id').values_list('id', flat=True)[offset:offset + limit])
+
+
+def search_transactions(user, query, page=1, page_size=None, start_date=None, end_date=None,
+                        category_ids=None, type=None):
+    """
+    Операции пользователя, описание которых содержит все слова запроса.
+    Возвращает SearchPage с объектами Transaction (категории подгружены).
+    """
+    terms = parse_terms(query)
+    page = max(1, int(page or 1))
+    page_size = page_size or getattr(settings, 'SEARCH_PAGE_SIZE', 20)
+    if not terms:
+        return SearchPage(object_list=[], number=page)
+
+    user_id = getattr(user, 'pk', user)
+    using = router.db_for_read(Transaction)
+    connection = connections[using]
+
+    def table_ids(limit, offset):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                return _sqlite_ids(cursor, user_id, terms, _filters('t', start_date, end_date, category_ids, type),
+                                   limit, offset)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                return _postgresql_ids(cursor, user_id, terms, _filters('t', start_date, end_date, category_ids, type),
+                                       limit, offset)
+        return _fallback_ids(using, user_id, terms, start_date, end_date, category_ids, type, limit, offset)
+
+    # Лишняя строка - признак следующей страницы, без COUNT
+    limit, offset = page_size + 1, (page - 1) * page_size
+    ids = table_ids(limit, offset)
+
+    archived = []
+    if len(ids) < limit and ArchiveShard.objects.using(using).filter(user_id=user_id).exists():
+        # Найденное в таблице кончилось - дальше архив. Сколько строк таблицы было
+        # на предыдущих страницах, известно без COUNT, если на этой что-то нашлось
+        found = offset + len(ids) if ids or not offset else len(table_ids(offset, 0))
+        skip = max(0, offset - found)
+        archived = search_archived(user_id, terms, start_date, end_date, category_ids, type)
+        archived = archived[skip:skip + limit - len(ids)]
+
+    has_next = len(ids) + len(archived) > page_size
+    objects = Transaction.objects.using(using).select_related('category').in_bulk(ids[:page_size])
+    object_list = [objects[pk] for pk in ids[:page_size] if pk in objects] + archived
+    return SearchPage(
+        object_list=object_list[:page_size],
+        number=page,
+        has_next=has_next,
+    )
@@ -0,0 +1,113 @@
+# finance/signals.py
+"""
+Обработчики сигналов Transaction: поддерживают дневные сводки, остатки и колоночный кэш в актуальном состоянии.
+Удаление пользователя: его колонки убираются из колоночного кэша.
+Обработчики сигналов Category: обновляют версию справочника категорий.
+Обработчики сигналов ArchiveShard и SavedReport: удаляют файл вместе с записью.
+После migrate: восстанавливаются триггеры поискового индекса (finance.search).
+Подключаются в FinanceConfig.ready().
+"""
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from .categories import VERSION_KEY as CATEGORY_VERSION_KEY, category_registry
+from .columnar import transaction_changed, user_deleted
+from .db_router import pin_primary
+from .ledger import apply_balance_delta, signed_amount
+from .models import ArchiveShard, Category, SavedReport, Transaction
+from .rollups import apply_delta, rollup_key, to_decimal
+from .search import repair as repair_search_index
+from .versions import bump_version
+
+ROLLUP_FIELDS = ('user_id', 'date', 'type', 'category_id', 'amount')
+
+
+def _values(instance):
+    values = {field: getattr(instance, field) for field in ROLLUP_FIELDS}
+    values['amount'] = to_decimal(values['amount'])  # бот передаёт float
+    # DateField принимает и строку 'ГГГГ-ММ-ДД' - сводкам и колоночному кэшу нужна дата
+    values['date'] = Transaction._meta.get_field('date').to_python(values['date'])
+    return values
+
+
+def _signed(values):
+    return signed_amount(values['type'], values['amount'])
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_values(sender, instance, **kwargs):
+    """Запоминаем значения до изменения, чтобы вычесть их из старой сводки."""
+    instance._rollup_previous = None
+    if instance.pk:
+        previous = Transaction.objects.filter(pk=instance.pk).values(*ROLLUP_FIELDS).first()
+        if previous is not None:
+            previous['amount'] = to_decimal(previous['amount'])
+        instance._rollup_previous = previous
+
+
+@receiver(post_save, sender=Transaction)
+def update_rollups_on_save(sender, instance, created, **kwargs):
+    current = _values(instance)
+    previous = getattr(instance, '_rollup_previous', None)
+
+    if previous is None:
+        apply_delta(*rollup_key(current), current['amount'], 1)
+        apply_balance_delta(current['user_id'], current['date'], _signed(current))
+    elif rollup_key(previous) == rollup_key(current):
+        # Ключ не изменился - достаточно одной поправки суммы
+        apply_delta(*rollup_key(current), current['amount'] - previous['amount'], 0)
+        apply_balance_delta(current['user_id'], current['date'], _signed(current) - _signed(previous))
+    else:
+        apply_delta(*rollup_key(previous), -previous['amount'], -1)
+        apply_delta(*rollup_key(current), current['amount'], 1)
+        apply_balance_delta(previous['user_id'], previous['date'], -_signed(previous))
+        apply_balance_delta(current['user_id'], current['date'], _signed(current))
+
+    transaction_changed(instance.pk, previous, current)
+    instance._rollup_previous = None
+    # Пользователь только что записал - его чтения пока идут в основную БД
+    pin_primary(instance.user_id)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    values = _values(instance)
+    apply_delta(*rollup_key(values), -values['amount'], -1)
+    # При удалении пользователя его остатки удаляются каскадно - пересчитывать нечего
+    origin = kwargs.get('origin')
+    if origin is None or getattr(origin, 'model', type(origin)) is Transaction:
+        apply_balance_delta(values['user_id'], values['date'], -_signed(values))
+        transaction_changed(instance.pk, previous=values)
+    pin_primary(values['user_id'])
+
+
+@receiver(post_delete, sender=User)
+def forget_user_columns(sender, instance, **kwargs):
+    """Операции удалены каскадно, без transaction_changed - колонки пользователя больше не нужны."""
+    user_deleted(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    """Категория изменилась: новая версия справочника для всех процессов (веб, бот, cron)."""
+    bump_version(CATEGORY_VERSION_KEY)
+    category_registry.invalidate()
+
+
+@receiver(post_delete, sender=ArchiveShard)
+@receiver(post_delete, sender=SavedReport)
+def remove_stored_file(sender, instance, using, **kwargs):
+    """Файл удаляется только после фиксации транзакции - при откате архив (отчёт) остаётся целым."""
+    name = instance.file.name
+    if name:
+        transaction.on_commit(lambda: instance.file.storage.delete(name), using=using)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    """SQLite пересоздаёт таблицу при изменении полей - вместе с ней пропадают триггеры FTS5."""
+    if sender.name == 'finance':
+        repair_search_index(connections[using])
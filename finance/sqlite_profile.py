@@ -0,0 +1,73 @@
+# finance/sqlite_profile.py
+"""
+Профиль SQLite для небольших установок, где бот, веб и cron пишут в один файл.
+
+- WAL: читатели не блокируют писателя и наоборот;
+- synchronous=NORMAL, кэш страниц и mmap - меньше fsync и чтений с диска;
+- timeout (busy timeout) - ожидание блокировки вместо мгновенной ошибки;
+- transaction_mode IMMEDIATE - блок atomic() сразу берёт блокировку записи,
+  поэтому не бывает взаимоблокировки при повышении блокировки чтения до записи;
+- повтор записи (retry_write) с ограниченной экспоненциальной задержкой,
+  если база всё-таки занята дольше таймаута.
+
+Профиль включается в настройках (SQLITE_PROFILE=wal), по умолчанию SQLite
+работает как раньше.
+"""
+import random
+import time
+
+from django.db import OperationalError, connections
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,        # ~20 МБ кэша страниц на соединение
+    'mmap_size': 268435456,      # 256 МБ memory-mapped I/O
+    'temp_store': 'MEMORY',
+}
+
+DEFAULT_BUSY_TIMEOUT = 10  # секунд
+DEFAULT_RETRIES = {'attempts': 5, 'base_delay': 0.05, 'max_delay': 1.0}
+
+
+def sqlite_profile(database, busy_timeout=DEFAULT_BUSY_TIMEOUT, retries=None):
+    """Возвращает копию настроек БД (элемент DATABASES) с включённым профилем."""
+    database = dict(database)
+    options = dict(database.get('OPTIONS', {}))
+    options['init_command'] = ';'.join(f'PRAGMA {name}={value}' for name, value in PRAGMAS.items())
+    options['timeout'] = busy_timeout
+    options['transaction_mode'] = 'IMMEDIATE'
+    database['OPTIONS'] = options
+    database['WRITE_RETRIES'] = dict(retries or DEFAULT_RETRIES)
+    return database
+
+
+def is_locked_error(error):
+    message = str(error).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def retry_write(func, alias, *args, **kwargs):
+    """
+    Выполняет запись func(*args, **kwargs), повторяя её при "database is locked".
+    Повтор возможен только для самостоятельной транзакции: внутри внешнего
+    atomic() ошибка пробрасывается, чтобы повторили всю внешнюю транзакцию.
+    """
+    connection = connections[alias]
+    policy = connection.settings_dict.get('WRITE_RETRIES')
+    if not policy or connection.in_atomic_block:
+        return func(*args, **kwargs)
+
+    attempts = policy.get('attempts', DEFAULT_RETRIES['attempts'])
+    base_delay = policy.get('base_delay', DEFAULT_RETRIES['base_delay'])
+    max_delay = policy.get('max_delay', DEFAULT_RETRIES['max_delay'])
+    for attempt in range(1, attempts + 1):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as e:
+            if not is_locked_error(e) or attempt == attempts:
+                raise
+            # Экспоненциальная задержка со случайным разбросом, чтобы писатели не просыпались одновременно
+            delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
@@ -0,0 +1,114 @@
+# finance/summaries.py
+"""
+Сводка по операциям пользователя за период (PeriodSummary).
+
+Все показатели - суммы и количества доходов/расходов - считаются одним
+aggregate() с условными (filter=) агрегатами по дневным сводкам,
+разбивка по категориям - одним сгруппированным запросом.
+from_columns() считает то же по колоночному кэшу в памяти (finance.columnar).
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+
+from .categories import category_registry
+from .models import DailySummary
+from .money import from_minor
+
+ZERO = Decimal('0.00')
+
+
+@dataclass
+class PeriodSummary:
+    """Итоги за период: суммы и количества по типам и (опционально) по категориям."""
+    income: Decimal = ZERO
+    expense: Decimal = ZERO
+    income_count: int = 0
+    expense_count: int = 0
+    total_count: int = 0
+    # {название категории: {'income': Decimal, 'expense': Decimal}}
+    categories: dict = field(default_factory=dict)
+
+    @property
+    def balance(self):
+        return self.income - self.expense
+
+    def expense_by_category(self):
+        """Расходы по категориям, по убыванию суммы (только ненулевые)."""
+        items = [(name, values['expense']) for name, values in self.categories.items() if values['expense']]
+        return sorted(items, key=lambda item: item[1], reverse=True)
+
+    @classmethod
+    def for_period(cls, user, start_date=None, end_date=None, categories=None, category=None,
+                   with_categories=False):
+        """
+        Считает сводку за [start_date, end_date] (границы необязательны).
+
+        categories: список названий категорий для фильтра (как в отчётах)
+        category: одна категория (объект Category) - для /category
+        with_categories: дополнительно посчитать разбивку по категориям
+        """
+        summaries = DailySummary.objects.filter(user=user)
+        if start_date is not None:
+            summaries = summaries.filter(date__gte=start_date)
+        if end_date is not None:
+            summaries = summaries.filter(date__lte=end_date)
+        if categories:
+            summaries = summaries.filter(category_id__in=category_registry.ids_for_names(categories))
+        if category is not None:
+            summaries = summaries.filter(category=category)
+
+        income_q, expense_q = Q(type='income'), Q(type='expense')
+        totals = summaries.aggregate(
+            income=Sum('total', filter=income_q),
+            expense=Sum('total', filter=expense_q),
+            income_count=Sum('count', filter=income_q),
+            expense_count=Sum('count', filter=expense_q),
+            total_count=Sum('count'),
+        )
+
+        summary = cls(
+            income=totals['income'] or ZERO,
+            expense=totals['expense'] or ZERO,
+            income_count=totals['income_count'] or 0,
+            expense_count=totals['expense_count'] or 0,
+            total_count=totals['total_count'] or 0,
+        )
+
+        if with_categories and summary.total_count:
+            rows = (
+                summaries.order_by()
+                .values('category_id')
+                .annotate(income=Sum('total', filter=income_q), expense=Sum('total', filter=expense_q))
+            )
+            summary.categories = {
+                category_registry.name(row['category_id']): {'income': row['income'] or ZERO, 'expense': row['expense'] or ZERO}
+                for row in rows
+            }
+
+        return summary
+
+    @classmethod
+    def from_columns(cls, window, with_categories=False):
+        """Та же сводка по срезу колоночного кэша (ColumnWindow) - без запросов к БД."""
+        summary = cls(
+            income=window.income,
+            expense=window.expense,
+            income_count=window.income_count,
+            expense_count=window.expense_count,
+            total_count=len(window),
+        )
+
+        if with_categories and summary.total_count:
+            income = window.by_category('income')
+            expense = window.by_category('expense')
+            summary.categories = {
+                category_registry.name(category_id): {
+                    'income': from_minor(income.get(category_id, 0)),
+                    'expense': from_minor(expense.get(category_id, 0)),
+                }
+                for category_id in income.keys() | expense.keys()
+            }
+
+        return summary
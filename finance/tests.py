@@ -1,3 +1,1065 @@
-from django.test import TestCase
+import io
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from .models import ArchiveShard, Category, DailyBalance, DailySummary, ReportRun, Transaction, UserConsent
+
+
+def make_transactions(user, category, count, start=date(2025, 1, 1), type='expense'):
+    """count операций по одной в день, начиная со start (bulk_create - без сигналов)."""
+    return Transaction.objects.bulk_create([
+        Transaction(
+            user=user, category=category, type=type,
+            date=start + timedelta(days=index % 90),
+            amount=Decimal('10.00') + index,
+            description=f'Операция {index}',
+        )
+        for index in range(count)
+    ])
+
+
+class TemporaryMediaMixin:
+    """Файлы тестов (кэш отчётов, архив) - во временном MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp(prefix='fincontrol_test_media_')
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        media_settings = self.settings(MEDIA_ROOT=media)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+
+class PdfReportTests(TestCase):
+    """PDF-отчёт: детальные данные вёрстаются порциями по ходу построения (StreamingDocTemplate)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pdf')
+        cls.category = Category.objects.create(name='Продукты')
+        make_transactions(cls.user, cls.category, 260)
+
+    def test_full_detail_renders_every_row_on_several_pages(self):
+        from reportlab.platypus import Table
+        from .reports.pdf_report import DETAIL_HEADERS, StreamingDocTemplate, write_pdf_report
+
+        drawn = []
+        with mock.patch.object(StreamingDocTemplate, 'afterFlowable', autospec=True,
+                               side_effect=lambda doc, flowable: drawn.append(flowable)):
+            buffer = write_pdf_report(self.user, date(2025, 1, 1), date(2025, 3, 31), io.BytesIO(), full_detail=True)
+
+        # Таблица, разрезанная по страницам, рисуется частями - у каждой свой заголовок
+        rows = [
+            row for flowable in drawn
+            if isinstance(flowable, Table) and flowable._cellvalues[0] == DETAIL_HEADERS
+            for row in flowable._cellvalues[1:]
+        ]
+        expected = list(
+            Transaction.objects.filter(user=self.user).order_by('date', 'id').values_list('description', flat=True)
+        )
+        self.assertEqual([row[4] for row in rows], expected)
+        pages = len(re.findall(rb'/Type /Page\b(?!s)', buffer.getvalue()))
+        self.assertGreater(pages, 3)
+
+
+class ComparisonTests(TestCase):
+    """Сравнение периодов: интервалы одинаковой длины в текущем и предыдущем периоде."""
+
+    @classmethod
+    def setUpTestData(cls):
+        from .rollups import rebuild_rollups
+
+        cls.user = User.objects.create_user('comparison')
+        category = Category.objects.create(name='Кафе')
+        start = date(2025, 2, 27)
+        Transaction.objects.bulk_create([
+            Transaction(user=cls.user, category=category, type='expense',
+                        date=start + timedelta(days=offset), amount=Decimal('100.00'))
+            for offset in range((date(2025, 9, 20) - start).days + 1)
+        ])
+        rebuild_rollups(user=cls.user)
+
+    def test_period_not_from_first_day_is_compared_by_weeks_from_its_start(self):
+        from .comparison import PeriodComparison
+
+        comparison = PeriodComparison.for_period(self.user, date(2025, 6, 10), date(2025, 9, 20))
+        self.assertEqual(comparison.granularity, 'week')
+        self.assertEqual(comparison.periods['previous'], (date(2025, 2, 27), date(2025, 6, 9)))
+
+        rows = comparison.by_bucket()
+        # Без лишних интервалов "+N": периоды одной длины делятся на одинаковые недели
+        self.assertEqual(len(rows), len(comparison.buckets))
+        self.assertEqual(rows[0].label, '10.06')
+        for row in rows[:-1]:
+            self.assertEqual((row.current, row.previous), (Decimal('700.00'), Decimal('700.00')))
+        # Последняя неделя неполная - одинаково в обоих периодах
+        self.assertEqual((rows[-1].current, rows[-1].previous), (Decimal('500.00'), Decimal('500.00')))
+
+
+class LedgerTests(TestCase):
+    """Остатки по дням (DailyBalance) после изменений операций совпадают с полной пересборкой."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('ledger')
+        self.food = Category.objects.create(name='Еда')
+        self.salary = Category.objects.create(name='Зарплата')
+        self.income = Transaction.objects.create(
+            user=self.user, category=self.salary, type='income', date=date(2025, 3, 1), amount=Decimal('50000.00'))
+        self.expense = Transaction.objects.create(
+            user=self.user, category=self.food, type='expense', date=date(2025, 3, 5), amount=Decimal('1200.50'))
+        Transaction.objects.create(
+            user=self.user, category=self.food, type='expense', date=date(2025, 3, 10), amount=Decimal('300.25'))
+
+    def assertLedgerMatchesRebuild(self):
+        from .ledger import balance_at, rebuild_ledger
+        from .rollups import rebuild_rollups
+
+        def state():
+            rows = [
+                (row.date, row.net.quantize(Decimal('0.01')), row.balance.quantize(Decimal('0.01')))
+                for row in DailyBalance.objects.filter(user=self.user).order_by('date')
+            ]
+            days = [date(2025, 2, 28) + timedelta(days=offset) for offset in range(20)]
+            return rows, [balance_at(self.user, day).quantize(Decimal('0.01')) for day in days]
+
+        incremental = state()
+        rebuild_rollups(user=self.user)
+        rebuild_ledger(user=self.user)
+        self.assertEqual(incremental, state())
+
+    def test_create(self):
+        Transaction.objects.create(
+            user=self.user, category=self.food, type='expense', date=date(2025, 3, 3), amount=Decimal('99.99'))
+        self.assertLedgerMatchesRebuild()
+
+    def test_update_amount(self):
+        self.expense.amount = Decimal('1500.00')
+        self.expense.save()
+        self.assertLedgerMatchesRebuild()
+
+    def test_update_date(self):
+        # Задним числом - хвост пересчитывается с более ранней даты
+        self.expense.date = date(2025, 2, 28)
+        self.expense.save()
+        self.assertLedgerMatchesRebuild()
+        self.income.date = date(2025, 3, 12)
+        self.income.save()
+        self.assertLedgerMatchesRebuild()
+
+    def test_update_type(self):
+        self.expense.type = 'income'
+        self.expense.save()
+        self.assertLedgerMatchesRebuild()
+
+    def test_delete(self):
+        self.expense.delete()
+        self.assertLedgerMatchesRebuild()
+        self.assertFalse(DailyBalance.objects.filter(user=self.user, date=date(2025, 3, 5)).exists())
+
+
+class RollupTests(TestCase):
+    """Дневные сводки (DailySummary) после изменений операций совпадают с полной пересборкой."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('rollups')
+        self.food = Category.objects.create(name='Еда')
+        self.cafe = Category.objects.create(name='Кафе')
+        self.transaction = Transaction.objects.create(
+            user=self.user, category=self.food, type='expense', date=date(2025, 4, 1), amount=Decimal('250.00'))
+        Transaction.objects.create(
+            user=self.user, category=self.food, type='expense', date=date(2025, 4, 1), amount=Decimal('100.10'))
+
+    def assertRollupsMatchRebuild(self):
+        from .rollups import rebuild_rollups
+
+        def state():
+            return [
+                (row.date, row.type, row.category_id, row.total.quantize(Decimal('0.01')), row.count)
+                for row in DailySummary.objects.filter(user=self.user).order_by('date', 'type', 'category_id')
+            ]
+
+        incremental = state()
+        rebuild_rollups(user=self.user)
+        self.assertEqual(incremental, state())
+
+    def test_create(self):
+        # Бот передаёт сумму как float
+        Transaction.objects.create(
+            user=self.user, category=self.cafe, type='expense', date=date(2025, 4, 1), amount=0.1)
+        self.assertRollupsMatchRebuild()
+
+    def test_update_amount(self):
+        self.transaction.amount = Decimal('199.99')
+        self.transaction.save()
+        self.assertRollupsMatchRebuild()
+
+    def test_update_key(self):
+        self.transaction.category = self.cafe
+        self.transaction.save()
+        self.assertRollupsMatchRebuild()
+        self.transaction.date = date(2025, 4, 2)
+        self.transaction.type = 'income'
+        self.transaction.save()
+        self.assertRollupsMatchRebuild()
+
+    def test_delete(self):
+        self.transaction.delete()
+        self.assertRollupsMatchRebuild()
+
+
+class MinorUnitAmountTests(TestCase):
+    """Transaction.amount: в БД - целые копейки, в Python - Decimal с двумя знаками."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('money')
+        self.category = Category.objects.create(name='Прочее')
+
+    def test_round_trip(self):
+        # float - как передаёт бот, str - как из формы
+        for value, expected in [(Decimal('0.29'), Decimal('0.29')), (0.29, Decimal('0.29')), (0.1, Decimal('0.10')),
+                                ('19.99', Decimal('19.99')), (Decimal('9999999999.99'), Decimal('9999999999.99'))]:
+            transaction = Transaction.objects.create(
+                user=self.user, category=self.category, type='expense', date=date(2025, 1, 1), amount=value)
+            transaction.refresh_from_db()
+            self.assertEqual(transaction.amount, expected)
+            self.assertEqual(transaction.amount.as_tuple().exponent, -2)
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT amount FROM finance_transaction WHERE id = %s', [transaction.pk])
+                self.assertEqual(cursor.fetchone()[0], int(expected * 100))
+
+    def test_sum_and_filters_are_exact(self):
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, category=self.category, type='expense', date=date(2025, 1, 1), amount=0.1)
+            for _ in range(3)
+        ])
+        self.assertEqual(Transaction.objects.aggregate(total=Sum('amount'))['total'], Decimal('0.30'))
+        self.assertEqual(Transaction.objects.filter(amount__gte=Decimal('0.10')).count(), 3)
+
+
+class AmountMigrationTests(TransactionTestCase):
+    """Миграция 0014 (DECIMAL -> копейки) переносит суммы без потерь в обе стороны."""
+
+    before = [('finance', '0013_archiveshard')]
+    after = [('finance', '0014_transaction_amount_minor')]
+    amounts = [Decimal('0.01'), Decimal('0.29'), Decimal('19.99'), Decimal('1234.57'), Decimal('9999999999.99')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_forward_and_backward(self):
+        apps = self.migrate(self.before)
+        user = apps.get_model('auth', 'User').objects.create(username='migration')
+        category = apps.get_model('finance', 'Category').objects.create(name='Прочее')
+        OldTransaction = apps.get_model('finance', 'Transaction')
+        for amount in self.amounts:
+            OldTransaction.objects.create(user=user, category=category, type='expense',
+                                          date=date(2025, 1, 1), amount=amount)
+
+        self.migrate(self.after)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT amount FROM finance_transaction ORDER BY id')
+            self.assertEqual([row[0] for row in cursor.fetchall()], [int(amount * 100) for amount in self.amounts])
+
+        apps = self.migrate(self.before)
+        restored = apps.get_model('finance', 'Transaction').objects.order_by('id').values_list('amount', flat=True)
+        self.assertEqual(list(restored), self.amounts)
+
+
+class ReportCacheTests(TemporaryMediaMixin, TestCase):
+    """Кэш отчётов: повторный запрос отдаёт готовый файл, изменение данных делает его устаревшим."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('cache')
+        self.category = Category.objects.create(name='Продукты')
+        self.transactions = make_transactions(self.user, self.category, 30)
+
+    def report(self, user=None):
+        from .report_cache import cached_report
+        return cached_report(user or self.user, 'excel', date(2025, 1, 1), date(2025, 3, 31))
+
+    def test_hit_returns_the_stored_file(self):
+        report, hit = self.report()
+        self.assertFalse(hit)
+        cached, hit = self.report()
+        self.assertTrue(hit)
+        self.assertEqual((cached.pk, cached.file.name), (report.pk, report.file.name))
+
+    def test_transaction_edit_invalidates(self):
+        report, _hit = self.report()
+        transaction = Transaction.objects.get(pk=self.transactions[0].pk)
+        transaction.amount = Decimal('999.00')
+        transaction.save()
+
+        rebuilt, hit = self.report()
+        self.assertFalse(hit)
+        # Та же запись кэша с новым файлом и новой версией данных
+        self.assertEqual(rebuilt.pk, report.pk)
+        self.assertNotEqual(rebuilt.data_version, report.data_version)
+        self.assertTrue(self.report()[1])
+
+    def test_category_rename_invalidates(self):
+        self.report()
+        self.category.name = 'Супермаркет'
+        self.category.save()
+        self.assertFalse(self.report()[1])
+
+    def test_edits_outside_the_period(self):
+        self.report()
+        # Операция после периода отчёт не меняет
+        Transaction.objects.create(user=self.user, category=self.category, type='expense',
+                                   date=date(2025, 6, 1), amount=Decimal('5.00'))
+        self.assertTrue(self.report()[1])
+        # Операция до периода меняет остаток на начало, правка её описания - нет
+        earlier = Transaction.objects.create(user=self.user, category=self.category, type='expense',
+                                             date=date(2024, 12, 1), amount=Decimal('5.00'))
+        self.assertFalse(self.report()[1])
+        earlier.description = 'Уточнено'
+        earlier.save()
+        self.assertTrue(self.report()[1])
+
+    def test_other_users_edit_keeps_the_file(self):
+        self.report()
+        other = User.objects.create_user('cache-other')
+        Transaction.objects.create(user=other, category=self.category, type='expense',
+                                   date=date(2025, 1, 5), amount=Decimal('1.00'))
+        self.assertTrue(self.report()[1])
+
+
+class ThreadPool(ThreadPoolExecutor):
+    """Пул потоков вместо пула процессов рассылки: тестовая БД в памяти не видна другим процессам."""
+
+    def __init__(self, max_workers, mp_context=None, initializer=None):
+        super().__init__(max_workers)
+
+
+class ReportDeliveryTests(TemporaryMediaMixin, TransactionTestCase):
+    """Рассылка отчётов: прерванная рассылка продолжается с контрольной точки."""
+
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name='Продукты')
+        self.users = []
+        for index in range(4):
+            user = User.objects.create_user(f'delivery{index}')
+            UserConsent.objects.create(user=user, telegram_id=1000 + index, given_at=timezone.now())
+            Transaction.objects.create(user=user, category=category, type='expense',
+                                       date=date(2025, 3, 10), amount=Decimal('100.00'))
+            self.users.append(user)
+
+    def send(self):
+        from .report_delivery import send_reports
+
+        delivered, messages = [], []
+
+        async def deliver(telegram_id, filename, content, caption):
+            delivered.append(telegram_id)
+
+        with mock.patch('finance.report_delivery.ProcessPoolExecutor', ThreadPool):
+            run = send_reports(ReportRun.MONTHLY, today=date(2025, 4, 10), processes=1,
+                               deliver=deliver, log=messages.append)
+        return run, delivered, messages
+
+    def test_resumed_run_starts_from_checkpoint(self):
+        # Прошлый запуск упал, успев обработать первых двух пользователей
+        ReportRun.objects.create(kind=ReportRun.MONTHLY, period_start=date(2025, 3, 1), period_end=date(2025, 3, 31),
+                                 report_format='excel', last_user_id=self.users[1].pk, sent=2)
+
+        run, delivered, messages = self.send()
+        self.assertEqual(sorted(delivered), [1002, 1003])
+        self.assertEqual((run.last_user_id, run.sent, run.failed), (self.users[3].pk, 4, 0))
+        self.assertIsNotNone(run.finished_at)
+        self.assertTrue(any(message.startswith('♻️') for message in messages))
+
+        # Законченная рассылка повторно не отправляется
+        _run, delivered, _messages = self.send()
+        self.assertEqual(delivered, [])
+
+
+class SearchTests(TemporaryMediaMixin, TestCase):
+    """Поиск по описаниям: операции, перенесённые в архив, тоже находятся."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('search')
+        self.category = Category.objects.create(name='Кафе')
+        self.old = Transaction.objects.create(user=self.user, category=self.category, type='expense',
+                                              date=date(2020, 5, 4), amount=Decimal('4.50'),
+                                              description='Coffee at Starbucks')
+        self.recent = Transaction.objects.create(user=self.user, category=self.category, type='expense',
+                                                 date=date(2025, 5, 4), amount=Decimal('3.00'),
+                                                 description='Кофе и coffee beans')
+        Transaction.objects.create(user=self.user, category=self.category, type='expense',
+                                   date=date(2020, 6, 1), amount=Decimal('9.00'), description='Обед')
+
+    def search(self, query, **kwargs):
+        from .search import search_transactions
+        return search_transactions(self.user, query, **kwargs)
+
+    def test_archived_rows_are_found_after_table_rows(self):
+        from .archive import archive_transactions, restore_transactions
+
+        archive_transactions(before=date(2024, 1, 1), user=self.user)
+        self.assertFalse(Transaction.objects.filter(pk=self.old.pk).exists())
+
+        page = self.search('starbucks')
+        self.assertEqual([transaction.pk for transaction in page.object_list], [self.old.pk])
+        archived = page.object_list[0]
+        self.assertTrue(archived.is_archived)
+        self.assertEqual((archived.description, archived.category.name), ('Coffee at Starbucks', 'Кафе'))
+        self.assertEqual([transaction.pk for transaction in self.search('coff').object_list],
+                         [self.recent.pk, self.old.pk])
+        self.assertEqual(self.search('starbucks', start_date=date(2021, 1, 1)).object_list, [])
+
+        restore_transactions(user=self.user)
+        page = self.search('starbucks')
+        self.assertEqual([transaction.pk for transaction in page.object_list], [self.old.pk])
+        self.assertFalse(getattr(page.object_list[0], 'is_archived', False))
+
+    def test_pages_continue_from_table_into_archive(self):
+        from .archive import archive_transactions
+
+        archive_transactions(before=date(2024, 1, 1), user=self.user)
+        first = self.search('coffee', page_size=1)
+        second = self.search('coffee', page=2, page_size=1)
+        third = self.search('coffee', page=3, page_size=1)
+        self.assertEqual(([t.pk for t in first.object_list], first.has_next), ([self.recent.pk], True))
+        self.assertEqual(([t.pk for t in second.object_list], second.has_next), ([self.old.pk], False))
+        self.assertEqual(third.object_list, [])
+
+
+class ArchiveTests(TemporaryMediaMixin, TestCase):
+    """Архив старой истории: отчёты, сводки и остатки одинаковы до архивации, после неё и после восстановления."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('archive')
+        self.food = Category.objects.create(name='Еда')
+        self.salary = Category.objects.create(name='Зарплата')
+        for index in range(40):
+            Transaction.objects.create(
+                user=self.user, category=self.salary if index % 10 == 0 else self.food,
+                type='income' if index % 10 == 0 else 'expense',
+                date=date(2023, 11, 1) + timedelta(days=index * 17), amount=Decimal('12.34') * (index + 1),
+                description=None if index % 3 == 0 else f'Покупка №{index} — «кофе»',
+            )
+
+    def state(self):
+        from .reports.dataset import ReportDataset
+
+        dataset = ReportDataset.for_period(self.user, date(2023, 1, 1), date(2025, 12, 31))
+        return {
+            'rows': list(dataset.rows()),
+            'totals': (dataset.summary.income, dataset.summary.expense, dataset.summary.expense_by_category()),
+            'balances': (dataset.opening_balance, dataset.closing_balance),
+            'rollups': list(DailySummary.objects.filter(user=self.user).order_by('date', 'type', 'category_id')
+                            .values_list('date', 'type', 'category_id', 'total', 'count')),
+            'ledger': list(DailyBalance.objects.filter(user=self.user).order_by('date')
+                           .values_list('date', 'net', 'balance')),
+        }
+
+    def test_archive_and_restore_keep_reports_rollups_and_ledger(self):
+        from .archive import archive_transactions, restore_transactions
+        from .ledger import rebuild_ledger
+        from .rollups import rebuild_rollups
+
+        before = self.state()
+        ids = set(Transaction.objects.filter(user=self.user).values_list('id', flat=True))
+
+        # Второй проход дописывает 2024 год к уже созданному файлу
+        archive_transactions(before=date(2024, 6, 1), user=self.user)
+        archive_transactions(before=date(2025, 1, 1), user=self.user)
+        self.assertEqual(set(ArchiveShard.objects.filter(user=self.user).values_list('year', flat=True)), {2023, 2024})
+        self.assertFalse(Transaction.objects.filter(user=self.user, date__lt=date(2025, 1, 1)).exists())
+        self.assertEqual(self.state(), before)
+
+        # Полная пересборка учитывает архивные строки
+        rebuild_rollups(user=self.user)
+        rebuild_ledger(user=self.user)
+        self.assertEqual(self.state(), before)
+
+        restore_transactions(user=self.user)
+        self.assertFalse(ArchiveShard.objects.filter(user=self.user).exists())
+        self.assertEqual(set(Transaction.objects.filter(user=self.user).values_list('id', flat=True)), ids)
+        self.assertEqual(self.state(), before)
+
+
+class ColumnarCacheTests(TestCase):
+    """Колоночный кэш: изменения этого процесса применяются к колонкам на месте."""
+
+    def setUp(self):
+        from .columnar import columnar_cache
+
+        self.cache = columnar_cache
+        self.cache.invalidate()
+        self.addCleanup(self.cache.invalidate)
+        self.user = User.objects.create_user('columns')
+        self.category = Category.objects.create(name='Еда')
+        self.transactions = [
+            Transaction.objects.create(user=self.user, category=self.category, type='expense',
+                                       date=date(2025, 1, day), amount=Decimal('10.00') * day)
+            for day in (5, 10, 15)
+        ]
+
+    def assertColumnsMatchDatabase(self, entry):
+        from .columnar import UserColumns
+
+        loaded = UserColumns.load(self.user.pk)
+        for name, values in loaded.columns.items():
+            self.assertEqual(entry.columns[name].tolist(), values.tolist(), name)
+
+    def test_update_and_delete_are_applied_in_place(self):
+        entry = self.cache.get(self.user)
+        transaction = self.transactions[0]
+        # Дата строкой - так её принимает DateField
+        transaction.date = '2025-01-20'
+        transaction.amount = Decimal('7.77')
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction.save()
+        self.assertIs(self.cache.get(self.user), entry)
+        self.assertColumnsMatchDatabase(entry)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.transactions[1].delete()
+        self.assertIs(self.cache.get(self.user), entry)
+        self.assertColumnsMatchDatabase(entry)
+
+    def test_deleted_user_is_evicted(self):
+        self.cache.get(self.user)
+        self.assertEqual(self.cache.stats()['users'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(self.cache.stats()['users'], 0)
+
+
+class StatementImportTests(TestCase):
+    """Импорт выписки: разбор CSV/XLSX, отклонённые строки, сводки и остатки после bulk_create."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('import')
+        self.food = Category.objects.create(name='Еда')
+        self.salary = Category.objects.create(name='Зарплата')
+        # Сводка и остаток за этот день уже есть - импорт должен их дополнить
+        Transaction.objects.create(user=self.user, category=self.food, type='expense',
+                                   date=date(2025, 3, 2), amount=Decimal('100.00'))
+
+    def assertRollupsAndLedgerMatchRebuild(self):
+        from .ledger import rebuild_ledger
+        from .rollups import rebuild_rollups
+
+        def state():
+            return (
+                [(row.date, row.type, row.category_id, row.total.quantize(Decimal('0.01')), row.count)
+                 for row in DailySummary.objects.filter(user=self.user).order_by('date', 'type', 'category_id')],
+                [(row.date, row.net.quantize(Decimal('0.01')), row.balance.quantize(Decimal('0.01')))
+                 for row in DailyBalance.objects.filter(user=self.user).order_by('date')],
+            )
+
+        incremental = state()
+        rebuild_rollups(user=self.user)
+        rebuild_ledger(user=self.user)
+        self.assertEqual(incremental, state())
+
+    def test_csv(self):
+        from .imports.pipeline import import_statement
+
+        content = '\n'.join([
+            'Дата;Сумма;Тип;Категория;Описание',
+            '01.03.2025;50 000,00;доход;Зарплата;Аванс',
+            '02.03.2025;1 234,50 ₽;расход;еда;Супермаркет',
+            '2025-03-02;99.99;-;Еда;',
+            '31.02.2025;10,00;расход;Еда;Нет такой даты',
+            '03.03.2025;;расход;Еда;Без суммы',
+            '03.03.2025;10,00;расход;Такси;Нет такой категории',
+            '03.03.2025;10,00;перевод;Еда;Неизвестный тип',
+        ]).encode('utf-8-sig')
+        result = import_statement(self.user, io.BytesIO(content), filename='statement.csv', chunk_size=2)
+
+        self.assertEqual((result.total, result.imported, result.rejected), (7, 3, 4))
+        self.assertEqual([line for line, _reason in result.errors], [5, 6, 7, 8])
+        imported = list(
+            Transaction.objects.filter(user=self.user).exclude(amount=Decimal('100.00')).order_by('date', 'id')
+            .values_list('date', 'type', 'category__name', 'amount', 'description')
+        )
+        self.assertEqual(imported, [
+            (date(2025, 3, 1), 'income', 'Зарплата', Decimal('50000.00'), 'Аванс'),
+            (date(2025, 3, 2), 'expense', 'Еда', Decimal('1234.50'), 'Супермаркет'),
+            (date(2025, 3, 2), 'expense', 'Еда', Decimal('99.99'), None),
+        ])
+        self.assertRollupsAndLedgerMatchRebuild()
+
+    def test_xlsx_sign_gives_the_type(self):
+        import openpyxl
+        from .imports.pipeline import import_statement
+
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(['Date', 'Amount', 'Category', 'Description'])
+        sheet.append([datetime(2025, 3, 2, 14, 30), -250.5, 'Еда', 'Кафе'])
+        sheet.append([datetime(2025, 3, 5), 1000, 'Зарплата', None])
+        sheet.append([None, None, None, None])
+        sheet.append(['не дата', 5, 'Еда', None])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        buffer.seek(0)
+
+        result = import_statement(self.user, buffer, filename='statement.xlsx')
+        self.assertEqual((result.total, result.imported, result.rejected), (3, 2, 1))
+        self.assertEqual(result.errors[0][0], 5)
+        self.assertEqual(
+            list(Transaction.objects.filter(user=self.user, description__isnull=False)
+                 .values_list('date', 'type', 'amount')),
+            [(date(2025, 3, 2), 'expense', Decimal('250.50'))],
+        )
+        self.assertTrue(Transaction.objects.filter(user=self.user, type='income', amount=Decimal('1000.00')).exists())
+        self.assertRollupsAndLedgerMatchRebuild()
+
+    def test_dry_run_saves_nothing(self):
+        from .imports.pipeline import import_statement
+
+        content = 'date,amount,category\n2025-03-01,-10,Еда\n'.encode()
+        result = import_statement(self.user, io.BytesIO(content), filename='statement.csv', dry_run=True)
+        self.assertEqual((result.total, result.imported), (1, 1))
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+
+
+@mock.patch('finance.db_router.get_replicas', return_value=['replica'])
+class ReplicaRouterTests(TestCase):
+    """Маршрутизация: чтения в read_replica - на реплику, записи - в основную БД, после записи - закрепление."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('replica')
+        self.other = User.objects.create_user('replica-other')
+        self.category = Category.objects.create(name='Еда')
+
+    def test_reads_go_to_replica_and_writes_to_primary(self, _replicas):
+        from django.db import router
+        from .db_router import read_replica
+
+        self.assertEqual(Transaction.objects.filter(user=self.user).db, 'default')
+        with read_replica(self.user) as alias:
+            self.assertEqual(alias, 'replica')
+            self.assertEqual(Transaction.objects.filter(user=self.user).db, 'replica')
+            self.assertEqual(router.db_for_write(Transaction), 'default')
+            # Вложенный блок сохраняет выбранную БД
+            with read_replica(self.other) as nested:
+                self.assertEqual(nested, 'replica')
+        self.assertEqual(Transaction.objects.filter(user=self.user).db, 'default')
+
+    def test_write_pins_the_user_to_primary(self, _replicas):
+        from .db_router import read_replica
+        from .models import ReplicaPin
+
+        Transaction.objects.create(user=self.user, category=self.category, type='expense',
+                                   date=date(2025, 1, 1), amount=Decimal('1.00'))
+        with read_replica(self.user) as alias:
+            self.assertEqual(alias, 'default')
+        with read_replica(self.other) as alias:
+            self.assertEqual(alias, 'replica')
+
+        # Отметка истекла - снова реплика
+        ReplicaPin.objects.filter(user_id=self.user.pk).update(pinned_until=timezone.now() - timedelta(seconds=1))
+        with read_replica(self.user) as alias:
+            self.assertEqual(alias, 'replica')
+
+    def test_no_pins_without_replicas(self, replicas):
+        from .models import ReplicaPin
+
+        replicas.return_value = []
+        Transaction.objects.create(user=self.user, category=self.category, type='expense',
+                                   date=date(2025, 1, 1), amount=Decimal('1.00'))
+        self.assertFalse(ReplicaPin.objects.exists())
+
+
+class KeysetPaginationTests(TestCase):
+    """Keyset-пагинация истории: страницы по (-date, -id) без пропусков и повторов."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('pages')
+        category = Category.objects.create(name='Разное')
+        # По две операции в день - курсор должен различать их по id
+        for day in (1, 1, 2, 2, 3):
+            Transaction.objects.create(user=self.user, category=category, type='expense',
+                                       date=date(2025, 3, day), amount=Decimal('1.00'))
+        self.expected = list(Transaction.objects.filter(user=self.user)
+                             .order_by('-date', '-id').values_list('pk', flat=True))
+
+    def walk(self, page_size):
+        from .pagination import keyset_page
+
+        pages, cursor = [], None
+        while True:
+            page = keyset_page(Transaction.objects.filter(user=self.user), cursor, page_size=page_size)
+            pages.append([transaction.pk for transaction in page.object_list])
+            if not page.has_next:
+                return pages
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_row_once(self):
+        self.assertEqual(self.walk(2), [self.expected[:2], self.expected[2:4], self.expected[4:]])
+
+    def test_exact_multiple_of_page_size_has_no_empty_last_page(self):
+        self.assertEqual(self.walk(5), [self.expected])
+        self.assertEqual(self.walk(1), [[pk] for pk in self.expected])
+
+    def test_invalid_cursor_gives_the_first_page(self):
+        from .pagination import keyset_page
+
+        for cursor in ('garbage', '2025-13-01:1', '2025-03-01:x'):
+            page = keyset_page(Transaction.objects.filter(user=self.user), cursor, page_size=2)
+            self.assertEqual([transaction.pk for transaction in page.object_list], self.expected[:2])
+
+
+class SeriesTests(TestCase):
+    """Временные ряды finance.analytics: плотные интервалы из дневных сводок."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('series')
+        self.food = Category.objects.create(name='Еда')
+        self.salary = Category.objects.create(name='Зарплата')
+        for day, category, type, amount in [
+            (date(2025, 1, 30), self.food, 'expense', '10.00'),
+            (date(2025, 2, 3), self.food, 'expense', '5.50'),
+            (date(2025, 2, 3), self.salary, 'income', '100.00'),
+        ]:
+            Transaction.objects.create(user=self.user, category=category, type=type,
+                                       date=day, amount=Decimal(amount))
+
+    def test_months_are_dense_and_split_by_type(self):
+        from .analytics import series
+
+        result = series(self.user, date(2024, 12, 15), date(2025, 3, 1), granularity='month')
+        self.assertEqual(result.buckets, [date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)])
+        self.assertEqual(result.get('expense'), [0.0, 10.0, 5.5, 0.0])
+        self.assertEqual(result.get('income'), [0.0, 0.0, 100.0, 0.0])
+
+    def test_weeks_split_by_category(self):
+        from .analytics import series
+
+        result = series(self.user, date(2025, 1, 27), date(2025, 2, 9), granularity='week',
+                        split_by='category', type='expense')
+        self.assertEqual(result.buckets, [date(2025, 1, 27), date(2025, 2, 3)])
+        self.assertEqual(result.values, {'Еда': [10.0, 5.5]})
+
+
+@mock.patch('finance.sqlite_profile.time.sleep')
+class RetryWriteTests(SimpleTestCase):
+    """retry_write: повтор записи при занятой SQLite, но не внутри внешней транзакции."""
+
+    def connection(self, in_atomic_block=False):
+        from django.db import OperationalError
+        from .sqlite_profile import DEFAULT_RETRIES
+
+        self.write = mock.Mock(side_effect=[OperationalError('database is locked'), 'written'])
+        self.OperationalError = OperationalError
+        connection = mock.Mock(settings_dict={'WRITE_RETRIES': dict(DEFAULT_RETRIES)},
+                               in_atomic_block=in_atomic_block)
+        return mock.patch('finance.sqlite_profile.connections', {'default': connection})
+
+    def test_locked_write_is_retried(self, sleep):
+        from .sqlite_profile import retry_write
+
+        with self.connection():
+            self.assertEqual(retry_write(self.write, 'default', 1, key='value'), 'written')
+        self.assertEqual(self.write.call_args_list, [mock.call(1, key='value')] * 2)
+        sleep.assert_called_once()
+
+    def test_other_errors_and_atomic_blocks_are_not_retried(self, sleep):
+        from .sqlite_profile import retry_write
+
+        with self.connection(in_atomic_block=True), self.assertRaises(self.OperationalError):
+            retry_write(self.write, 'default')
+        with self.connection():
+            self.write.side_effect = self.OperationalError('no such table: finance_transaction')
+            with self.assertRaises(self.OperationalError):
+                retry_write(self.write, 'default')
+        self.assertEqual(self.write.call_count, 1)
+        sleep.assert_not_called()
+
+
+class ReportJobQueueTests(TestCase):
+    """Очередь заданий на отчёты: захват по одному, возврат зависших в очередь."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('jobs')
+
+    def job(self, **fields):
+        from .models import ReportJob
+        return ReportJob.objects.create(user=self.user, report_format='pdf', params={}, **fields)
+
+    def test_claim_takes_the_oldest_pending_job_once(self):
+        from .models import ReportJob
+        from .report_jobs import claim_next
+
+        self.job(status=ReportJob.DONE)
+        first, second = self.job(), self.job()
+        self.assertEqual(claim_next(), first.pk)
+        self.assertEqual(claim_next(), second.pk)
+        self.assertIsNone(claim_next())
+        first.refresh_from_db()
+        self.assertEqual(first.status, ReportJob.RUNNING)
+        self.assertIsNotNone(first.started_at)
+
+    def test_only_stale_running_jobs_are_requeued(self):
+        from .models import ReportJob
+        from .report_jobs import requeue_stale
+
+        stale, fresh = self.job(status=ReportJob.RUNNING, progress=40), self.job(status=ReportJob.RUNNING)
+        ReportJob.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(minutes=20))
+        self.assertEqual(requeue_stale(minutes=15), 1)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.status, stale.progress), (ReportJob.PENDING, 0))
+        self.assertEqual(fresh.status, ReportJob.RUNNING)
+
+
+class ReportDatasetTests(TemporaryMediaMixin, TestCase):
+    """ReportDataset: итоги за период, часть которого уже в архиве, совпадают с итогами по таблице."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('dataset')
+        self.food = Category.objects.create(name='Еда')
+        self.salary = Category.objects.create(name='Зарплата')
+        for index in range(30):
+            Transaction.objects.create(
+                user=self.user, category=self.salary if index % 5 == 0 else self.food,
+                type='income' if index % 5 == 0 else 'expense',
+                date=date(2024, 10, 1) + timedelta(days=index * 6), amount=Decimal('7.25') * (index + 1),
+            )
+
+    def expected(self, start, end, category=None):
+        transactions = Transaction.objects.filter(user=self.user, date__gte=start, date__lte=end)
+        if category:
+            transactions = transactions.filter(category=category)
+        totals = {type: Decimal('0.00') for type in ('income', 'expense')}
+        for type, amount in transactions.values_list('type', 'amount'):
+            totals[type] += amount
+        return totals['income'], totals['expense'], transactions.count()
+
+    def totals(self, dataset):
+        return dataset.summary.income, dataset.summary.expense, len(dataset)
+
+    def test_totals_span_archive_and_table(self):
+        from .archive import archive_transactions
+        from .ledger import balance_at
+        from .reports.dataset import ReportDataset
+
+        start, end, middle = date(2024, 11, 15), date(2025, 3, 10), date(2025, 1, 1)
+        expected = self.expected(start, end)
+        expected_food = self.expected(start, end, self.food)
+        expected_part = self.expected(date(2024, 12, 1), date(2025, 1, 31))
+        balances = ReportDataset.for_period(self.user, start, end)
+
+        archive_transactions(before=middle, user=self.user)
+        self.assertFalse(Transaction.objects.filter(user=self.user, date__lt=middle).exists())
+
+        dataset = ReportDataset.for_period(self.user, start, end)
+        self.assertEqual(self.totals(dataset), expected)
+        self.assertEqual((dataset.opening_balance, dataset.closing_balance),
+                         (balances.opening_balance, balances.closing_balance))
+        self.assertEqual(len(list(dataset.rows())), expected[2])
+        self.assertEqual(self.totals(ReportDataset.for_period(self.user, start, end, categories=['Еда'])),
+                         expected_food)
+        part = dataset.part(date(2024, 12, 1), date(2025, 1, 31))
+        self.assertEqual(self.totals(part), expected_part)
+        self.assertEqual(part.closing_balance, balance_at(self.user.pk, date(2025, 1, 31)))
+
+
+class YearBundleTests(TemporaryMediaMixin, TestCase):
+    """Архив за год: месяцы до текущего, PDF только за месяцы с операциями, повторный архив - из кэша."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('bundle')
+        category = Category.objects.create(name='Еда')
+        for day in (date(2025, 1, 10), date(2025, 1, 20), date(2025, 3, 5)):
+            Transaction.objects.create(user=self.user, category=category, type='expense',
+                                       date=day, amount=Decimal('3.00'), description='Хлеб')
+
+    def test_months(self):
+        from .report_bundle import months
+
+        self.assertEqual(months(2025, date(2025, 3, 1)),
+                         [(date(2025, 1, 1), date(2025, 1, 31)), (date(2025, 2, 1), date(2025, 2, 28)),
+                          (date(2025, 3, 1), date(2025, 3, 31))])
+        self.assertEqual(months(2024, date(2025, 1, 1))[-1], (date(2024, 12, 1), date(2024, 12, 31)))
+        self.assertEqual(months(2026, date(2025, 12, 31)), [])
+
+    def bundle(self):
+        import zipfile
+        from concurrent.futures import Future
+        from .report_bundle import year_bundle
+        from .reports import worker
+
+        def render(report_format, dataset):
+            # В тесте - в этом же процессе: пул не видит тестовую БД
+            future = Future()
+            future.set_result(worker.render_dataset(report_format, dataset))
+            return future
+
+        with mock.patch('finance.report_bundle._submit', side_effect=render) as submit:
+            content = b''.join(year_bundle(self.user, 2025, today=date(2025, 4, 15)))
+        return zipfile.ZipFile(io.BytesIO(content)), submit.call_count
+
+    def test_entries_and_cache(self):
+        archive, built = self.bundle()
+        names = ['2025/fincontrol_2025.xlsx', '2025/pdf/2025-01.pdf', '2025/pdf/2025-03.pdf',
+                 '2025/transactions_2025.csv']
+        self.assertEqual(sorted(archive.namelist()), names)
+        self.assertEqual(built, 3)
+        rows = archive.read('2025/transactions_2025.csv').decode('utf-8-sig').splitlines()
+        self.assertEqual(rows, ['date,type,category,amount,description', '2025-01-10,expense,Еда,3.00,Хлеб',
+                                '2025-01-20,expense,Еда,3.00,Хлеб', '2025-03-05,expense,Еда,3.00,Хлеб'])
+
+        archive, built = self.bundle()
+        self.assertEqual(sorted(archive.namelist()), names)
+        self.assertEqual(built, 0)
+
+
+class CategoryRegistryTests(TestCase):
+    """Реестр категорий: поиск без запросов к БД и перезагрузка по версии из другого процесса."""
+
+    def setUp(self):
+        self.food = Category.objects.create(name='Еда')
+
+    def test_lookups_are_served_from_memory(self):
+        from .categories import CategoryRegistry
+
+        registry = CategoryRegistry(check_interval=60)
+        registry.load()
+        with self.assertNumQueries(0):
+            self.assertEqual(registry.by_name(' еДА '), self.food)
+            self.assertEqual(registry.name(self.food.pk), 'Еда')
+            self.assertEqual(registry.ids_for_names(['Еда', 'Нет такой']), [self.food.pk])
+            self.assertIsNone(registry.get('abc'))
+
+    def test_reloads_when_the_version_changes(self):
+        from .categories import VERSION_KEY, CategoryRegistry
+        from .versions import bump_version
+
+        registry = CategoryRegistry(check_interval=0)
+        registry.load()
+        # Другой процесс переименовал категорию: без сигналов в этом процессе, только версия в БД
+        Category.objects.filter(pk=self.food.pk).update(name='Продукты')
+        self.assertEqual(registry.name(self.food.pk), 'Еда')
+        bump_version(VERSION_KEY)
+        self.assertEqual(registry.name(self.food.pk), 'Продукты')
+        self.assertIsNone(registry.by_name('Еда'))
+
+
+class ExcelReportTests(TestCase):
+    """Excel-отчёт в write-only режиме: все строки, точные суммы и итоги по всему периоду."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('excel')
+        cls.category = Category.objects.create(name='Транспорт')
+        cls.transactions = make_transactions(cls.user, cls.category, 25)
+
+    def test_every_row_is_written(self):
+        import openpyxl
+        from .reports.excel_report import generate_excel_report
+
+        # Ширина колонок считается по первой порции - остальные строки пишутся после неё
+        with mock.patch('finance.reports.excel_report.WIDTH_SAMPLE_ROWS', 10):
+            workbook = openpyxl.load_workbook(generate_excel_report(self.user, date(2025, 1, 1), date(2025, 3, 31)))
+        details = list(workbook['Детальные данные'].iter_rows(min_row=2, values_only=True))
+        self.assertEqual(len(details), 25)
+        self.assertEqual(details[0], ('01.01.2025', 'Расход', 'Транспорт', 10, 'Операция 0'))
+        self.assertEqual(sum(Decimal(str(row[3])) for row in details),
+                         sum(transaction.amount for transaction in self.transactions))
+        summary = dict(workbook['Сводка'].iter_rows(min_row=2, values_only=True))
+        self.assertEqual(summary['Общее количество операций'], 25)
+        self.assertEqual(summary['Общие расходы'], '550.00 руб.')
+
+
+class ReportChartTests(TestCase):
+    """Диаграммы отчётов строятся по свёрнутым данным ReportDataset."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('charts')
+        for index in range(10):
+            category = Category.objects.create(name=f'Категория {index:02d}')
+            make_transactions(cls.user, category, 3, start=date(2025, 2, 1) + timedelta(days=index * 7))
+        salary = Category.objects.create(name='Зарплата')
+        make_transactions(cls.user, salary, 2, start=date(2025, 2, 10), type='income')
+        # bulk_create идёт без сигналов - сводки для analytics.series пересобираются
+        from .rollups import rebuild_rollups
+        rebuild_rollups(user=cls.user)
+
+    def dataset(self):
+        from .reports.dataset import ReportDataset
+        return ReportDataset.for_period(self.user, date(2025, 2, 1), date(2025, 5, 31))
+
+    def test_small_categories_are_merged(self):
+        from .reports.dataset import CHART_MAX_SLICES, OTHER_LABEL
+
+        dataset = self.dataset()
+        slices = dataset.expense_slices()
+        self.assertEqual(len(slices), CHART_MAX_SLICES)
+        self.assertEqual(slices[-1][0], OTHER_LABEL)
+        self.assertEqual(sum(amount for _name, amount in slices), dataset.summary.expense)
+
+    def test_trend_matches_the_rollup_series(self):
+        from .analytics import series
+
+        trend = self.dataset().series()
+        self.assertEqual(trend.granularity, 'week')
+        expected = series(self.user, date(2025, 2, 1), date(2025, 5, 31), granularity='week')
+        self.assertEqual(trend.buckets, expected.buckets)
+        for key in ('income', 'expense'):
+            self.assertEqual([round(value, 2) for value in trend.get(key)],
+                             [round(value, 2) for value in expected.get(key)])
+
+    def test_excel_report_has_native_charts(self):
+        import zipfile
+        from .reports.excel_report import generate_excel_report
+
+        report = generate_excel_report(self.user, date(2025, 2, 1), date(2025, 5, 31), dataset=self.dataset())
+        charts = [name for name in zipfile.ZipFile(report).namelist() if name.startswith('xl/charts/chart')]
+        self.assertEqual(len(charts), 2)
+
+
+class SeedDataTests(TestCase):
+    """seed_data: одинаковый seed - одинаковые данные; сводки и остатки согласованы с операциями."""
+
+    def seed(self, prefix, seed=7):
+        call_command('seed_data', users=1, transactions=300, days=120, seed=seed, prefix=prefix, stdout=io.StringIO())
+        user = User.objects.get(username=f'{prefix}_{seed}_0')
+        return user, list(Transaction.objects.filter(user=user).order_by('date', 'id')
+                          .values_list('date', 'type', 'category_id', 'amount', 'description'))
+
+    def test_same_seed_gives_the_same_data(self):
+        from .ledger import balance_at
+
+        user, rows = self.seed('first')
+        self.assertEqual(len(rows), 300)
+        self.assertEqual(self.seed('second')[1], rows)
+        self.assertNotEqual(self.seed('third', seed=8)[1], rows)
+
+        rollup_total = DailySummary.objects.filter(user=user).aggregate(total=Sum('total'))['total']
+        self.assertEqual(Decimal(rollup_total).quantize(Decimal('0.01')), sum(row[3] for row in rows))
+        net = sum(row[3] if row[1] == 'income' else -row[3] for row in rows)
+        self.assertEqual(balance_at(user.pk, rows[-1][0]), net)
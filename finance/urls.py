@@ -16,6 +16,13 @@ urlpatterns = [
     path('reports/', views.report_builder, name='report_builder'),
     path('reports/create/', views.create_report, name='create_report'),
     path('reports/quick/', views.quick_reports, name='quick_reports'),
+    # Фоновые отчеты: постановка в очередь, статус для опроса и скачивание (finance.report_jobs)
+    path('reports/jobs/', views.submit_report_job, name='submit_report_job'),
+    path('reports/jobs/<int:job_id>/', views.report_job_status, name='report_job_status'),
+    path('reports/jobs/<int:job_id>/download/', views.report_job_download, name='report_job_download'),
+    # Архив за год (ZIP): PDF по месяцам, Excel и CSV операций (finance.report_bundle)
+    path('reports/bundle/', views.export_bundle, name='export_bundle'),
+    path('import/', views.import_transactions, name='import_transactions'),
     # path('reports/download/<int:report_id>/', views.download_report, name='download_report'),
     # path('reports/generate/<int:report_id>/', views.generate_report_now, name='generate_report_now'),
 ]
\ No newline at end of file
@@ -0,0 +1,34 @@
+# finance/versions.py
+"""
+Версии данных для межпроцессной инвалидации кэшей.
+
+Каждый процесс (веб, бот, cron) держит свой кэш в памяти и перед
+использованием сравнивает сохранённую версию с DataVersion - это
+один запрос по уникальному индексу к таблице из нескольких строк.
+"""
+from django.db import IntegrityError, router, transaction
+from django.db.models import F
+
+from .models import DataVersion
+
+
+def get_version(key):
+    """Текущая версия данных (0, если данные ещё ни разу не менялись)."""
+    return DataVersion.objects.filter(key=key).values_list('version', flat=True).first() or 0
+
+
+def bump_version(key):
+    """
+    Увеличивает версию данных; вызывается при каждом изменении.
+    Возвращает новую версию (внутри транзакции строка версии заблокирована до фиксации).
+    """
+    versions = DataVersion.objects.using(router.db_for_write(DataVersion))
+    if not versions.filter(key=key).update(version=F('version') + 1):
+        try:
+            with transaction.atomic(using=versions.db):
+                versions.create(key=key, version=1)
+            return 1
+        except IntegrityError:
+            versions.filter(key=key).update(version=F('version') + 1)
+    # Читаем из той же БД, куда писали (не из реплики)
+    return versions.filter(key=key).values_list('version', flat=True).first()
@@ -2,21 +2,24 @@
 from django.shortcuts import render, redirect, get_object_or_404 # Добавим get_object_or_404
 from django.views.generic import CreateView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
 from django.db.models import Q # Импортируем Q для фильтрации
 from django.http import HttpResponseRedirect
-from .models import Transaction, Category, SavedReport # Импортируем SavedReport
-from .forms import TransactionForm
+from .models import Transaction, SavedReport # Импортируем SavedReport
+from .forms import TransactionForm, StatementImportForm
+from .pagination import keyset_page
+from .search import search_transactions
+from .categories import category_registry
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.utils import timezone
-from .models import SavedReport, Transaction
-from .reports.excel_report import generate_excel_report
-from .reports.pdf_report import generate_pdf_report
-import json
+from .models import ReportJob, SavedReport, Transaction
+from .report_cache import get_report, open_report
+from .report_jobs import submit as submit_job
 from datetime import datetime, timedelta
 
 def index(request):
@@ -71,59 +74,111 @@ class TransactionCreateView(LoginRequiredMixin, CreateView):
         return result # <-- Вернём результат
         # return super().form_valid(form)
 
-    def get_queryset(self):
-        # ... (ваш существующий код get_queryset с фильтрацией) ...
-        # (скопируйте сюда ваш текущий код get_queryset, включая логику фильтрации)
-        print("DEBUG: get_queryset - ABSOLUTE START")
-        print("DEBUG: About to get request.user")
-        user = self.request.user
-        print(f"DEBUG: Got request.user = {user}")
-        print(f"DEBUG: Got request.user.id = {user.id}")
-
-        queryset = Transaction.objects.filter(user=user).order_by('-date')
-        print("DEBUG: Called filter, about to count")
-        count = queryset.count()
-        print(f"DEBUG: get_queryset found {count} transactions for user {user}")
+    def get_filters(self):
+        """Фильтры из GET-запроса: даты, категория и строка поиска (некорректные значения игнорируются)."""
+        filters = {'start_date': None, 'end_date': None, 'category_id': None, 'q': ''}
 
-        # Применяем фильтры, если они есть в GET-запросе
         start_date = self.request.GET.get('start_date')
         end_date = self.request.GET.get('end_date')
         category_id = self.request.GET.get('category')
 
         if start_date:
             try:
-                start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-                queryset = queryset.filter(date__gte=start_date_obj)
+                filters['start_date'] = datetime.strptime(start_date, '%Y-%m-%d').date()
             except ValueError:
                 pass
 
         if end_date:
             try:
-                end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                queryset = queryset.filter(date__lte=end_date_obj)
+                filters['end_date'] = datetime.strptime(end_date, '%Y-%m-%d').date()
             except ValueError:
                 pass
 
         if category_id:
             try:
-                queryset = queryset.filter(category_id=category_id)
+                filters['category_id'] = int(category_id)
             except (ValueError, TypeError):
                 pass
 
-        print("DEBUG: get_queryset - END")
+        filters['q'] = self.request.GET.get('q', '').strip()
+        return filters
+
+    def get_queryset(self):
+        """
+        Операции текущего пользователя с учётом фильтров из GET-запроса.
+        Queryset строится один раз за запрос и не выполняет COUNT.
+        """
+        if getattr(self, '_filtered_queryset', None) is not None:
+            return self._filtered_queryset
+
+        user = self.request.user
+        queryset = Transaction.objects.filter(user=user).select_related('category')
+
+        # Применяем фильтры, если они есть в GET-запросе
+        filters = self.get_filters()
+        if filters['start_date']:
+            queryset = queryset.filter(date__gte=filters['start_date'])
+        if filters['end_date']:
+            queryset = queryset.filter(date__lte=filters['end_date'])
+        if filters['category_id'] is not None:
+            queryset = queryset.filter(category_id=filters['category_id'])
+
+        self._filtered_queryset = queryset
         return queryset
 
+    def get_search_page(self, filters):
+        """Поиск по описаниям (finance.search): по релевантности, страницы ?page=N."""
+        try:
+            number = int(self.request.GET.get('page', 1))
+        except (ValueError, TypeError):
+            number = 1
+        category_ids = [filters['category_id']] if filters['category_id'] is not None else None
+        return search_transactions(
+            self.request.user, filters['q'], page=number, page_size=self.get_page_size(),
+            start_date=filters['start_date'], end_date=filters['end_date'], category_ids=category_ids,
+        )
+
+    def get_page_size(self):
+        """Размер страницы истории: ?page_size=... или settings.TRANSACTIONS_PAGE_SIZE."""
+        default = getattr(settings, 'TRANSACTIONS_PAGE_SIZE', 50)
+        try:
+            page_size = int(self.request.GET.get('page_size', default))
+        except (ValueError, TypeError):
+            page_size = default
+        return max(1, min(page_size, getattr(settings, 'TRANSACTIONS_MAX_PAGE_SIZE', 500)))
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Явно получаем список транзакций через наш get_queryset
-        transaction_list = self.get_queryset()
-        context['object_list'] = transaction_list # Помещаем его в контекст под именем object_list
-        print(f"DEBUG: get_context_data added {transaction_list.count()} transactions to object_list") # <-- Отладка
+        filters = self.get_filters()
+        if filters['q']:
+            # Поиск по описаниям: страницы по релевантности, номер страницы в ?page=
+            page = self.get_search_page(filters)
+        else:
+            # История операций: keyset-страница по (date, id), без COUNT
+            page = keyset_page(self.get_queryset(), self.request.GET.get('after'), self.get_page_size())
+        context['object_list'] = page.object_list
+        context['page'] = page
+        context['search_query'] = filters['q']
+
+        # Ссылки "Загрузить ещё" / "В начало" сохраняют текущие фильтры
+        params = self.request.GET.copy()
+        params.pop('after', None)
+        params.pop('page', None)
+        context['first_page_query'] = params.urlencode()
+        if page.has_next:
+            if filters['q']:
+                params['page'] = page.number + 1
+            else:
+                params['after'] = page.next_cursor
+            context['next_page_query'] = params.urlencode()
 
         # --- НОВОЕ: Добавляем сохранённые отчёты пользователя в контекст ---
-        user_saved_reports = SavedReport.objects.filter(user=self.request.user)
+        # Записи кэша готовых отчётов (finance.report_cache) в список не попадают
+        user_saved_reports = SavedReport.objects.filter(user=self.request.user, cache_key='')
         context['saved_reports'] = user_saved_reports
         # ---
+        # Категории для фильтра - из реестра категорий (без запроса к БД)
+        context['categories'] = category_registry.all()
 
         return context
 
@@ -184,6 +239,7 @@ class TransactionCreateView(LoginRequiredMixin, CreateView):
                     current_start_date = request.POST.get('current_start_date')
                     current_end_date = request.POST.get('current_end_date')
                     current_category = request.POST.get('current_category')
+                    current_q = request.POST.get('current_q', '').strip()
 
                     # Формируем словарь фильтров
                     filters_to_save = {}
@@ -193,6 +249,8 @@ class TransactionCreateView(LoginRequiredMixin, CreateView):
                         filters_to_save['end_date'] = current_end_date
                     if current_category:
                         filters_to_save['category'] = current_category
+                    if current_q:
+                        filters_to_save['q'] = current_q
 
                     # Пытаемся создать или обновить отчёт
                     saved_report, created = SavedReport.objects.get_or_create(
@@ -253,58 +311,68 @@ def report_builder(request):
     return render(request, 'finance/report_builder.html')
 
 
+def report_period(params):
+    """Период отчета из параметров формы построителя (period_type, start_date, end_date)"""
+    period_type = params.get('period_type', 'month')
+
+    # Определение дат
+    today = timezone.now().date()
+    if period_type == 'day':
+        start_date = today
+        end_date = today
+    elif period_type == 'week':
+        start_date = today - timedelta(days=today.weekday())
+        end_date = today
+    elif period_type == 'month':
+        start_date = today.replace(day=1)
+        end_date = today
+    elif period_type == 'year':
+        start_date = today.replace(month=1, day=1)
+        end_date = today
+    elif period_type == 'custom':
+        start_date_str = params.get('start_date')
+        end_date_str = params.get('end_date')
+        if start_date_str:
+            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        else:
+            start_date = today
+        if end_date_str:
+            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+        else:
+            end_date = today
+    else:
+        start_date = today
+        end_date = today
+    return start_date, end_date
+
+
 @login_required
 def create_report(request):
     """Создание отчета"""
     if request.method == 'POST':
         name = request.POST.get('name', 'Отчет')
         report_format = request.POST.get('format', 'pdf')
-        period_type = request.POST.get('period_type', 'month')
+        start_date, end_date = report_period(request.POST)
 
-        # Определение дат
-        today = timezone.now().date()
-        if period_type == 'day':
-            start_date = today
-            end_date = today
-        elif period_type == 'week':
-            start_date = today - timedelta(days=today.weekday())
-            end_date = today
-        elif period_type == 'month':
-            start_date = today.replace(day=1)
-            end_date = today
-        elif period_type == 'year':
-            start_date = today.replace(month=1, day=1)
-            end_date = today
-        elif period_type == 'custom':
-            start_date_str = request.POST.get('start_date')
-            end_date_str = request.POST.get('end_date')
-            if start_date_str:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            else:
-                start_date = today
-            if end_date_str:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            else:
-                end_date = today
-        else:
-            start_date = today
-            end_date = today
+        # mode=comparison - сравнение с предыдущим периодом и с тем же периодом год назад
+        comparison = request.POST.get('mode') == 'comparison'
 
         try:
-            if report_format == 'excel':
-                from .reports.excel_report import generate_excel_report
-                buffer = generate_excel_report(request.user, start_date, end_date)
-                filename = f'report_{start_date}_{end_date}.xlsx'
-                content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            else:  # pdf
-                from .reports.pdf_report import generate_pdf_report
-                buffer = generate_pdf_report(request.user, start_date, end_date)
-                filename = f'report_{start_date}_{end_date}.pdf'
-                content_type = 'application/pdf'
-
-            response = HttpResponse(buffer.getvalue(), content_type=content_type)
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
+            # Готовый файл берётся из кэша, если данные за период не менялись;
+            # pdf: detail=full - все операции за период, иначе первые 50
+            report = get_report(
+                request.user, 'excel' if report_format == 'excel' else 'pdf', start_date, end_date,
+                full_detail=request.POST.get('detail') == 'full',
+                comparison=comparison,
+            )
+            extension = 'xlsx' if report_format == 'excel' else 'pdf'
+            prefix = 'comparison' if comparison else 'report'
+            return FileResponse(
+                report.file,
+                as_attachment=True,
+                filename=f'{prefix}_{start_date}_{end_date}.{extension}',
+                content_type=report.content_type,
+            )
 
         except Exception as e:
             return HttpResponse(f"Ошибка генерации отчета: {str(e)}", status=500)
@@ -312,6 +380,68 @@ def create_report(request):
     return HttpResponse("Неверный запрос", status=400)
 
 
+def _job_status(job):
+    data = {
+        'id': job.id,
+        'status': job.status,
+        'progress': job.progress,
+        'error': job.error,
+        'status_url': reverse('finance:report_job_status', args=[job.id]),
+    }
+    if job.status == ReportJob.DONE:
+        data['download_url'] = reverse('finance:report_job_download', args=[job.id])
+    return data
+
+
+@login_required
+def submit_report_job(request):
+    """Постановка отчета в очередь: ответ сразу, отчет строит run_report_worker"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Неверный запрос'}, status=400)
+
+    report_format = 'excel' if request.POST.get('format') == 'excel' else 'pdf'
+    try:
+        start_date, end_date = report_period(request.POST)
+    except ValueError as e:
+        return JsonResponse({'error': f"Неверный период: {e}"}, status=400)
+
+    job = submit_job(
+        request.user, report_format, start_date, end_date,
+        full_detail=request.POST.get('detail') == 'full',
+        comparison=request.POST.get('mode') == 'comparison',
+    )
+    return JsonResponse(_job_status(job), status=202)
+
+
+@login_required
+def report_job_status(request, job_id):
+    """Статус и прогресс задания на отчет (JSON для опроса со страницы)"""
+    job = get_object_or_404(ReportJob, id=job_id, user=request.user)
+    return JsonResponse(_job_status(job))
+
+
+@login_required
+def report_job_download(request, job_id):
+    """Готовый файл задания - из SavedReport.file"""
+    job = get_object_or_404(ReportJob.objects.select_related('report'), id=job_id, user=request.user)
+    if job.status != ReportJob.DONE:
+        return HttpResponse("Отчет еще не готов", status=409)
+    if job.report is None or not job.report.has_file:
+        # Файл вытеснен из кэша отчетов - задание нужно отправить заново
+        return HttpResponse("Файл отчета удален, сформируйте отчет заново", status=410)
+
+    fileobj, content_type = open_report(job.report)
+    params = job.params
+    extension = 'xlsx' if job.report_format == 'excel' else 'pdf'
+    prefix = 'comparison' if params.get('mode') == 'comparison' else 'report'
+    return FileResponse(
+        fileobj,
+        as_attachment=True,
+        filename=f"{prefix}_{params['start_date']}_{params['end_date']}.{extension}",
+        content_type=content_type,
+    )
+
+
 @login_required
 def quick_reports(request):
     """Быстрые отчеты"""
@@ -336,20 +466,69 @@ def quick_reports(request):
         return HttpResponse("Неверный тип отчета", status=400)
 
     try:
-        if format_type == 'excel':
-            from .reports.excel_report import generate_excel_report
-            buffer = generate_excel_report(request.user, start_date, end_date)
-            filename = f'{report_type}_report.xlsx'
-            content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        else:  # pdf
-            from .reports.pdf_report import generate_pdf_report
-            buffer = generate_pdf_report(request.user, start_date, end_date)
-            filename = f'{report_type}_report.pdf'
-            content_type = 'application/pdf'
-
-        response = HttpResponse(buffer.getvalue(), content_type=content_type)
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        # Готовый файл берётся из кэша, если данные за период не менялись;
+        # pdf: detail=full - все операции за период, иначе первые 50
+        report = get_report(
+            request.user, 'excel' if format_type == 'excel' else 'pdf', start_date, end_date,
+            full_detail=request.GET.get('detail') == 'full',
+        )
+        extension = 'xlsx' if format_type == 'excel' else 'pdf'
+        return FileResponse(
+            report.file,
+            as_attachment=True,
+            filename=f'{report_type}_report.{extension}',
+            content_type=report.content_type,
+        )
 
     except Exception as e:
-        return HttpResponse(f"Ошибка генерации отчета: {str(e)}", status=500)
\ No newline at end of file
+        return HttpResponse(f"Ошибка генерации отчета: {str(e)}", status=500)
+
+@login_required
+def export_bundle(request):
+    """Архив за год: PDF по месяцам, Excel за год и CSV операций - ZIP потоком (finance.report_bundle)"""
+    from .report_bundle import year_bundle
+
+    today = timezone.now().date()
+    try:
+        year = int(request.GET.get('year', today.year))
+    except ValueError:
+        return HttpResponse("Неверный год", status=400)
+    if not 2000 <= year <= today.year:
+        return HttpResponse("Неверный год", status=400)
+
+    # Размер архива заранее неизвестен - без Content-Length, записи уходят по мере готовности
+    response = StreamingHttpResponse(year_bundle(request.user, year), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="fincontrol_{year}.zip"'
+    return response
+
+@login_required
+def import_transactions(request):
+    """Массовый импорт операций из банковской выписки (CSV/XLSX)"""
+    result = None
+    if request.method == 'POST':
+        form = StatementImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            from .imports import import_statement
+            upload = form.cleaned_data['file']
+            default_category = form.cleaned_data['default_category']
+            try:
+                # Большие загрузки Django держит во временном файле, импорт читает его построчно
+                result = import_statement(
+                    request.user, upload,
+                    filename=upload.name,
+                    file_format=form.cleaned_data['file_format'] or None,
+                    default_category=default_category.name if default_category else None,
+                )
+            except ValueError as e:
+                messages.error(request, f"Ошибка импорта: {e}")
+            else:
+                level = messages.SUCCESS if not result.rejected else messages.WARNING
+                messages.add_message(
+                    request, level,
+                    f"Импортировано операций: {result.imported} из {result.total}, "
+                    f"отклонено: {result.rejected} ({result.rows_per_sec:.0f} строк/с)"
+                )
+    else:
+        form = StatementImportForm()
+
+    return render(request, 'finance/import_form.html', {'form': form, 'result': result})
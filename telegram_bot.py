@@ -14,7 +14,7 @@ from aiogram.filters import Command
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.memory import MemoryStorage
-from datetime import datetime, timedelta # Для работы с датами
+from datetime import date, datetime, timedelta # Для работы с датами
 import re
 from asgiref.sync import sync_to_async
 from decouple import config
@@ -25,8 +25,15 @@ import tempfile # <-- Добавляем импорт tempfile для созда
 # Теперь можно импортировать модели Django
 from django.contrib.auth.models import User
 from django.conf import settings
-from django.db.models import Sum, Q # Для агрегации (суммы) и фильтрации
 from finance.models import Transaction, Category, UserConsent
+from finance.summaries import PeriodSummary
+from finance.comparison import PeriodComparison
+from finance.report_cache import get_report
+from finance.categories import category_registry
+from finance.columnar import columnar_cache
+from finance.ledger import balance_at
+from finance.search import search_transactions
+from finance.db_router import reads_from_replica
 
 # Получаем токен бота из переменной окружения (например, из файла .env)
 BOT_TOKEN = config('BOT_TOKEN')
@@ -82,30 +89,15 @@ def parse_year(year_str: str):
     return start, end
 
 # Добавляем функцию годового графика
-def generate_yearly_chart(transactions_list):
+def generate_yearly_chart(year_series):
     """
     Генерирует график доходов/расходов по месяцам за год.
-    transactions_list: Список транзакций за год.
+    year_series: помесячный ряд analytics.series(..., granularity='month').
     Возвращает байтовый объект с изображением.
     """
-    from collections import defaultdict
-
-    income_by_month = defaultdict(float)
-    expense_by_month = defaultdict(float)
-
-    for t in transactions_list:
-        month_key = t.date.strftime('%m.%Y')  # Например: '10.2025'
-        if t.type == 'income':
-            income_by_month[month_key] += float(t.amount)
-        elif t.type == 'expense':
-            expense_by_month[month_key] += float(t.amount)
-
-    # Сортируем месяцы по дате
-    all_months = sorted(set(income_by_month.keys()) | set(expense_by_month.keys()),
-                        key=lambda x: datetime.strptime(x, '%m.%Y'))
-
-    income_values = [income_by_month[m] for m in all_months]
-    expense_values = [expense_by_month[m] for m in all_months]
+    all_months = year_series.labels()
+    income_values = year_series.get('income')
+    expense_values = year_series.get('expense')
 
     plt.figure(figsize=(12, 6))
     plt.plot(all_months, income_values, label='Доходы', marker='o')
@@ -199,16 +191,6 @@ def is_consent_valid(user):
     except UserConsent.DoesNotExist:
         return False
 
-@sync_to_async
-def get_expenses_for_user_and_period(user, start_date, end_date):
-    #Получить расходы (только type='expense') для пользователя в диапазоне дат.
-    return Transaction.objects.filter(
-        user=user,
-        type='expense', # Только расходы
-        date__gte=start_date,
-        date__lte=end_date
-    )
-
 @sync_to_async
 def get_or_create_django_user(telegram_id: int, username: str = None):
     """
@@ -245,48 +227,81 @@ def get_or_create_django_user(telegram_id: int, username: str = None):
             return user
 
 @sync_to_async
-def get_transactions_for_user_and_date(user, date):
-    """Получить транзакции для пользователя за конкретную дату."""
-    return Transaction.objects.filter(user=user, date=date)
+@reads_from_replica
+def get_period_summary(user, start_date=None, end_date=None, category=None):
+    """Сводка пользователя за период - свёртка колоночного кэша (finance.columnar), без запросов к БД."""
+    category_ids = [category.pk] if category is not None else None
+    return PeriodSummary.from_columns(columnar_cache.window(user, start_date, end_date, category_ids))
 
 @sync_to_async
-def get_transactions_for_user_and_date_range(user, start_date, end_date):
-    """Получить транзакции для пользователя в диапазоне дат."""
-    return Transaction.objects.filter(
-        user=user,
-        date__gte=start_date,
-        date__lte=end_date
-    )
+@reads_from_replica
+def get_balance_at(user, date):
+    """Остаток на счёте на конец дня: одна выборка из нарастающего итога (finance.ledger)."""
+    return balance_at(user, date)
 
 @sync_to_async
-def get_transactions_for_user_and_week(user, start_of_week, end_of_week):
-    """Получить транзакции для пользователя за неделю."""
-    return Transaction.objects.filter(
-        user=user,
-        date__gte=start_of_week,
-        date__lte=end_of_week
-    )
+@reads_from_replica
+def get_series(user, start_date, end_date, granularity='day', split_by='type', type=None):
+    """Временной ряд для графиков по колоночному кэшу - тот же результат, что analytics.series."""
+    window = columnar_cache.window(user, start_date, end_date)
+    return window.series(granularity=granularity, split_by=split_by, type=type)
 
 @sync_to_async
-def get_transactions_for_user_and_category(user, category):
-    """Получить транзакции для пользователя по категории."""
-    return Transaction.objects.filter(user=user, category=category)
+@reads_from_replica
+def get_window(user, start_date, end_date):
+    """Операции за период из колоночного кэша (finance.columnar): массивы вместо объектов модели."""
+    return columnar_cache.window(user, start_date, end_date)
+
+@sync_to_async
+@reads_from_replica
+def get_comparison(user, start_date, end_date):
+    """Сравнение с предыдущим периодом и годом ранее - один запрос к дневным сводкам (finance.comparison)."""
+    return PeriodComparison.for_period(user, start_date, end_date)
+
+@sync_to_async
+def get_comparison_file(user, start_date, end_date, report_format):
+    """Файл сравнения (PDF/Excel) из кэша отчётов или построенный заново."""
+    report = get_report(user, report_format, start_date, end_date, comparison=True)
+    with report.file as fileobj:
+        return fileobj.read()
+
+@sync_to_async
+@reads_from_replica
+def find_transactions(user, query, page=1):
+    """Поиск по описаниям операций (finance.search): страница результатов по релевантности."""
+    return search_transactions(user, query, page=page)
 
 @sync_to_async
 def get_category_by_name(name):
-    """Получить категорию по имени."""
-    return Category.objects.get(name=name)
+    """Получить категорию по имени (без учёта регистра) из реестра категорий."""
+    category = category_registry.by_name(name)
+    if category is None:
+        raise Category.DoesNotExist(f"Категория '{name}' не найдена")
+    return category
+
+@sync_to_async
+def get_category_by_id(category_id):
+    """Получить категорию по id из реестра категорий."""
+    category = category_registry.get(category_id)
+    if category is None:
+        raise Category.DoesNotExist(f"Категория с id={category_id} не найдена")
+    return category
+
+@sync_to_async
+def get_all_categories():
+    """Все категории (по названию) из реестра категорий."""
+    return category_registry.all()
 
 # Функция create_transaction
 @sync_to_async
 def create_transaction(user, amount, date, type, category_id, description):
-    category = Category.objects.get(id=category_id)
+    # Категория уже проверена через реестр - повторно из БД её не читаем
     return Transaction.objects.create(
         user=user,
         amount=amount,
         date=date,
         type=type,
-        category=category,
+        category_id=category_id,
         description=description
     )
 
@@ -295,32 +310,16 @@ def create_transaction(user, amount, date, type, category_id, description):
 
 
 
-def generate_weekly_chart(transactions_list):
+def generate_weekly_chart(week_series):
     """
     Генерирует график доходов/расходов за неделю.
-    transactions_list: Список объектов Transaction за неделю.
+    week_series: дневной ряд analytics.series(..., granularity='day') за неделю.
     Возвращает путь к файлу изображения или байтовый объект.
     """
-    # Подготовка данных
-    # Группируем по дате и типу
-    from collections import defaultdict
-    income_by_day = defaultdict(float)
-    expense_by_day = defaultdict(float)
-
-    # Теперь итерируемся по списку, а не по QuerySet
-    for t in transactions_list:
-        date_str = t.date.strftime('%d.%m') # Форматируем дату для подписи
-        if t.type == 'income':
-            income_by_day[date_str] += float(t.amount)
-        elif t.type == 'expense':
-            expense_by_day[date_str] += float(t.amount)
-
-    # Сортируем дни по дате
-    all_dates = sorted(set(income_by_day.keys()) | set(expense_by_day.keys()))
-
-    # Подготавливаем списки для графика
-    income_values = [income_by_day[date] for date in all_dates]
-    expense_values = [expense_by_day[date] for date in all_dates]
+    # Группировка по дням уже выполнена в БД, ряд дополнен нулями
+    all_dates = week_series.labels()
+    income_values = week_series.get('income')
+    expense_values = week_series.get('expense')
 
     # Создание графика
     plt.figure(figsize=(10, 6))
@@ -342,34 +341,16 @@ def generate_weekly_chart(transactions_list):
 
     return img_buffer
 
-def generate_monthly_chart(transactions_list):
+def generate_monthly_chart(month_series):
     """
     Генерирует график доходов/расходов за месяц.
-    transactions_list: Список объектов Transaction за месяц.
+    month_series: дневной ряд analytics.series(..., granularity='day') за месяц.
     Возвращает байтовый объект с изображением графика.
     """
-    from collections import defaultdict
-    from datetime import datetime
-
-    # Подготовка данных
-    # Группируем по дню месяца (1-31) и типу
-    income_by_day = defaultdict(float)
-    expense_by_day = defaultdict(float)
-
-    for t in transactions_list:
-        # Используем день месяца (1-31) как ключ для группировки
-        day_key = t.date.strftime('%d.%m') # Форматируем как день.месяц для подписи
-        if t.type == 'income':
-            income_by_day[day_key] += float(t.amount)
-        elif t.type == 'expense':
-            expense_by_day[day_key] += float(t.amount)
-
-    # Сортируем дни по дате (в пределах месяца)
-    all_dates = sorted(set(income_by_day.keys()) | set(expense_by_day.keys()))
-
-    # Подготавливаем списки для графика
-    income_values = [income_by_day[date] for date in all_dates]
-    expense_values = [expense_by_day[date] for date in all_dates]
+    # Группировка по дням уже выполнена в БД, ряд дополнен нулями
+    all_dates = month_series.labels()
+    income_values = month_series.get('income')
+    expense_values = month_series.get('expense')
 
     # Создание графика
     plt.figure(figsize=(12, 6)) # Шире для месяцев
@@ -391,22 +372,14 @@ def generate_monthly_chart(transactions_list):
 
     return img_buffer
 
-def generate_category_pie_chart(expenses_list):
+def generate_category_pie_chart(category_series):
     """
     Генерирует круговую диаграмму расходов по категориям.
-    expenses_list: Список объектов Transaction (только расходы).
+    category_series: ряд расходов analytics.series(..., split_by='category', type='expense').
     Возвращает байтовый объект с изображением диаграммы.
     """
-    from collections import defaultdict
-    # Подготовка данных
-    # Группируем расходы по категориям
-    expenses_by_category = defaultdict(float)
-
-    for t in expenses_list:
-        category_name = t.category.name
-        expenses_by_category[category_name] += float(t.amount)
-
-    # Подготавливаем списки для диаграммы
+    # Итоги по категориям за период (пустые категории не показываем)
+    expenses_by_category = {name: total for name, total in category_series.totals().items() if total}
     categories = list(expenses_by_category.keys())
     values = list(expenses_by_category.values())
 
@@ -431,17 +404,18 @@ def generate_category_pie_chart(expenses_list):
 
     return img_buffer
 
-def generate_advice(transactions_list):
+def generate_advice(window):
     """
-    Генерирует простой совет или предупреждение на основе списка транзакций.
-    transactions_list: Список объектов Transaction.
+    Генерирует простой совет или предупреждение по операциям за период.
+    window: срез колоночного кэша операций (finance.columnar.ColumnWindow) -
+    все показатели считаются векторными свёртками массивов, без обхода объектов.
     Возвращает строку с советом или None, если совет не применим.
     """
-    if not transactions_list:
+    if window.is_empty():
         return None
 
-    total_expense = sum(float(t.amount) for t in transactions_list if t.type == 'expense')
-    total_income = sum(float(t.amount) for t in transactions_list if t.type == 'income')
+    total_expense = float(window.expense)
+    total_income = float(window.income)
     balance = total_income - total_expense
 
     advice_parts = []
@@ -455,30 +429,21 @@ def generate_advice(transactions_list):
         advice_parts.append("💡 Постарайтесь сократить расходы. Они составляют более 80% от доходов.")
 
     # Пример 3: Найти самую "дорогую" категорию расходов
-    from collections import defaultdict
-    expenses_by_category = defaultdict(float)
-    for t in transactions_list:
-        if t.type == 'expense':
-            expenses_by_category[t.category.name] += float(t.amount)
-
+    expenses_by_category = window.by_category('expense')  # {id категории: копейки}
     if expenses_by_category:
-        most_expensive_category = max(expenses_by_category, key=expenses_by_category.get)
-        most_expensive_amount = expenses_by_category[most_expensive_category]
+        most_expensive_id = max(expenses_by_category, key=expenses_by_category.get)
+        most_expensive_category = category_registry.name(most_expensive_id)
+        most_expensive_amount = expenses_by_category[most_expensive_id] / 100
         advice_parts.append(f"📊 Самая большая статья расходов за период: '{most_expensive_category}' ({most_expensive_amount:.2f}).")
 
     # Пример 4: Проверить, есть ли аномально высокие траты за один день
-    daily_expenses = defaultdict(float)
-    for t in transactions_list:
-        if t.type == 'expense':
-            day_key = t.date
-            daily_expenses[day_key] += float(t.amount)
-
-    if daily_expenses:
-        max_daily_expense = max(daily_expenses.values())
+    expense_days, daily_expenses = window.by_day('expense')
+    if len(daily_expenses):
+        max_daily_expense = daily_expenses.max() / 100
         # Простая эвристика: если максимальная дневная трата больше средней дневной в 3 раза
-        avg_daily_expense = sum(daily_expenses.values()) / len(daily_expenses) if daily_expenses else 0
+        avg_daily_expense = daily_expenses.mean() / 100
         if avg_daily_expense > 0 and max_daily_expense > avg_daily_expense * 3:
-            expensive_day = [day for day, amount in daily_expenses.items() if amount == max_daily_expense][0]
+            expensive_day = date.fromordinal(int(expense_days[daily_expenses.argmax()]))
             advice_parts.append(f"⚠️ Аномалия: {expensive_day.strftime('%d.%m.%Y')} вы потратили {max_daily_expense:.2f}, что намного больше среднего дневного расхода ({avg_daily_expense:.2f}). Проверьте, что это была одноразовая покупка.")
 
     if advice_parts:
@@ -486,8 +451,6 @@ def generate_advice(transactions_list):
     else:
         return "Всё в порядке! У вас здоровая финансовая активность."
 
-    return None # Если не нужно возвращать "всё в порядке", просто return ""
-
 
 # --- Обработчики команд ---
 
@@ -820,8 +783,8 @@ async def process_date(message: types.Message, state: FSMContext):
 
     await state.update_data(date=parsed_date)
 
-    # Получаем список категорий из БД
-    categories = await sync_to_async(list)(Category.objects.all())
+    # Получаем список категорий из реестра (без запроса к БД)
+    categories = await get_all_categories()
     if not categories:
         await message.answer("❌ В системе нет категорий. Обратитесь к администратору.")
         await state.clear()
@@ -841,7 +804,12 @@ async def process_date(message: types.Message, state: FSMContext):
 async def process_category(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     category_id = int(callback.data.split(":", 1)[1])
-    category = await sync_to_async(Category.objects.get)(id=category_id)
+    try:
+        category = await get_category_by_id(category_id)
+    except Category.DoesNotExist:
+        await callback.message.answer("❌ Категория не найдена. Попробуйте ещё раз: /add")
+        await state.clear()
+        return
     await state.update_data(category_id=category.id, category_name=category.name)
     await callback.message.edit_text(f"Категория выбрана: {category.name}")
 
@@ -913,19 +881,18 @@ async def process_day_input(message: types.Message, state: FSMContext):
         return
 
     user = await get_or_create_django_user(message.from_user.id, message.from_user.username)
-    transactions = await get_transactions_for_user_and_date(user, target_date)
-    transactions_list = await sync_to_async(list)(transactions)
+    window = await get_window(user, target_date, target_date)
 
-    if not transactions_list:
+    if window.is_empty():
         await message.answer(f"📭 Нет транзакций за {target_date.strftime('%d.%m.%Y')}.")
     else:
-        expenses = [t for t in transactions_list if t.type == 'expense']
-        chart_buffer = await sync_to_async(generate_category_pie_chart)(expenses or [])
+        chart_series = await get_series(user, target_date, target_date, split_by='category', type='expense')
+        chart_buffer = await sync_to_async(generate_category_pie_chart)(chart_series)
         await message.answer_photo(
             photo=types.BufferedInputFile(chart_buffer.read(), filename=f"day_{target_date}.png"),
             caption=f"📊 Отчёт за {target_date.strftime('%d.%m.%Y')}"
         )
-        advice = await sync_to_async(generate_advice)(transactions_list)
+        advice = await sync_to_async(generate_advice)(window)
         if advice:
             await message.answer(advice)
 
@@ -970,18 +937,18 @@ async def process_week_input(message: types.Message, state: FSMContext):
         return
 
     user = await get_or_create_django_user(message.from_user.id, message.from_user.username)
-    transactions = await get_transactions_for_user_and_date_range(user, start_date, end_date)
-    transactions_list = await sync_to_async(list)(transactions)
+    window = await get_window(user, start_date, end_date)
 
-    if not transactions_list:
+    if window.is_empty():
         await message.answer(f"📭 Нет транзакций за неделю с {start_date.strftime('%d.%m.%Y')} по {end_date.strftime('%d.%m.%Y')}.")
     else:
-        chart_buffer = await sync_to_async(generate_weekly_chart)(transactions_list)
+        chart_series = await get_series(user, start_date, end_date)
+        chart_buffer = await sync_to_async(generate_weekly_chart)(chart_series)
         await message.answer_photo(
             photo=types.BufferedInputFile(chart_buffer.read(), filename=f"week_{start_date}.png"),
             caption=f"📈 Отчёт за неделю\n{start_date.strftime('%d.%m.%Y')} – {end_date.strftime('%d.%m.%Y')}"
         )
-        advice = await sync_to_async(generate_advice)(transactions_list)
+        advice = await sync_to_async(generate_advice)(window)
         if advice:
             await message.answer(advice)
 
@@ -994,19 +961,16 @@ async def send_today_stats(message: types.Message, state: FSMContext):
         return
     user = await get_or_create_django_user(message.from_user.id, message.from_user.username)
     today = datetime.now().date()
-    transactions = await get_transactions_for_user_and_date(user, today)
+    summary = await get_period_summary(user, today, today)
+    total_income, total_expense = summary.income, summary.expense
 
-    total_expense = await sync_to_async(
-        lambda: transactions.filter(type='expense').aggregate(Sum('amount'))['amount__sum'] or 0
-    )()
-    total_income = await sync_to_async(
-        lambda: transactions.filter(type='income').aggregate(Sum('amount'))['amount__sum'] or 0
-    )()
+    closing_balance = await get_balance_at(user, today)
 
     response_text = f"Статистика за сегодня ({today.strftime('%d.%m.%Y')}):\n"
     response_text += f"Доходы: {total_income:.2f}\n"
     response_text += f"Расходы: {total_expense:.2f}\n"
-    response_text += f"Баланс: {total_income - total_expense:.2f}"
+    response_text += f"Баланс: {total_income - total_expense:.2f}\n"
+    response_text += f"Остаток на счёте: {closing_balance:.2f}"
 
     await message.reply(response_text)
 
@@ -1022,32 +986,19 @@ async def send_week_stats(message: types.Message, state: FSMContext):
     # Конец недели (включительно сегодня)
     end_of_week = today
 
-    transactions = await get_transactions_for_user_and_week(user, start_of_week, end_of_week)
+    summary = await get_period_summary(user, start_of_week, end_of_week)
+    total_income, total_expense = summary.income, summary.expense
 
-    total_expense = await sync_to_async(
-        lambda: transactions.filter(type='expense').aggregate(Sum('amount'))['amount__sum'] or 0
-    )()
-    total_income = await sync_to_async(
-        lambda: transactions.filter(type='income').aggregate(Sum('amount'))['amount__sum'] or 0
-    )()
+    closing_balance = await get_balance_at(user, end_of_week)
 
     response_text = f"Статистика за неделю ({start_of_week.strftime('%d.%m.%Y')} - {end_of_week.strftime('%d.%m.%Y')}):\n"
     response_text += f"Доходы: {total_income:.2f}\n"
     response_text += f"Расходы: {total_expense:.2f}\n"
-    response_text += f"Баланс: {total_income - total_expense:.2f}"
+    response_text += f"Баланс: {total_income - total_expense:.2f}\n"
+    response_text += f"Остаток на счёте: {closing_balance:.2f}"
 
     await message.reply(response_text)
 
-# Для вызова в send_week_stats
-@sync_to_async
-def get_transactions_for_user_and_week(user, start_of_week, end_of_week):
-    """Получить транзакции для пользователя за неделю."""
-    return Transaction.objects.filter(
-        user=user,
-        date__gte=start_of_week,
-        date__lte=end_of_week
-    )
-
 # Статистика по категории
 @dp.message(Command(commands=['category']))
 async def send_category_stats(message: types.Message, state: FSMContext):
@@ -1068,16 +1019,9 @@ async def send_category_stats(message: types.Message, state: FSMContext):
         await message.reply(f"Категория '{category_name}' не найдена.")
         return
 
-    # Фильтруем транзакции по пользователю и категории за всё время (можно добавить фильтр по дате)
-    # Пока за всё время для простоты
-    transactions = await get_transactions_for_user_and_category(user, category)
-
-    total_expense = await sync_to_async(
-        lambda: transactions.filter(type='expense').aggregate(Sum('amount'))['amount__sum'] or 0
-    )()
-    total_income = await sync_to_async(
-        lambda: transactions.filter(type='income').aggregate(Sum('amount'))['amount__sum'] or 0
-    )()
+    # Статистика по категории за всё время (можно добавить фильтр по дате) - из колоночного кэша
+    summary = await get_period_summary(user, category=category)
+    total_income, total_expense = summary.income, summary.expense
 
     response_text = f"Статистика по категории '{category_name}':\n"
     response_text += f"Доходы: {total_income:.2f}\n"
@@ -1086,6 +1030,130 @@ async def send_category_stats(message: types.Message, state: FSMContext):
 
     await message.reply(response_text)
 
+# Сравнение периодов
+def format_change(row, base):
+    """'+50.00 (+11.1%)' - изменение текущего значения относительно base ('previous' или 'year_ago')."""
+    delta = row.delta_previous if base == 'previous' else row.delta_year_ago
+    percent = row.change_previous if base == 'previous' else row.change_year_ago
+    return f"{delta:+.2f}" if percent is None else f"{delta:+.2f} ({percent:+.1f}%)"
+
+def format_comparison(comparison, limit=10):
+    """Текст для /compare: итоги и крупнейшие категории расходов."""
+    lines = [
+        f"📊 Сравнение за {comparison.period_label('current')}",
+        f"Предыдущий период: {comparison.period_label('previous')}",
+        f"Год назад: {comparison.period_label('year_ago')}",
+        "",
+    ]
+    for type, title in (('income', '💵 Доходы'), ('expense', '💸 Расходы')):
+        row = comparison.total(type)
+        lines.append(
+            f"{title}: {row.current:.2f} | к пред.: {format_change(row, 'previous')} | "
+            f"к году назад: {format_change(row, 'year_ago')}"
+        )
+
+    categories = comparison.by_category('expense')[:limit]
+    if categories:
+        lines.append("")
+        lines.append("Расходы по категориям:")
+        for row in categories:
+            lines.append(
+                f"• {row.label}: {row.current:.2f} | {format_change(row, 'previous')} | {format_change(row, 'year_ago')}"
+            )
+    return "\n".join(lines)
+
+@dp.message(Command(commands=['compare']))
+async def send_comparison(message: types.Message, state: FSMContext):
+    if not await check_consent_or_block(message, state):
+        return
+    # /compare [week|month|year|ММ.ГГГГ] [pdf|excel]
+    args = message.text.split()[1:]
+    report_format = None
+    if args and args[-1].lower() in ('pdf', 'excel'):
+        report_format = args.pop().lower()
+    period = args[0].lower() if args else 'month'
+
+    today = datetime.now().date()
+    try:
+        if period == 'week':
+            start_date, end_date = today - timedelta(days=today.weekday()), today
+        elif period == 'month':
+            start_date, end_date = today.replace(day=1), today
+        elif period == 'year':
+            start_date, end_date = today.replace(month=1, day=1), today
+        else:
+            start_date, end_date = parse_month(period)
+    except ValueError:
+        await message.reply("Пример: /compare month, /compare week, /compare 09.2025 или /compare month pdf")
+        return
+
+    user = await get_or_create_django_user(message.from_user.id, message.from_user.username)
+    comparison = await get_comparison(user, start_date, end_date)
+    if comparison.is_empty():
+        await message.reply("Нет операций ни в этом периоде, ни в предыдущем, ни год назад.")
+        return
+    await message.reply(format_comparison(comparison))
+
+    if report_format:
+        content = await get_comparison_file(user, start_date, end_date, report_format)
+        extension = 'xlsx' if report_format == 'excel' else 'pdf'
+        await message.answer_document(
+            document=types.BufferedInputFile(content, filename=f"comparison_{start_date}_{end_date}.{extension}"),
+        )
+
+# Поиск операций по описанию
+def format_search_results(query, page):
+    """Текст и клавиатура листания для страницы результатов /search."""
+    lines = [f"🔎 Результаты по запросу «{query}» (стр. {page.number}):"]
+    for transaction in page.object_list:
+        sign = '+' if transaction.type == 'income' else '-'
+        lines.append(
+            f"{transaction.date.strftime('%d.%m.%Y')} {sign}{transaction.amount:.2f} "
+            f"{transaction.category.name}: {transaction.description}"
+        )
+
+    builder = InlineKeyboardBuilder()
+    if page.has_previous:
+        builder.button(text="⬅️ Назад", callback_data=f"search:{page.number - 1}")
+    if page.has_next:
+        builder.button(text="Ещё ➡️", callback_data=f"search:{page.number + 1}")
+    return "\n".join(lines), builder.as_markup() if page.has_previous or page.has_next else None
+
+@dp.message(Command(commands=['search']))
+async def search_transactions_command(message: types.Message, state: FSMContext):
+    if not await check_consent_or_block(message, state):
+        return
+    # Команда /search кофе
+    command_args = message.text.split(maxsplit=1)
+    if len(command_args) < 2 or not command_args[1].strip():
+        await message.reply("Укажите, что искать в описаниях операций. Пример: /search кофе")
+        return
+
+    query = command_args[1].strip()
+    user = await get_or_create_django_user(message.from_user.id, message.from_user.username)
+    page = await find_transactions(user, query)
+    if not page.object_list:
+        await message.reply(f"Ничего не найдено по запросу «{query}».")
+        return
+
+    # Запрос хранится в состоянии - в callback_data помещается только номер страницы
+    await state.update_data(search_query=query)
+    text, markup = format_search_results(query, page)
+    await message.reply(text, reply_markup=markup)
+
+@dp.callback_query(lambda c: c.data.startswith("search:"))
+async def handle_search_page(callback: CallbackQuery, state: FSMContext):
+    await callback.answer()
+    query = (await state.get_data()).get('search_query')
+    if not query:
+        await callback.message.answer("Поиск устарел. Повторите команду /search.")
+        return
+
+    user = await get_or_create_django_user(callback.from_user.id, callback.from_user.username)
+    page = await find_transactions(user, query, page=int(callback.data.split(":", 1)[1]))
+    text, markup = format_search_results(query, page)
+    await callback.message.edit_text(text, reply_markup=markup)
+
 # Обработчик кнопки "Стат_месяц"
 @dp.message(lambda msg: msg.text == "Стат_месяц")
 async def stat_month_menu(message: types.Message):
@@ -1125,20 +1193,20 @@ async def handle_predefined_month(callback: CallbackQuery):
         return
 
     user = await get_or_create_django_user(callback.from_user.id, callback.from_user.username)
-    transactions = await get_transactions_for_user_and_date_range(user, start_date, end_date)
-    transactions_list = await sync_to_async(list)(transactions)
+    window = await get_window(user, start_date, end_date)
 
-    if not transactions_list:
+    if window.is_empty():
         await callback.message.answer(f"📭 Нет транзакций за {month_str}.")
         return
 
-    chart_buffer = await sync_to_async(generate_monthly_chart)(transactions_list)
+    chart_series = await get_series(user, start_date, end_date)
+    chart_buffer = await sync_to_async(generate_monthly_chart)(chart_series)
     await callback.message.answer_photo(
         photo=types.BufferedInputFile(chart_buffer.read(), filename=f"month_{month_str}.png"),
         caption=f"📈 Отчёт за {month_str}"
     )
 
-    advice = await sync_to_async(generate_advice)(transactions_list)
+    advice = await sync_to_async(generate_advice)(window)
     if advice:
         await callback.message.answer(advice)
 
@@ -1157,18 +1225,18 @@ async def process_month_input(message: types.Message, state: FSMContext):
         return  # Остаёмся в том же состоянии — ждём правильный ввод
 
     user = await get_or_create_django_user(message.from_user.id, message.from_user.username)
-    transactions = await get_transactions_for_user_and_date_range(user, start_date, end_date)
-    transactions_list = await sync_to_async(list)(transactions)
+    window = await get_window(user, start_date, end_date)
 
-    if not transactions_list:
+    if window.is_empty():
         await message.answer(f"📭 Нет транзакций за {month_str}.")
     else:
-        chart_buffer = await sync_to_async(generate_monthly_chart)(transactions_list)
+        chart_series = await get_series(user, start_date, end_date)
+        chart_buffer = await sync_to_async(generate_monthly_chart)(chart_series)
         await message.answer_photo(
             photo=types.BufferedInputFile(chart_buffer.read(), filename=f"month_{month_str}.png"),
             caption=f"📈 Отчёт за {month_str}"
         )
-        advice = await sync_to_async(generate_advice)(transactions_list)
+        advice = await sync_to_async(generate_advice)(window)
         if advice:
             await message.answer(advice)
 
@@ -1250,25 +1318,22 @@ async def send_weekly_graph(message: types.Message, state: FSMContext):
     # Конец недели (включительно сегодня)
     end_of_week = today
 
-    # Получаем QuerySet и *выполняем* его с помощью sync_to_async
-    transactions_queryset = await get_transactions_for_user_and_week(user, start_of_week, end_of_week)
-    # Теперь нужно получить список объектов, выполнив запрос
-    # Оборачиваем .list() в sync_to_async
-    transactions_list = await sync_to_async(list)(transactions_queryset)
+    # Операции за неделю - срез колоночного кэша (finance.columnar)
+    window = await get_window(user, start_of_week, end_of_week)
 
-    if not transactions_list: # Проверяем длину списка, а не QuerySet
+    if window.is_empty():
         await message.reply("За эту неделю нет транзакций для отображения графика.")
         return
 
-    # Передаём *список* объектов в синхронную функцию
     # Оборачиваем вызов generate_weekly_chart в sync_to_async
-    chart_buffer = await sync_to_async(generate_weekly_chart)(transactions_list)
+    chart_series = await get_series(user, start_of_week, end_of_week)
+    chart_buffer = await sync_to_async(generate_weekly_chart)(chart_series)
 
     # Отправляем изображение
     await message.answer_photo(photo=types.BufferedInputFile(chart_buffer.read(), filename="weekly_chart.png"))
 
     # Генерируем и отправляем совет
-    advice_text = await sync_to_async(generate_advice)(transactions_list)
+    advice_text = await sync_to_async(generate_advice)(window)
     if advice_text:
         await message.answer(advice_text)
 
@@ -1286,22 +1351,22 @@ async def send_monthly_graph(message: types.Message, state: FSMContext):
     # Конец месяца - это сегодня
     end_of_month = today
 
-    # Получаем QuerySet и *выполняем* его
-    transactions_queryset = await get_transactions_for_user_and_date_range(user, start_of_month, end_of_month)
-    transactions_list = await sync_to_async(list)(transactions_queryset)
+    # Операции за месяц - окно колоночного кэша
+    window = await get_window(user, start_of_month, end_of_month)
 
-    if not transactions_list: # Проверяем длину списка
+    if window.is_empty():
         await message.reply("За этот месяц нет транзакций для отображения графика.")
         return
 
-    # Передаём *список* объектов в синхронную функцию
-    chart_buffer = await sync_to_async(generate_monthly_chart)(transactions_list)
+    # Ряд по дням - по колоночному кэшу (тот же результат, что analytics.series)
+    chart_series = await get_series(user, start_of_month, end_of_month)
+    chart_buffer = await sync_to_async(generate_monthly_chart)(chart_series)
 
     # Отправляем изображение
     await message.answer_photo(photo=types.BufferedInputFile(chart_buffer.read(), filename="monthly_chart.png"))
 
     # Генерируем и отправляем совет
-    advice_text = await sync_to_async(generate_advice)(transactions_list)
+    advice_text = await sync_to_async(generate_advice)(window)
     if advice_text:
         await message.answer(advice_text)
 
@@ -1341,20 +1406,20 @@ async def handle_month_selection(callback: CallbackQuery):
         await callback.message.answer("Ошибка: неверный формат месяца.")
         return
 
-    transactions = await get_transactions_for_user_and_date_range(user, start_date, end_date)
-    transactions_list = await sync_to_async(list)(transactions)
+    window = await get_window(user, start_date, end_date)
 
-    if not transactions_list:
+    if window.is_empty():
         await callback.message.answer(f"Нет транзакций за {month_str}.")
         return
 
-    chart_buffer = await sync_to_async(generate_monthly_chart)(transactions_list)
+    chart_series = await get_series(user, start_date, end_date)
+    chart_buffer = await sync_to_async(generate_monthly_chart)(chart_series)
     await callback.message.answer_photo(
         photo=types.BufferedInputFile(chart_buffer.read(), filename=f"month_{month_str}.png"),
         caption=f"📈 График за {month_str}"
     )
 
-    advice = await sync_to_async(generate_advice)(transactions_list)
+    advice = await sync_to_async(generate_advice)(window)
     if advice:
         await callback.message.answer(advice)
 
@@ -1371,20 +1436,19 @@ async def handle_predefined_day(callback: CallbackQuery):
         return
 
     user = await get_or_create_django_user(callback.from_user.id, callback.from_user.username)
-    transactions = await get_transactions_for_user_and_date(user, target_date)
-    transactions_list = await sync_to_async(list)(transactions)
+    window = await get_window(user, target_date, target_date)
 
-    if not transactions_list:
+    if window.is_empty():
         await callback.message.answer(f"📭 Нет транзакций за {target_date.strftime('%d.%m.%Y')}.")
         return
 
-    expenses = [t for t in transactions_list if t.type == 'expense']
-    chart_buffer = await sync_to_async(generate_category_pie_chart)(expenses or [])
+    chart_series = await get_series(user, target_date, target_date, split_by='category', type='expense')
+    chart_buffer = await sync_to_async(generate_category_pie_chart)(chart_series)
     await callback.message.answer_photo(
         photo=types.BufferedInputFile(chart_buffer.read(), filename=f"day_{target_date}.png"),
         caption=f"📊 Отчёт за {target_date.strftime('%d.%m.%Y')}"
     )
-    advice = await sync_to_async(generate_advice)(transactions_list)
+    advice = await sync_to_async(generate_advice)(window)
     if advice:
         await callback.message.answer(advice)
 
@@ -1405,21 +1469,21 @@ async def handle_predefined_week(callback: CallbackQuery):
         return
 
     user = await get_or_create_django_user(callback.from_user.id, callback.from_user.username)
-    transactions = await get_transactions_for_user_and_date_range(user, start_date, end_date)
-    transactions_list = await sync_to_async(list)(transactions)
+    window = await get_window(user, start_date, end_date)
 
-    if not transactions_list:
+    if window.is_empty():
         await callback.message.answer(
             f"📭 Нет транзакций за неделю с {start_date.strftime('%d.%m.%Y')} по {end_date.strftime('%d.%m.%Y')}."
         )
         return
 
-    chart_buffer = await sync_to_async(generate_weekly_chart)(transactions_list)
+    chart_series = await get_series(user, start_date, end_date)
+    chart_buffer = await sync_to_async(generate_weekly_chart)(chart_series)
     await callback.message.answer_photo(
         photo=types.BufferedInputFile(chart_buffer.read(), filename=f"week_{start_date}.png"),
         caption=f"📈 Отчёт за неделю\n{start_date.strftime('%d.%m.%Y')} – {end_date.strftime('%d.%m.%Y')}"
     )
-    advice = await sync_to_async(generate_advice)(transactions_list)
+    advice = await sync_to_async(generate_advice)(window)
     if advice:
         await callback.message.answer(advice)
 
@@ -1441,21 +1505,19 @@ async def send_daily_graph(message: types.Message, state: FSMContext):
         return
 
     user = await get_or_create_django_user(message.from_user.id, message.from_user.username)
-    transactions = await get_transactions_for_user_and_date(user, target_date)
-    transactions_list = await sync_to_async(list)(transactions)
+    window = await get_window(user, target_date, target_date)
 
-    if not transactions_list:
+    if window.is_empty():
         await message.reply(f"Нет транзакций за {target_date.strftime('%d.%m.%Y')}.")
         return
 
     # Для одного дня используем круговую диаграмму по категориям (только расходы)
-    expenses_only = [t for t in transactions_list if t.type == 'expense']
-    if expenses_only:
-        chart_buffer = await sync_to_async(generate_category_pie_chart)(expenses_only)
+    chart_series = await get_series(user, target_date, target_date, split_by='category', type='expense')
+    chart_buffer = await sync_to_async(generate_category_pie_chart)(chart_series)
+    if not chart_series.is_empty():
         caption = f"Расходы по категориям за {target_date.strftime('%d.%m.%Y')}"
     else:
-        # Если нет расходов — генерируем пустую диаграмму
-        chart_buffer = await sync_to_async(generate_category_pie_chart)([])
+        # Если нет расходов — диаграмма с сообщением "Нет данных"
         caption = f"Нет расходов за {target_date.strftime('%d.%m.%Y')}"
 
     await message.answer_photo(
@@ -1464,7 +1526,7 @@ async def send_daily_graph(message: types.Message, state: FSMContext):
     )
 
     # Совет на основе всех транзакций за день
-    advice = await sync_to_async(generate_advice)(transactions_list)
+    advice = await sync_to_async(generate_advice)(window)
     if advice:
         await message.answer(advice)
 
@@ -1486,20 +1548,20 @@ async def send_monthly_graph_custom(message: types.Message, state: FSMContext):
         return
 
     user = await get_or_create_django_user(message.from_user.id, message.from_user.username)
-    transactions = await get_transactions_for_user_and_date_range(user, start_date, end_date)
-    transactions_list = await sync_to_async(list)(transactions)
+    window = await get_window(user, start_date, end_date)
 
-    if not transactions_list:
+    if window.is_empty():
         await message.reply(f"Нет транзакций за {month_str}.")
         return
 
-    chart_buffer = await sync_to_async(generate_monthly_chart)(transactions_list)
+    chart_series = await get_series(user, start_date, end_date)
+    chart_buffer = await sync_to_async(generate_monthly_chart)(chart_series)
     await message.answer_photo(
         photo=types.BufferedInputFile(chart_buffer.read(), filename=f"month_{month_str}.png"),
         caption=f"График доходов и расходов за {month_str}"
     )
 
-    advice = await sync_to_async(generate_advice)(transactions_list)
+    advice = await sync_to_async(generate_advice)(window)
     if advice:
         await message.answer(advice)
 
@@ -1521,20 +1583,20 @@ async def send_yearly_graph(message: types.Message, state: FSMContext):
         return
 
     user = await get_or_create_django_user(message.from_user.id, message.from_user.username)
-    transactions = await get_transactions_for_user_and_date_range(user, start_date, end_date)
-    transactions_list = await sync_to_async(list)(transactions)
+    window = await get_window(user, start_date, end_date)
 
-    if not transactions_list:
+    if window.is_empty():
         await message.reply(f"Нет транзакций за {year_str} год.")
         return
 
-    chart_buffer = await sync_to_async(generate_yearly_chart)(transactions_list)
+    chart_series = await get_series(user, start_date, end_date, granularity='month')
+    chart_buffer = await sync_to_async(generate_yearly_chart)(chart_series)
     await message.answer_photo(
         photo=types.BufferedInputFile(chart_buffer.read(), filename=f"year_{year_str}.png"),
         caption=f"График доходов и расходов по месяцам за {year_str} год"
     )
 
-    advice = await sync_to_async(generate_advice)(transactions_list)
+    advice = await sync_to_async(generate_advice)(window)
     if advice:
         await message.answer(advice)
 
@@ -1565,17 +1627,15 @@ async def send_category_chart(message: types.Message, state: FSMContext):
         await message.reply("Неверный период. Используйте 'week' или 'month'. Пример: /chart_categories week")
         return
 
-    # Получаем расходы за период
-    expenses_queryset = await get_expenses_for_user_and_period(user, start_date, end_date)
-    # Выполняем запрос
-    expenses_list = await sync_to_async(list)(expenses_queryset)
+    # Расходы по категориям за период (группировка в БД)
+    chart_series = await get_series(user, start_date, end_date, split_by='category', type='expense')
 
-    if not expenses_list:
+    if chart_series.is_empty():
         await message.reply(f"Нет расходов {period_name} для отображения диаграммы.")
         return
 
     # Генерируем диаграмму
-    chart_buffer = await sync_to_async(generate_category_pie_chart)(expenses_list)
+    chart_buffer = await sync_to_async(generate_category_pie_chart)(chart_series)
 
     # Отправляем изображение
     await message.answer_photo(
@@ -1583,12 +1643,11 @@ async def send_category_chart(message: types.Message, state: FSMContext):
         caption=f"Расходы по категориям {period_name} ({start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')})"
     )
 
-    # Получаем ВСЕ транзакции за период
-    all_transactions_queryset = await get_transactions_for_user_and_date_range(user, start_date, end_date)
-    all_transactions_list = await sync_to_async(list)(all_transactions_queryset)
+    # Все операции за период - срез колоночного кэша
+    window = await get_window(user, start_date, end_date)
 
     # Генерируем и отправляем совет на основе всех транзакций
-    advice_text = await sync_to_async(generate_advice)(all_transactions_list) # <-- Передаём all_transactions_list
+    advice_text = await sync_to_async(generate_advice)(window)
     if advice_text:
         await message.answer(advice_text)
 
@@ -1601,6 +1660,8 @@ async def send_help(message: types.Message, state: FSMContext):
         "/today - расходы за сегодня\n"
         "/week - статистика за неделю\n"
         "/category <название> - траты по категории\n"
+        "/compare [week|month|year|ММ.ГГГГ] [pdf|excel] - сравнение с прошлым периодом и годом ранее\n"
+        "/search <текст> - поиск операций по описанию\n"
         "/add <type> <amount> <date> <category> <description> - добавить операцию\n\n"
         "📈 Графики:\n"
         "/graph_week - график за текущую неделю\n"
@@ -1616,5 +1677,7 @@ async def send_help(message: types.Message, state: FSMContext):
 
 # Запуск бота
 if __name__ == '__main__':
+    # Справочник категорий загружаем один раз при старте (дальше - только проверка версии)
+    category_registry.load()
     print("Бот запущен...")
     dp.run_polling(bot)